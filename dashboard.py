@@ -1,9 +1,14 @@
 # dashboard.py
 
 import streamlit as st
-import joblib
 import pandas as pd
 import os
+import io
+import hashlib
+import numpy as np
+from src import config
+from src.ecl import compute_ecl
+from src.fast_scorer import LinearPDScorer, model_version, slim_is_current
 
 # --- 1. CONFIGURATION DE LA PAGE ---
 st.set_page_config(
@@ -15,159 +20,293 @@ st.title("🏦 Modèle de scoring de Crédit (IFRS 9)")
 
 # --- 2. CHARGEMENT DU MODÈLE PD ---
 @st.cache_resource
-def load_model():
-    """Charge le pipeline de scoring (modèle PD) sauvegardé."""
-    model_path = os.path.join("data", "processed", "scoring_model.pkl") 
+def load_model(version):
+    """
+    Charge le modèle PD : l'artefact allégé (mmap, sans sklearn) s'il a été
+    exporté depuis le pickle actuel, sinon le pipeline de scoring sauvegardé (pickle).
+
+    `version` (empreinte du pickle) sert de clé de cache : un réentraînement
+    est pris en compte sans redémarrer le dashboard.
+    """
+    if version is not None and slim_is_current(config.model_file, config.slim_model_dir):
+        return LinearPDScorer.load_slim(config.slim_model_dir)
+    model_path = config.model_file
     try:
+        import joblib
         model = joblib.load(model_path)
         return model
     except FileNotFoundError:
         st.error(f"Erreur: Fichier modèle non trouvé à: {model_path}")
         return None
 
-model_pd = load_model()
+current_version = model_version(config.model_file) if os.path.exists(config.model_file) else None
+model_pd = load_model(current_version)
+
+
+@st.cache_resource
+def load_batch_model(version):
+    """
+    Chaîne les imputeurs sauvegardés (s'ils existent) et le pipeline PD pour le scoring de fichiers.
+
+    `version` (empreinte du pickle) sert de clé de cache, comme pour `load_model`.
+    """
+    # Imports différés : la pile sklearn n'est chargée qu'au premier fichier scoré
+    import joblib
+    from src.imputers import load_imputers, make_scoring_pipeline
+    return make_scoring_pipeline(load_imputers(config.imputers_file), joblib.load(config.model_file))
+
+
+@st.cache_data(show_spinner="Scoring du portefeuille...", max_entries=8)
+def score_file(file_hash, version, _file_bytes, file_name):
+    """
+    Score un fichier de prêts une seule fois par contenu et par modèle
+    (clé : `file_hash`, `version`) : après un réentraînement, le fichier est rescoré.
+
+    Renvoie la PD et le taux d'ECL par unité de LGD et d'EAD (ECL / (LGD x EAD)),
+    qui ne dépendent pas des hypothèses LGD/EAD : changer ces hypothèses ou les
+    filtres ne relance donc ni l'inférence du modèle ni la projection ECL.
+    """
+    if file_name.lower().endswith(".parquet"):
+        loans = pd.read_parquet(io.BytesIO(_file_bytes))
+    else:
+        loans = pd.read_csv(io.BytesIO(_file_bytes))
+
+    pd_values = load_batch_model(version).predict_proba(loans[config.num_features + config.cat_features])[:, 1]
+    # L'ECL est linéaire en LGD et en EAD : on projette une fois avec LGD = 1 et l'EAD de l'échéancier
+    ecl = compute_ecl(pd_values, loans["term"], loans["int_rate"].to_numpy(), loans["installment"].to_numpy(), lgd=1.0)
+    scored = pd.DataFrame({
+        "grade": loans["grade"].astype(str).to_numpy(),
+        "term": loans["term"].astype(str).to_numpy(),
+        "pd": pd_values,
+        "stage": ecl["stage"],
+        "ecl_rate": np.divide(ecl["ecl"], ecl["ead"], out=np.zeros(len(loans)), where=ecl["ead"] > 0),
+        "ead_schedule": ecl["ead"],
+    })
+    if config.ead_col in loans.columns:
+        scored["ead_observed"] = loans[config.ead_col].to_numpy(dtype=np.float64)
+    return scored
 
 # --- 3. DÉFINITION DES HYPOTHÈSES (LGD) ---
 LGD = 0.45 
-st.info(f"Hypothèse de LGD (Loss Given Default) fixée à : **{LGD*100:.0f}%** (standard pour prêt non garanti)")
 
+tab_single, tab_batch = st.tabs(["Client unitaire", "Portefeuille (fichier)"])
 
-# --- 4. INTERFACE UTILISATEUR (INPUTS) ---
+with tab_single:
+    st.info(f"Hypothèse de LGD (Loss Given Default) fixée à : **{LGD*100:.0f}%** (standard pour prêt non garanti)")
 
-# On divise l'interface en 2 colonnes : Inputs | Résultats
-col_inputs, col_results = st.columns(2)
+    # --- 4. INTERFACE UTILISATEUR (INPUTS) ---
 
-with col_inputs:
-    st.header("Paramètres du Client et du Prêt")
+    # On divise l'interface en 2 colonnes : Inputs | Résultats
+    col_inputs, col_results = st.columns(2)
 
-    # A. Input EAD (le plus important pour ECL)
-    st.subheader("Exposition (EAD)")
-    # C'est votre 'out_prncp'
-    ead_input = st.number_input(
-        "Capital restant dû (€)", 
-        0.0, 1000000.0, 25000.0, step=100.0,
-        help="Correspond à 'out_prncp'. C'est l'Exposition en cas de Défaut (EAD)."
-    )
+    with col_inputs:
+        st.header("Paramètres du Client et du Prêt")
+
+        # A. Input EAD (le plus important pour ECL)
+        st.subheader("Exposition (EAD)")
+        # C'est votre 'out_prncp'
+        ead_input = st.number_input(
+            "Capital restant dû (€)", 
+            0.0, 1000000.0, 25000.0, step=100.0,
+            help="Correspond à 'out_prncp'. C'est l'Exposition en cas de Défaut (EAD)."
+        )
     
-    st.divider()
+        st.divider()
 
-    # B. Inputs "Top Features" (pour PD)
-    st.subheader("Caractéristiques Principales (PD)")
+        # B. Inputs "Top Features" (pour PD)
+        st.subheader("Caractéristiques Principales (PD)")
     
-    # On utilise des colonnes pour mieux agencer
-    c1, c2 = st.columns(2)
-    with c1:
-        annual_inc = st.number_input("Revenu annuel (€)", 1000, 5000000, 60000, step=1000)
-        dti = st.number_input("Taux d'endettement (%)", 0.0, 100.0, 15.0, step=0.1)
-        term = st.selectbox("Durée du prêt (mois)", [' 36 months', ' 60 months'])
-        # Si votre modèle attend des strings, utilisez : [' 36 months', ' 60 months']
+        # On utilise des colonnes pour mieux agencer
+        c1, c2 = st.columns(2)
+        with c1:
+            annual_inc = st.number_input("Revenu annuel (€)", 1000, 5000000, 60000, step=1000)
+            dti = st.number_input("Taux d'endettement (%)", 0.0, 100.0, 15.0, step=0.1)
+            term = st.selectbox("Durée du prêt (mois)", [' 36 months', ' 60 months'])
+            # Si votre modèle attend des strings, utilisez : [' 36 months', ' 60 months']
         
-    with c2:
-        installment = st.number_input("Mensualité estimée (€)", 0.0, 5000.0, 450.0, step=10.0)
-        grade = st.selectbox("Notation (Grade) du prêt", ['A', 'B', 'C', 'D', 'E', 'F', 'G'])
-        int_rate = st.number_input("Taux d'intérêt (%)", 0.0, 30.0, 12.5, step=0.1)
+        with c2:
+            installment = st.number_input("Mensualité estimée (€)", 0.0, 5000.0, 450.0, step=10.0)
+            grade = st.selectbox("Notation (Grade) du prêt", ['A', 'B', 'C', 'D', 'E', 'F', 'G'])
+            int_rate = st.number_input("Taux d'intérêt (%)", 0.0, 30.0, 12.5, step=0.1)
 
 
-    # C. Inputs "Secondaires" (cachés par défaut)
-    st.divider()
-    with st.expander("Afficher les paramètres avancés (Emprunteur & Comportement)"):
+        # C. Inputs "Secondaires" (cachés par défaut)
+        st.divider()
+        with st.expander("Afficher les paramètres avancés (Emprunteur & Comportement)"):
         
-        c3, c4 = st.columns(2)
-        with c3:
-            st.markdown("Profil Emprunteur")
-            emp_length_options = ['< 1 year', '1 year', '2 years', '3 years', '4 years', '5 years','6 years', '7 years', '8 years', '9 years', '10+ years']
-            emp_length = st.selectbox("Ancienneté professionnelle", options=emp_length_options, index=5)
-            home_ownership = st.selectbox(
-                "Situation immobilière", 
-                ['MORTGAGE', 'RENT', 'OWN', 'OTHER'],
-                help="MORTGAGE=Propriétaire (avec hypothèque), RENT=Locataire, OWN=Propriétaire"
-            )
-            mort_acc = st.number_input("Nombre de prêts immobiliers", 0, 20, 1, step=1)
+            c3, c4 = st.columns(2)
+            with c3:
+                st.markdown("Profil Emprunteur")
+                emp_length_options = ['< 1 year', '1 year', '2 years', '3 years', '4 years', '5 years','6 years', '7 years', '8 years', '9 years', '10+ years']
+                emp_length = st.selectbox("Ancienneté professionnelle", options=emp_length_options, index=5)
+                home_ownership = st.selectbox(
+                    "Situation immobilière", 
+                    ['MORTGAGE', 'RENT', 'OWN', 'OTHER'],
+                    help="MORTGAGE=Propriétaire (avec hypothèque), RENT=Locataire, OWN=Propriétaire"
+                )
+                mort_acc = st.number_input("Nombre de prêts immobiliers", 0, 20, 1, step=1)
             
-        with c4:
-            st.markdown("Comportement de Crédit")
-            tot_cur_bal = st.number_input("Solde total tous comptes (€)", 0, 1000000, 150000, step=1000)
-            open_acc_6m = st.number_input("Nouveaux crédits (6 derniers mois)", 0, 10, 0, step=1)
-            total_bal_il = st.number_input("Solde total (prêts à tempérament)", 0, 500000, 50000, step=100)
-            inq_fi = st.number_input("Demandes de crédit (6 derniers mois)", 0, 10, 0, step=1)
-            num_sats = st.number_input("Nombre de crédits (sans incident)", 0, 50, 8, step=1)
-
-
-# --- 5. CALCUL ET AFFICHAGE (OUTPUTS) ---
-with col_results:
-    st.header("Résultats de la Simulation")
-
-    if st.button("Calculer le Risque (ECL)", type="primary", use_container_width=True):
-        if model_pd is None:
-            st.error("Le modèle n'a pas pu être chargé. Calcul impossible.")
-        else:
-            # A. Créer le DataFrame pour la prédiction
-            # Doit contenir TOUTES les 12 features avec les BONS NOMS DE COLONNES
-            try:
-                client_data_dict = {
-                    # Features principales
-                    'term': [term],
-                    'int_rate': [int_rate],
-                    'installment': [installment],
-                    'grade': [grade],
-                    'annual_inc': [annual_inc],
-                    'dti': [dti],
+            with c4:
+                st.markdown("Comportement de Crédit")
+                tot_cur_bal = st.number_input("Solde total tous comptes (€)", 0, 1000000, 150000, step=1000)
+                open_acc_6m = st.number_input("Nouveaux crédits (6 derniers mois)", 0, 10, 0, step=1)
+                total_bal_il = st.number_input("Solde total (prêts à tempérament)", 0, 500000, 50000, step=100)
+                inq_fi = st.number_input("Demandes de crédit (6 derniers mois)", 0, 10, 0, step=1)
+                num_sats = st.number_input("Nombre de crédits (sans incident)", 0, 50, 8, step=1)
+
+
+    # --- 5. CALCUL ET AFFICHAGE (OUTPUTS) ---
+    with col_results:
+        st.header("Résultats de la Simulation")
+
+        if st.button("Calculer le Risque (ECL)", type="primary", use_container_width=True):
+            if model_pd is None:
+                st.error("Le modèle n'a pas pu être chargé. Calcul impossible.")
+            else:
+                # A. Créer le DataFrame pour la prédiction
+                # Doit contenir TOUTES les 12 features avec les BONS NOMS DE COLONNES
+                try:
+                    client_data_dict = {
+                        # Features principales
+                        'term': [term],
+                        'int_rate': [int_rate],
+                        'installment': [installment],
+                        'grade': [grade],
+                        'annual_inc': [annual_inc],
+                        'dti': [dti],
                     
-                    # Features secondaires (cachées)
-                    'emp_length': [emp_length],
-                    'home_ownership': [home_ownership],
-                    'tot_cur_bal': [tot_cur_bal],
-                    'open_acc_6m': [open_acc_6m],
-                    'total_bal_il': [total_bal_il],
-                    'inq_fi': [inq_fi],
-                    'mort_acc': [mort_acc],
-                    'num_sats': [num_sats]
-                }
+                        # Features secondaires (cachées)
+                        'emp_length': [emp_length],
+                        'home_ownership': [home_ownership],
+                        'tot_cur_bal': [tot_cur_bal],
+                        'open_acc_6m': [open_acc_6m],
+                        'total_bal_il': [total_bal_il],
+                        'inq_fi': [inq_fi],
+                        'mort_acc': [mort_acc],
+                        'num_sats': [num_sats]
+                    }
                 
-                client_data = pd.DataFrame(client_data_dict)
+                    client_data = pd.DataFrame(client_data_dict)
 
-                # B. Calculer la PD
-                # On suppose que la classe "1" (défaut) est la deuxième
-                pd_value = model_pd.predict_proba(client_data)[0, 1]
+                    # B. Calculer la PD
+                    # On suppose que la classe "1" (défaut) est la deuxième
+                    pd_value = model_pd.predict_proba(client_data)[0, 1]
                 
-                # C. Calculer l'ECL
-                ecl_value = pd_value * LGD * ead_input
+                    # C. Calculer l'ECL IFRS 9 (12 mois / lifetime, scénarios, stage)
+                    ecl = compute_ecl([pd_value], [term], [int_rate], [installment], lgd=LGD, ead=[ead_input])
+                    ecl_value = float(ecl["ecl"][0])
+                    stage = int(ecl["stage"][0])
                 
-                # D. Afficher les résultats
-                st.subheader("Ventilation du Risque")
+                    # D. Afficher les résultats
+                    st.subheader("Ventilation du Risque")
                 
-                r1_c1, r1_c2, r1_c3 = st.columns(3)
-                r1_c1.metric(
-                    label="Probabilité de Défaut (PD)", 
-                    value=f"{pd_value:.2%}",
-                    help="Probabilité que l'emprunteur fasse défaut."
-                )
-                r1_c2.metric(
-                    label="Exposition (EAD)", 
-                    value=f"€ {ead_input:,.0f}",
-                    help="Montant exposé en cas de défaut."
-                )
-                r1_c3.metric(
-                    label="Perte (LGD)", 
-                    value=f"{LGD:.0%}",
-                    help="Part de l'exposition qui sera perdue (hypothèse)."
-                )
+                    r1_c1, r1_c2, r1_c3 = st.columns(3)
+                    r1_c1.metric(
+                        label="Probabilité de Défaut (PD)", 
+                        value=f"{pd_value:.2%}",
+                        help="Probabilité que l'emprunteur fasse défaut."
+                    )
+                    r1_c2.metric(
+                        label="Exposition (EAD)", 
+                        value=f"€ {ead_input:,.0f}",
+                        help="Montant exposé en cas de défaut."
+                    )
+                    r1_c3.metric(
+                        label="Perte (LGD)", 
+                        value=f"{LGD:.0%}",
+                        help="Part de l'exposition qui sera perdue (hypothèse)."
+                    )
                 
-                st.divider()
+                    st.divider()
                 
-                st.metric(
-                    label="Provision ECL (Expected Credit Loss)",
-                    value=f"€ {ecl_value:,.2f}",
-                    help=f"Formule: ECL = PD * LGD * EAD\n({pd_value:.2%} * {LGD} * {ead_input:,.0f})"
-                )
+                    st.metric(
+                        label=f"Provision ECL (Expected Credit Loss) — Stage {stage}",
+                        value=f"€ {ecl_value:,.2f}",
+                        help="Stage 1 : ECL 12 mois ; Stage 2 : ECL lifetime. Somme actualisée au taux effectif "
+                             "de PD marginale x LGD x EAD amortie, pondérée par scénario."
+                    )
+                    r2_c1, r2_c2 = st.columns(2)
+                    r2_c1.metric("ECL 12 mois", f"€ {ecl['ecl_12m'][0]:,.2f}", help=f"PD 12 mois : {ecl['pd_12m'][0]:.2%}")
+                    r2_c2.metric("ECL lifetime", f"€ {ecl['ecl_lifetime'][0]:,.2f}",
+                                 help=f"PD lifetime : {ecl['pd_lifetime'][0]:.2%}")
+                    st.dataframe(pd.DataFrame({
+                        "Scénario": list(config.ecl_scenarios),
+                        "Pondération": [w for _, w in config.ecl_scenarios.values()],
+                        "ECL (€)": [float(ecl[f"ecl_{name}"][0]) for name in config.ecl_scenarios],
+                    }), hide_index=True, use_container_width=True)
                 
-                # Bonus : Jauge de Risque
-                st.progress(pd_value, text=f"Niveau de risque (PD): {pd_value:.2%}")
+                    # Bonus : Jauge de Risque
+                    st.progress(pd_value, text=f"Niveau de risque (PD): {pd_value:.2%}")
+
+
+                except Exception as e:
+                    st.error(f"Erreur lors de la prédiction. Vérifiez vos features.")
+                    st.error(f"Détail : {e}")
+                    st.warning("Assurez-vous que le modèle a été entraîné avec "
+                             "exactement ces 12 noms de colonnes et que les types de "
+                             "données (ex: 'term' en nombre ou en texte) correspondent.")
+
+
+# --- 6. PORTEFEUILLE : SCORING DE FICHIER ---
+with tab_batch:
+    st.header("Scoring d'un portefeuille")
+    uploaded = st.file_uploader("Fichier de prêts (.csv ou .parquet)", type=["csv", "parquet"])
+
+    if uploaded is not None and model_pd is not None:
+        file_bytes = uploaded.getvalue()
+        file_hash = hashlib.sha256(file_bytes).hexdigest()
+        try:
+            scored = score_file(file_hash, current_version, file_bytes, uploaded.name)
+        except Exception as e:
+            st.error(f"Erreur lors du scoring du fichier : {e}")
+            st.stop()
+
+        # A. Hypothèses et filtres : seule l'arithmétique ECL est recalculée
+        h1, h2, h3 = st.columns(3)
+        with h1:
+            lgd_batch = st.slider("LGD", 0.0, 1.0, float(config.lgd), step=0.01)
+        with h2:
+            ead_sources = ["Échéancier (mensualité, taux, durée)"]
+            if "ead_observed" in scored.columns:
+                ead_sources.insert(0, f"Observée ('{config.ead_col}')")
+            ead_source = st.radio("EAD", ead_sources)
+        with h3:
+            ead_factor = st.slider("Facteur de conversion de l'EAD (%)", 0, 150, 100, step=5) / 100
+
+        f1, f2 = st.columns(2)
+        grades = f1.multiselect("Grades", sorted(scored["grade"].unique()), default=sorted(scored["grade"].unique()))
+        stages = f2.multiselect("Stages", [1, 2, 3], default=[1, 2, 3])
+
+        mask = scored["grade"].isin(grades).to_numpy() & scored["stage"].isin(stages).to_numpy()
+        view = scored[mask]
+        ead = (view["ead_observed"] if ead_source.startswith("Observée") else view["ead_schedule"]) * ead_factor
+        view = view.assign(ead=ead, ecl=lgd_batch * ead * view["ecl_rate"])
+
+        # B. Agrégats
+        total_ead, total_ecl = float(view["ead"].sum()), float(view["ecl"].sum())
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Prêts", f"{len(view):,}")
+        m2.metric("EAD totale", f"€ {total_ead:,.0f}")
+        m3.metric("ECL totale", f"€ {total_ecl:,.0f}")
+        m4.metric("Couverture (ECL / EAD)", f"{total_ecl / total_ead:.2%}" if total_ead else "-")
 
+        by_grade = view.groupby("grade", observed=True).agg(
+            prets=("pd", "size"), pd_moyenne=("pd", "mean"), ead=("ead", "sum"), ecl=("ecl", "sum"))
+        by_stage = view.groupby("stage", observed=True).agg(prets=("pd", "size"), ead=("ead", "sum"), ecl=("ecl", "sum"))
+        a1, a2 = st.columns(2)
+        a1.subheader("Par grade")
+        a1.dataframe(by_grade, use_container_width=True)
+        a2.subheader("Par stage")
+        a2.dataframe(by_stage, use_container_width=True)
 
-            except Exception as e:
-                st.error(f"Erreur lors de la prédiction. Vérifiez vos features.")
-                st.error(f"Détail : {e}")
-                st.warning("Assurez-vous que le modèle a été entraîné avec "
-                         "exactement ces 12 noms de colonnes et que les types de "
-                         "données (ex: 'term' en nombre ou en texte) correspondent.")
\ No newline at end of file
+        # C. Détail paginé (seule la page affichée est envoyée au navigateur)
+        st.subheader("Détail par prêt")
+        p1, p2 = st.columns(2)
+        page_size = p1.selectbox("Lignes par page", [50, 100, 500, 1000], index=1)
+        n_pages = max(1, -(-len(view) // page_size))
+        page = p2.number_input(f"Page (sur {n_pages})", 1, n_pages, 1, step=1)
+        start = (page - 1) * page_size
+        st.dataframe(view.iloc[start:start + page_size][["grade", "term", "stage", "pd", "ead", "ecl"]],
+                     use_container_width=True)
+    elif uploaded is not None:
+        st.error("Le modèle n'a pas pu être chargé. Scoring impossible.")
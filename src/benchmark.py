@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.synthetic import generate_loans, write_loans, NAN_RATES
+from src.preprocessing import split_data, impute_det, impute_knn_hotdeck
+from src.models import build_model, model_trainning
+from src.utils import peak_rss_mb, current_rss_mb
+from . import config
+
+STAGES = ("impute_det", "impute_knn", "train", "score_single", "score_batch")
+
+# Nombre de lignes servant à fitter le modèle des étapes de scoring (non chronométré)
+_SCORING_FIT_ROWS = 100_000
+# Nombre maximal d'appels unitaires pour l'étape 'score_single'
+_SINGLE_CALLS = 1000
+# Les étapes courtes sont répétées (meilleur temps) pour limiter le bruit de mesure
+_MAX_REPEAT = 5
+_MIN_BENCH_S = 1.0
+
+
+def _fit_scoring_model(df):
+    sample = df.iloc[:_SCORING_FIT_ROWS]
+    y = sample["loan_status"].map({'Fully Paid': 0, 'Charged Off': 1}).astype(int)
+    return build_model().fit(sample.drop(columns="loan_status"), y)
+
+
+def _run_case(stage, n_rows, random_state):
+    """
+    Exécute une étape sur n_rows prêts synthétiques (dans un processus dédié).
+
+    Les données d'entrée sont générées et préparées (étapes amont) hors chrono ;
+    seul l'appel de l'étape est mesuré (meilleur temps sur jusqu'à `_MAX_REPEAT`
+    exécutions tant que le cumul reste sous `_MIN_BENCH_S` secondes).
+    """
+    features = config.features
+    # Entraînement et scoring partent de données déjà imputées (sans NaN)
+    nan_rates = NAN_RATES if stage in ("impute_det", "impute_knn") else {}
+    df = generate_loans(n_rows, random_state=random_state, nan_rates=nan_rates)[features]
+    input_mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+
+    if stage in ("impute_det", "impute_knn", "train"):
+        train_set, test_set = split_data(df, y=config.y, Test_size=config.Test_size, random_state=config.random_state)
+        del df
+        if stage == "impute_knn":
+            train_set, test_set = impute_det(train_set, test_set, features)
+
+    if stage == "impute_det":
+        def call():
+            return impute_det(train_set, test_set, features)
+    elif stage == "impute_knn":
+        def call():
+            return impute_knn_hotdeck(
+                train_set, test_set, target_vars=config.var_to_imput,
+                numeric_features=config.aux_var_num, categorical_features_ordinal=config.aux_var_ord,
+                grade_order=config.grade, categorical_features_nominal=config.aux_var_nom,
+                k_neighbors=config.k_neigh, random_state=config.random_state,
+                backend=config.knn_backend, block_keys=config.knn_block_keys,
+            )
+    elif stage == "train":
+        save_dir = tempfile.mkdtemp()
+
+        def call():
+            # model_trainning remplace 'loan_status' en place : on repart d'une copie à chaque répétition
+            return model_trainning(train_set.copy(), test_set.copy(), save_dir=save_dir)
+    elif stage == "score_batch":
+        model = _fit_scoring_model(df)
+        X = df.drop(columns="loan_status")
+
+        def call():
+            return model.predict_proba(X)
+    elif stage == "score_single":
+        model = _fit_scoring_model(df)
+        X = df.drop(columns="loan_status")
+        rows = [X.iloc[[i]] for i in range(min(n_rows, _SINGLE_CALLS))]
+        latencies = np.empty(len(rows))
+
+        def call():
+            for i, row in enumerate(rows):
+                t0 = time.perf_counter()
+                model.predict_proba(row)
+                latencies[i] = time.perf_counter() - t0
+    else:
+        raise ValueError(f"Étape inconnue: '{stage}' (attendu: {', '.join(STAGES)})")
+
+    times = []
+    while not times or (len(times) < _MAX_REPEAT and sum(times) < _MIN_BENCH_S):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    wall_s = min(times)
+
+    n_processed, extra = n_rows, {}
+    if stage == "score_single":
+        n_processed = len(rows)
+        extra = {"latency_p50_ms": float(np.percentile(latencies, 50) * 1000),
+                 "latency_p99_ms": float(np.percentile(latencies, 99) * 1000)}
+    return {"stage": stage, "n_rows": n_rows, "wall_s": wall_s, "repeat": len(times),
+            "rows_per_s": n_processed / wall_s, "peak_rss_mb": peak_rss_mb(), "input_mb": float(input_mb), **extra}
+
+
+def environment():
+    """Versions et machine, enregistrées avec les résultats pour comparer à périmètre égal."""
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run_benchmarks(sizes=config.bench_sizes, stages=STAGES, random_state=0, verbose=True):
+    """
+    Chronomètre chaque étape du pipeline sur des données synthétiques de tailles croissantes.
+
+    Chaque couple (étape, taille) s'exécute dans un processus neuf (`spawn`) :
+    le pic de RSS mesuré est celui de l'étape et de ses données, sans
+    interférence des cas précédents. Tout est généré localement (hors ligne).
+
+    Args:
+        sizes (list): Nombres de lignes (ex: 10k, 100k, 1M, 10M).
+        stages (list): Étapes parmi `STAGES`.
+        random_state (int): Seed du générateur de données.
+        verbose (bool): Affiche chaque résultat au fil de l'eau.
+
+    Returns:
+        dict: {'environment': ..., 'results': [un dict par (étape, taille)]}.
+    """
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for n_rows in sizes:
+        for stage in stages:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                res = pool.submit(_run_case, stage, n_rows, random_state).result()
+            results.append(res)
+            if verbose:
+                print(f"   [bench] {stage:<12} {n_rows:>10,} lignes  {res['wall_s']:>8.2f} s  "
+                      f"{res['rows_per_s']:>12,.0f} lignes/s  pic RSS {res['peak_rss_mb']:>8,.0f} Mo")
+    return {"environment": environment(), "results": results}
+
+
+def _run_preprocessing(path, lean):
+    """Preprocessing complet (split, imputations, modèle) d'un Parquet synthétique, dans un processus dédié."""
+    df = pd.read_parquet(path, columns=config.features)
+    rss_loaded = current_rss_mb()
+    timings = {}
+
+    start = time.perf_counter()
+    train_set, test_set = split_data(df, y=config.y, Test_size=config.Test_size, random_state=config.random_state)
+    del df
+    train_set, test_set = impute_det(train_set, test_set, config.features)
+    timings["impute_det_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    train_set, test_set = impute_knn_hotdeck(
+        train_set, test_set, target_vars=config.var_to_imput,
+        numeric_features=config.aux_var_num, categorical_features_ordinal=config.aux_var_ord,
+        grade_order=config.grade, categorical_features_nominal=config.aux_var_nom,
+        k_neighbors=config.k_neigh, random_state=config.random_state,
+        backend=config.knn_backend, block_keys=config.knn_block_keys, lean=lean,
+    )
+    timings["impute_knn_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, _, auc, _ = model_trainning(train_set, test_set, save_dir=tempfile.mkdtemp(), lean=lean)
+    timings["train_s"] = time.perf_counter() - start
+
+    return {"lean": lean, "n_rows": len(train_set) + len(test_set), **timings,
+            "wall_s": sum(timings.values()), "rss_loaded_mb": rss_loaded, "peak_rss_mb": peak_rss_mb(),
+            "peak_overhead_mb": peak_rss_mb() - rss_loaded, "auc": auc,
+            **{f"mean_{c}": float(train_set[c].mean()) for c in config.var_to_imput}}
+
+
+def compare_lean_matrices(n_rows=1_000_000, path=None, random_state=0):
+    """
+    Compare le preprocessing complet avec les matrices standard (float64, copies
+    des donneurs et receveurs) et allégées (`lean=True`).
+
+    Les deux modes s'exécutent dans des processus neufs sur le même Parquet
+    synthétique. `peak_overhead_mb` est le pic de RSS au-delà de la RSS après
+    lecture des données : c'est la mémoire propre au preprocessing.
+
+    Returns:
+        pd.DataFrame: Temps par étape, pics de RSS, AUC et moyennes imputées de chaque mode.
+    """
+    path = path or os.path.join(tempfile.mkdtemp(), "loans.parquet")
+    if not os.path.exists(path):
+        write_loans(path, n_rows, random_state=random_state)
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for lean in (False, True):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            rows.append(pool.submit(_run_preprocessing, path, lean).result())
+    comparison = pd.DataFrame(rows)
+    comparison["wall_ratio"] = comparison["wall_s"] / comparison["wall_s"].iloc[0]
+    comparison["overhead_ratio"] = comparison["peak_overhead_mb"] / comparison["peak_overhead_mb"].iloc[0]
+    return comparison
+
+
+def save_results(report, path=config.bench_path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def compare_to_baseline(report, baseline, tolerance=config.bench_tolerance):
+    """
+    Compare des résultats à une baseline sauvegardée.
+
+    Une régression est signalée lorsque le temps ou le pic de RSS d'un couple
+    (étape, taille) présent dans les deux rapports dépasse la baseline de plus
+    de `tolerance` (ex: 0.2 = +20 %).
+
+    Returns:
+        pd.DataFrame: Une ligne par couple commun, avec les ratios et le drapeau 'regression'.
+    """
+    keys = ["stage", "n_rows"]
+    current = pd.DataFrame(report["results"])[keys + ["wall_s", "peak_rss_mb"]]
+    base = pd.DataFrame(baseline["results"])[keys + ["wall_s", "peak_rss_mb"]]
+    cmp = current.merge(base, on=keys, suffixes=("", "_baseline"))
+    cmp["wall_ratio"] = cmp["wall_s"] / cmp["wall_s_baseline"]
+    cmp["rss_ratio"] = cmp["peak_rss_mb"] / cmp["peak_rss_mb_baseline"]
+    cmp["regression"] = (cmp["wall_ratio"] > 1 + tolerance) | (cmp["rss_ratio"] > 1 + tolerance)
+    return cmp
+
+
+def main(sizes=config.bench_sizes, output_path=config.bench_path, baseline_path=config.bench_baseline_path):
+    """
+    Lance la suite, sauvegarde les résultats et les compare à la baseline si elle existe.
+
+    Sans baseline, les résultats courants deviennent la baseline.
+
+    Returns:
+        int: Code de sortie (1 si une régression est détectée).
+    """
+    report = run_benchmarks(sizes)
+    save_results(report, output_path)
+    print(f"Résultats sauvegardés dans {output_path}")
+
+    if not os.path.exists(baseline_path):
+        save_results(report, baseline_path)
+        print(f"Baseline créée dans {baseline_path}")
+        return 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    cmp = compare_to_baseline(report, baseline)
+    print(cmp.to_string(index=False))
+    if cmp["regression"].any():
+        print(f"Régressions détectées (> +{config.bench_tolerance:.0%} vs baseline)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # Tailles optionnelles en argument : python -m src.benchmark 10000 100000
+    sys.exit(main([int(a) for a in sys.argv[1:]] or config.bench_sizes))
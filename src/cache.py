@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import inspect
+from . import config
+
+
+def file_fingerprint(path, block_size=1 << 20):
+    """Empreinte SHA-256 du contenu d'un fichier (lu par blocs)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_fingerprint(*objects):
+    """Empreinte du code source de fonctions/classes : une modification du code invalide le cache."""
+    h = hashlib.sha256()
+    for obj in objects:
+        h.update(inspect.getsource(obj).encode())
+    return h.hexdigest()
+
+
+def make_key(*parts, **params):
+    """
+    Clé de cache d'une étape : hash des clés/empreintes amont et des paramètres.
+
+    Args:
+        *parts (str): Empreintes des entrées (fichier brut, clé de l'étape amont, code...).
+        **params: Paramètres de l'étape (sérialisés en JSON trié).
+
+    Returns:
+        str: Clé hexadécimale (16 caractères).
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+class StageCache:
+    """
+    Cache d'artefacts par étape du pipeline (split, imputations, modèle).
+
+    Chaque entrée est un dossier `<root>/<étape>-<clé>` dont la clé dépend du
+    contenu des entrées et des paramètres de l'étape : seules les étapes dont
+    la clé a changé sont recalculées. Un manifeste JSON conserve la taille et
+    la date de dernière utilisation de chaque entrée ; au-delà de `max_bytes`,
+    les entrées les moins récemment utilisées sont supprimées (LRU), sauf
+    celles utilisées pendant l'exécution en cours.
+
+    Args:
+        root (str): Dossier du cache.
+        max_bytes (int): Taille maximale du cache sur disque.
+    """
+
+    def __init__(self, root=config.cache_path, max_bytes=config.cache_max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.events = []
+        self._used = set()
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        # On oublie les entrées supprimées à la main
+        return {name: e for name, e in manifest.items() if os.path.isdir(os.path.join(self.root, name))}
+
+    def _write_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def path(self, stage, key):
+        """Dossier de l'entrée `<étape>-<clé>`."""
+        return os.path.join(self.root, f"{stage}-{key}")
+
+    def run(self, stage, key, compute, save, load):
+        """
+        Renvoie la sortie d'une étape, depuis le cache si possible.
+
+        Args:
+            stage (str): Nom de l'étape (ex: 'split').
+            key (str): Clé de l'étape (voir `make_key`).
+            compute (callable): () -> sortie, appelé en cas d'absence (miss).
+            save (callable): (sortie, dossier) -> None, écrit la sortie dans le dossier.
+            load (callable): (dossier) -> sortie, relit une entrée existante (hit).
+
+        Returns:
+            La sortie de l'étape.
+        """
+        name = f"{stage}-{key}"
+        path = self.path(stage, key)
+        start = time.perf_counter()
+        self._used.add(name)
+
+        if name in self.manifest:
+            output = load(path)
+            self.manifest[name]["last_used"] = time.time()
+            self._write_manifest()
+            self.events.append({"stage": stage, "key": key, "status": "hit",
+                                "seconds": time.perf_counter() - start})
+            return output
+
+        output = compute()
+        # Écriture dans un dossier temporaire puis renommage : pas d'entrée partielle
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        save(output, tmp)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+        now = time.time()
+        self.manifest[name] = {"stage": stage, "key": key, "bytes": _dir_size(path),
+                               "created": now, "last_used": now}
+        self.evict()
+        self.events.append({"stage": stage, "key": key, "status": "miss",
+                            "seconds": time.perf_counter() - start})
+        return output
+
+    def total_bytes(self):
+        return sum(e["bytes"] for e in self.manifest.values())
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées tant que le cache dépasse `max_bytes`."""
+        evicted = []
+        candidates = sorted((e["last_used"], name) for name, e in self.manifest.items() if name not in self._used)
+        for _, name in candidates:
+            if self.total_bytes() <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            del self.manifest[name]
+            evicted.append(name)
+        self._write_manifest()
+        for name in evicted:
+            self.events.append({"stage": name.split("-")[0], "key": name.split("-", 1)[1],
+                                "status": "evicted", "seconds": 0.0})
+        return evicted
+
+    def report(self):
+        """Affiche les hits/misses/évictions de l'exécution en cours et renvoie la liste des événements."""
+        for e in self.events:
+            print(f"   [cache] {e['stage']:<6} {e['key']} {e['status']:<7} ({e['seconds']:.2f} s)")
+        print(f"   [cache] taille: {self.total_bytes() / 1024 ** 2:,.1f} Mo / {self.max_bytes / 1024 ** 2:,.0f} Mo")
+        return self.events
@@ -5,6 +5,11 @@ y = 'loan_status'
 Test_size = 0.2
 random_state = 44
 k_neigh = 10
+# Backend de recherche des voisins du hot-deck : 'auto', 'brute', 'kd_tree', 'ball_tree', 'blocked', 'ivf'
+knn_backend = "auto"
+knn_block_keys = ['grade', 'home_ownership']
+# Matrices de features allégées (float32, one-hot écrit depuis les codes, sous-ensembles par indices)
+lean_matrices = False
 
 var_to_imput = ['open_acc_6m', 'total_bal_il', 'inq_fi']
 
@@ -32,6 +37,113 @@ cat_order = [
     ['OWN', 'MORTGAGE', 'RENT', 'ANY', 'OTHER', 'NONE']
 ]
 
+# Recherche de modèles (successive halving, pool de processus)
+search_n_jobs = None  # None = tous les cœurs
+search_cv = 5
+search_eta = 3
+search_min_rows = 5000
+search_leaderboard_path = "data/processed/search_leaderboard.csv"
+
+# Imputation multiple (M tirages hot-deck, pooling par les règles de Rubin)
+mi_n_imputations = 20
+mi_n_jobs = None  # None = tous les cœurs
+mi_report_path = "data/processed/mi_report.json"
+
+# Entraînement hors mémoire (lots Parquet, SGD logistique par partial_fit)
+ooc_batch_size = 100_000
+ooc_epochs = 3
+ooc_alpha = 1e-4
+ooc_model_file = "data/processed/scoring_model_ooc.pkl"
+
 train_path = "data/processed/train_imp.parquet"
 test_path = "data/processed/test_imp.parquet"
-processed_path = "data/processed"
\ No newline at end of file
+processed_path = "data/processed"
+
+# Instrumentation des exécutions (rapport JSON, métriques Prometheus, profilage optionnel)
+run_report_path = "data/processed/run_report_{run}.json"  # {run} = 'preprocessing', 'model'
+metrics_path = "data/processed/metrics_{run}.prom"
+profile = None  # None, 'cprofile' ou 'sampling'
+profile_interval_ms = 5
+profile_dir = "data/processed/profiles"
+
+# Cache des étapes du pipeline (clés = empreintes des données, paramètres et code)
+cache_path = "data/processed/cache"
+cache_max_bytes = 5 * 1024 ** 3
+
+# Ingestion en flux (CSV -> Parquet partitionné, types compacts)
+streaming = False
+raw_cache_path = "data/processed/raw_cache"
+
+# Scoring de portefeuille (ECL batch)
+model_file = "data/processed/scoring_model.pkl"
+imputers_file = "data/processed/imputers.pkl"
+fast_scorer_file = "data/processed/scoring_model_fast.npz"
+# Artefact allégé (tableaux .npy + metadata.json, chargés en mmap, sans sklearn ni pandas)
+slim_model_dir = "data/processed/scoring_model_slim"
+lgd = 0.45
+ead_col = "out_prncp"
+chunk_size = 500_000
+portfolio_path = "data/processed/portfolio_ecl.parquet"
+
+# Moteur ECL IFRS 9 (12 mois / lifetime, scénarios macro, staging)
+# Scénarios : {nom: (multiplicateur du hazard mensuel, pondération)} ; 'up' = conjoncture favorable
+ecl_scenarios = {"base": (1.0, 0.5), "up": (0.8, 0.2), "down": (1.4, 0.3)}
+sicr_ratio = 2.0  # Stage 2 si PD lifetime >= sicr_ratio x PD à l'origination
+sicr_pd_12m = 0.20  # Stage 2 si PD 12 mois >= ce seuil
+ecl_chunk_size = 100_000
+ecl_issue_date_col = "issue_d"  # âge des prêts (mensualités échues) si la colonne est présente
+ecl_as_of = None  # date d'arrêté (None = aujourd'hui)
+ecl_path = "data/processed/portfolio_ecl_ifrs9.parquet"
+
+# Suivi de stabilité des populations (PSI/CSI sur histogrammes fusionnables)
+drift_n_bins = 10
+drift_psi_warn = 0.10
+drift_psi_alert = 0.25
+drift_min_rows = 1000  # pas d'alerte sous cet effectif courant
+drift_reference_path = "data/processed/drift_reference.json"
+drift_report_path = "data/processed/drift_report.json"
+
+# Évaluation et calibration (validation et test)
+eval_n_bins = 10  # classes de PD (Hosmer-Lemeshow, calibration par décile)
+eval_n_bootstrap = 1000
+eval_bootstrap_chunk = 16  # réplicats vectorisés par paquet (mémoire ~ chunk x n x 8 octets)
+eval_ci = 0.95
+eval_n_jobs = None  # None = tous les cœurs
+eval_report_path = "data/processed/evaluation_report.json"
+
+# Modèles PD segmentés (un modèle par segment, repli sur le modèle global)
+segment_keys = ["grade", "term"]  # variables de cat_features
+segment_min_rows = 5000
+segment_min_defaults = 200  # défauts (et non-défauts) minimum par segment
+segment_n_jobs = None  # None = tous les cœurs
+segment_model_file = "data/processed/scoring_model_segmented.pkl"
+segment_report_path = "data/processed/segment_report.csv"
+
+# Stress tests ECL (grilles de chocs, surface d'ECL)
+stress_grid = {
+    "int_rate_bp": [0, 100, 200, 300],    # hausse du taux, en points de base
+    "annual_inc_pct": [0, -10, -20],      # variation du revenu, en %
+    "dti_pts": [0, 5, 10],                # hausse du DTI, en points
+    "grade_notches": [0, 1, 2],           # dégradation du grade, en crans
+    "lgd": [0.35, 0.45, 0.55, 0.65],
+}
+stress_batch_size = 50_000
+stress_n_jobs = None  # None = tous les cœurs
+stress_path = "data/processed/stress_surface.parquet"
+
+# Benchmarks (données synthétiques, hors ligne)
+bench_sizes = [10_000, 100_000, 1_000_000, 10_000_000]
+bench_path = "data/processed/benchmark.json"
+bench_baseline_path = "data/processed/benchmark_baseline.json"
+bench_tolerance = 0.20  # régression si temps ou pic RSS > +20 % vs baseline
+
+# Service de scoring en ligne (micro-batching)
+serving_host = "127.0.0.1"
+serving_port = 8000
+max_batch_size = 256
+max_wait_ms = 5
+
+# Registre de modèles (versions immuables, promotion atomique, hot-swap du service)
+registry_path = "data/processed/registry"
+registry_poll_s = 2.0
+registry_shadow_max_pending = 2  # lots en attente du modèle shadow au-delà desquels il est ignoré
@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from src.config import num_features, cat_features, cat_order
+from . import config
+
+# Proportion plancher des intervalles vides (évite log(0) dans le PSI)
+_EPS = 1e-4
+
+
+class HistogramSketch:
+    """
+    Histogramme à intervalles fixes d'une variable, fusionnable.
+
+    - Variable numérique (`edges`) : les bornes intérieures définissent
+      len(edges) + 1 intervalles, les deux extrêmes étant ouverts (une valeur
+      hors de la plage de référence tombe dans le premier ou le dernier).
+    - Variable catégorielle (`categories`) : un intervalle par modalité, plus
+      un intervalle '__other__' pour les modalités inconnues.
+
+    Les valeurs manquantes sont comptées à part (`n_missing`) et n'entrent pas
+    dans le PSI. La mise à jour est en O(lot) et deux histogrammes de mêmes
+    bornes se fusionnent par simple addition des comptes : des workers peuvent
+    suivre chacun leurs lots puis combiner leurs histogrammes.
+
+    Args:
+        edges (array-like, optional): Bornes intérieures (variable numérique).
+        categories (list, optional): Modalités (variable catégorielle).
+    """
+
+    def __init__(self, edges=None, categories=None):
+        if (edges is None) == (categories is None):
+            raise ValueError("Renseigner soit `edges` (numérique), soit `categories` (catégorielle)")
+        self.edges = None if edges is None else np.asarray(edges, dtype=np.float64)
+        self.categories = None if categories is None else [str(c) for c in categories]
+        n_bins = len(self.edges) + 1 if self.edges is not None else len(self.categories) + 1
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.n_missing = 0
+        self._lookup = None if self.categories is None else {c: i for i, c in enumerate(self.categories)}
+
+    @property
+    def labels(self):
+        if self.categories is not None:
+            return self.categories + ["__other__"]
+        bounds = ["-inf"] + [f"{e:.6g}" for e in self.edges] + ["+inf"]
+        return [f"[{lo}, {hi})" for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    def empty_like(self):
+        """Histogramme vide de mêmes bornes (ex: suivi courant à partir de la référence)."""
+        return HistogramSketch(edges=self.edges, categories=self.categories)
+
+    def update(self, values):
+        """Ajoute un lot de valeurs (tableau NumPy, Series ou liste)."""
+        if self.categories is None:
+            x = np.asarray(values, dtype=np.float64)
+            missing = np.isnan(x)
+            self.n_missing += int(missing.sum())
+            bins = np.searchsorted(self.edges, x[~missing], side="right")
+        else:
+            # Seules les modalités distinctes du lot sont traduites, puis diffusées par leurs codes
+            codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+            missing = codes < 0
+            self.n_missing += int(missing.sum())
+            other = len(self.categories)
+            mapping = np.array([self._lookup.get(str(u), other) for u in uniques], dtype=np.intp)
+            bins = mapping[codes[~missing]]
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        """Ajoute les comptes d'un histogramme de mêmes bornes (en place)."""
+        same = (np.array_equal(self.edges, other.edges) if self.edges is not None and other.edges is not None
+                else self.categories == other.categories)
+        if not same:
+            raise ValueError("Histogrammes de bornes différentes : fusion impossible")
+        self.counts += other.counts
+        self.n_missing += other.n_missing
+        return self
+
+    @property
+    def n(self):
+        return int(self.counts.sum()) + self.n_missing
+
+    def proportions(self):
+        total = self.counts.sum()
+        if total == 0:
+            return np.full(len(self.counts), np.nan)
+        return self.counts / total
+
+    def to_dict(self):
+        state = {"counts": self.counts.tolist(), "n_missing": self.n_missing}
+        if self.edges is not None:
+            state["edges"] = self.edges.tolist()
+        else:
+            state["categories"] = self.categories
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(edges=state.get("edges"), categories=state.get("categories"))
+        sketch.counts[:] = state["counts"]
+        sketch.n_missing = int(state["n_missing"])
+        return sketch
+
+
+def psi(expected, actual, eps=_EPS):
+    """
+    Population Stability Index entre deux histogrammes de mêmes bornes.
+
+    PSI = Σ (a_i - e_i) ln(a_i / e_i), les proportions nulles étant relevées à `eps`.
+    Repères usuels : < 0.10 stable, 0.10-0.25 à surveiller, > 0.25 dérive significative.
+    """
+    e = np.maximum(expected.proportions(), eps)
+    a = np.maximum(actual.proportions(), eps)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def build_reference(train_path=config.train_path, scorer=None, n_bins=config.drift_n_bins,
+                    batch_size=config.ooc_batch_size, sample_rows=200_000):
+    """
+    Histogrammes de référence de la population d'entraînement.
+
+    Les bornes des variables numériques (et des PD, si `scorer` est fourni)
+    sont les quantiles de `n_bins` intervalles d'effectifs égaux, estimés sur
+    les `sample_rows` premières lignes ; les comptes sont ensuite accumulés
+    sur tout le fichier, lu par lots (mémoire bornée).
+
+    Args:
+        train_path (str): Parquet d'entraînement (`train_imp.parquet`).
+        scorer (LinearPDScorer, optional): Modèle PD, pour la stabilité des classes de PD.
+        n_bins (int): Nombre d'intervalles des variables numériques et de la PD.
+        batch_size (int): Nombre de lignes par lot.
+        sample_rows (int): Lignes utilisées pour fixer les bornes.
+
+    Returns:
+        dict: {variable: HistogramSketch}, avec la clé 'pd' si `scorer` est fourni.
+    """
+    columns = num_features + cat_features
+    parquet_file = pq.ParquetFile(train_path)
+    sample = parquet_file.iter_batches(batch_size=sample_rows, columns=columns)
+    sample = next(sample).to_pandas()
+
+    probs = np.linspace(0, 1, n_bins + 1)[1:-1]
+
+    def quantile_edges(values):
+        values = np.asarray(values, dtype=np.float64)
+        return np.unique(np.nanquantile(values, probs))
+
+    sketches = {c: HistogramSketch(edges=quantile_edges(sample[c])) for c in num_features}
+    sketches.update({c: HistogramSketch(categories=cats) for c, cats in zip(cat_features, cat_order)})
+    if scorer is not None:
+        sketches["pd"] = HistogramSketch(edges=quantile_edges(scorer.predict_pd(sample)))
+
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        df = batch.to_pandas()
+        for c in columns:
+            sketches[c].update(df[c])
+        if scorer is not None:
+            sketches["pd"].update(scorer.predict_pd(df))
+    return sketches
+
+
+def save_reference(reference, path=config.drift_reference_path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({name: sketch.to_dict() for name, sketch in reference.items()}, f)
+    return path
+
+
+def load_reference(path=config.drift_reference_path):
+    with open(path) as f:
+        return {name: HistogramSketch.from_dict(state) for name, state in json.load(f).items()}
+
+
+def print_alert(alert):
+    """Hook d'exemple : affiche chaque alerte de dérive."""
+    print(f"   [drift] {alert['level'].upper()} {alert['variable']}: PSI {alert['psi']:.3f} "
+          f"({alert['n_current']:,} lignes)")
+
+
+class DriftMonitor:
+    """
+    Suivi incrémental de la stabilité des populations scorées (PSI/CSI).
+
+    Le moniteur garde, pour chaque variable du modèle et pour la PD, un
+    histogramme courant aux bornes de la référence. `update` l'alimente à
+    chaque lot scoré ; `merge` combine les moniteurs de plusieurs workers.
+    `check` calcule le PSI de la PD et le CSI de chaque variable, puis appelle
+    les hooks pour chaque variable au-delà des seuils.
+
+    Args:
+        reference (dict): {variable: HistogramSketch} (`build_reference` / `load_reference`).
+        warn (float): Seuil d'avertissement du PSI.
+        alert (float): Seuil d'alerte du PSI.
+        min_rows (int): Effectif courant minimal pour émettre une alerte.
+        hooks (list, optional): Callables `hook(alert)`.
+    """
+
+    def __init__(self, reference, warn=config.drift_psi_warn, alert=config.drift_psi_alert,
+                 min_rows=config.drift_min_rows, hooks=None):
+        self.reference = reference
+        self.current = {name: sketch.empty_like() for name, sketch in reference.items()}
+        self.warn = warn
+        self.alert = alert
+        self.min_rows = min_rows
+        self.hooks = list(hooks or [])
+        self.n_batches = 0
+
+    def update(self, df, pd_values=None):
+        """Ajoute un lot scoré : variables du modèle (`df`) et PD (facultatives)."""
+        for name, sketch in self.current.items():
+            if name == "pd":
+                if pd_values is not None:
+                    sketch.update(pd_values)
+            elif name in df:
+                sketch.update(df[name])
+        self.n_batches += 1
+        return self
+
+    def merge(self, other):
+        """Combine le suivi d'un autre moniteur (même référence), sans revenir aux lignes."""
+        for name, sketch in self.current.items():
+            sketch.merge(other.current[name])
+        self.n_batches += other.n_batches
+        return self
+
+    def state(self):
+        """Histogrammes courants, JSON-sérialisables (envoi depuis un worker, reprise)."""
+        return {"n_batches": self.n_batches, "current": {n: s.to_dict() for n, s in self.current.items()}}
+
+    def merge_state(self, state):
+        for name, sk_state in state["current"].items():
+            self.current[name].merge(HistogramSketch.from_dict(sk_state))
+        self.n_batches += state["n_batches"]
+        return self
+
+    def report(self):
+        """
+        PSI/CSI de chaque variable, taux de manquants et détail par intervalle.
+
+        Returns:
+            dict: 'variables' (une entrée par variable, 'pd' en tête), 'alerts' et effectifs.
+        """
+        variables = {}
+        for name in sorted(self.reference, key=lambda n: n != "pd"):
+            ref, cur = self.reference[name], self.current[name]
+            value = psi(ref, cur) if cur.counts.sum() else None
+            level = "ok"
+            if value is not None and cur.n >= self.min_rows:
+                level = "alert" if value >= self.alert else "warn" if value >= self.warn else "ok"
+            variables[name] = {
+                "index": "psi" if name == "pd" else "csi",
+                "psi": value,
+                "level": level,
+                "n_reference": ref.n,
+                "n_current": cur.n,
+                "missing_rate_reference": ref.n_missing / ref.n if ref.n else None,
+                "missing_rate_current": cur.n_missing / cur.n if cur.n else None,
+                "bins": [{"bin": label, "reference": float(r), "current": float(c)}
+                         for label, r, c in zip(ref.labels, ref.proportions(), cur.proportions())],
+            }
+        alerts = [{"variable": name, "level": v["level"], "psi": v["psi"], "n_current": v["n_current"]}
+                  for name, v in variables.items() if v["level"] != "ok"]
+        return {"timestamp": time.time(), "n_batches": self.n_batches, "warn": self.warn, "alert": self.alert,
+                "variables": variables, "alerts": alerts}
+
+    def check(self):
+        """Calcule le rapport et appelle les hooks pour chaque alerte."""
+        report = self.report()
+        for alert in report["alerts"]:
+            for hook in self.hooks:
+                hook(alert)
+        return report
+
+    def save_report(self, path=config.drift_report_path, report=None):
+        report = report or self.report()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp, path)
+        return path
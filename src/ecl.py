@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from . import config
+
+
+def term_months(term):
+    """
+    Durée du prêt en mois à partir de la colonne 'term' (' 36 months', 36, ...).
+
+    Seules les modalités distinctes sont analysées, puis diffusées par leurs codes.
+    """
+    codes, uniques = pd.factorize(pd.Series(term))
+    if pd.api.types.is_numeric_dtype(uniques):
+        months = np.asarray(uniques, dtype=np.int64)
+    else:
+        months = pd.Series(uniques).astype(str).str.extract(r"(\d+)", expand=False).astype(np.int64).to_numpy()
+    if (codes < 0).any():
+        raise ValueError("Valeurs manquantes dans la colonne 'term'")
+    return months[codes]
+
+
+def loan_age(issue_date, as_of=None):
+    """
+    Nombre de mensualités échues entre la date d'émission ('issue_d' : 'Dec-2015',
+    date, ...) et la date d'arrêté `as_of` (aujourd'hui par défaut).
+
+    Seules les dates distinctes sont analysées, puis diffusées par leurs codes.
+    Une date manquante ou illisible donne un âge nul (projection sur toute la durée).
+    """
+    codes, uniques = pd.factorize(pd.Series(issue_date))
+    dates = pd.to_datetime(pd.Series(np.asarray(uniques, dtype=object)), errors="coerce", format="mixed")
+    as_of = pd.Timestamp.today() if as_of is None else pd.Timestamp(as_of)
+    months = ((as_of.year - dates.dt.year) * 12 + (as_of.month - dates.dt.month)).fillna(0).clip(lower=0)
+    months = months.to_numpy(dtype=np.int64)
+    age = np.zeros(len(codes), dtype=np.int64)
+    known = codes >= 0
+    age[known] = months[codes[known]]
+    return age
+
+
+def _annuity_factor(rate, n):
+    """Valeur actuelle d'une annuité de 1 sur n mois au taux mensuel `rate` (n / taux nul gérés)."""
+    n = np.maximum(n, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = -np.expm1(-np.log1p(rate) * n) / rate
+    return np.where(rate > 0, factor, n)
+
+
+def assign_stages(pd_12m, pd_lifetime, pd_origination=None, defaulted=None,
+                  sicr_ratio=config.sicr_ratio, sicr_pd_12m=config.sicr_pd_12m):
+    """
+    Affectation des stages IFRS 9.
+
+    - Stage 3 : prêt en défaut (`defaulted`).
+    - Stage 2 : hausse significative du risque de crédit (SICR), soit une PD
+      lifetime au moins `sicr_ratio` fois supérieure à la PD à l'origination,
+      soit une PD 12 mois au-delà du seuil absolu `sicr_pd_12m`.
+    - Stage 1 : les autres prêts.
+
+    Returns:
+        np.ndarray: Stage (int8) de chaque prêt.
+    """
+    sicr = pd_12m >= sicr_pd_12m
+    if pd_origination is not None:
+        sicr |= pd_lifetime >= sicr_ratio * np.asarray(pd_origination, dtype=np.float64)
+    stage = np.where(sicr, 2, 1).astype(np.int8)
+    if defaulted is not None:
+        stage[np.asarray(defaulted, dtype=bool)] = 3
+    return stage
+
+
+def compute_ecl(pd_values, term, int_rate, installment, lgd=config.lgd, ead=None, age=None,
+                scenarios=config.ecl_scenarios, pd_origination=None, defaulted=None):
+    """
+    ECL 12 mois et lifetime, multi-scénarios, d'un lot de prêts.
+
+    La PD du modèle est la probabilité de défaut sur la durée du prêt : elle est
+    convertie en hazard mensuel constant h = 1 - (1 - PD)^(1/term), choqué par
+    le multiplicateur de chaque scénario. Pour le mois t, la PD marginale est
+    S(t-1) h_s, l'EAD est le capital restant dû en début de mois (tableau
+    d'amortissement à mensualités constantes) et l'actualisation se fait au
+    taux effectif (taux contractuel mensuel). Tous les calculs sont des
+    tableaux (prêts, mois, scénarios) diffusés par NumPy, sans boucle par prêt.
+
+    Args:
+        pd_values (np.ndarray): PD du modèle (sur la durée du prêt).
+        term (array-like): Colonne 'term' (' 36 months'/' 60 months' ou nombre de mois).
+        int_rate (np.ndarray): Taux d'intérêt annuel (en %).
+        installment (np.ndarray): Mensualité.
+        lgd (float): Loss Given Default.
+        ead (np.ndarray, optional): Capital restant dû actuel (ex: 'out_prncp').
+            Par défaut, ou pour un prêt dont l'EAD est manquante, capital restant
+            dû de l'échéancier (mensualité, taux et mensualités restantes).
+        age (np.ndarray, optional): Nombre de mensualités déjà payées (0 par défaut).
+        scenarios (dict): {nom: (multiplicateur du hazard, pondération)}.
+        pd_origination (np.ndarray, optional): PD lifetime à l'origination (critère SICR relatif).
+        defaulted (np.ndarray, optional): Masque des prêts en défaut (Stage 3).
+
+    Returns:
+        dict: Tableaux par prêt : 'stage', 'pd_12m', 'pd_lifetime', 'ead',
+            'ecl_12m', 'ecl_lifetime', 'ecl' (ECL retenue selon le stage) et
+            'ecl_<scénario>' (ECL retenue sous chaque scénario).
+    """
+    pd_values = np.clip(np.asarray(pd_values, dtype=np.float64), 0.0, 1.0 - 1e-12)
+    term = term_months(term)
+    rate = np.asarray(int_rate, dtype=np.float64) / 100.0 / 12.0
+    installment = np.asarray(installment, dtype=np.float64)
+    n_remaining = term - (0 if age is None else np.asarray(age, dtype=np.int64))
+    n_remaining = np.maximum(n_remaining, 0)
+
+    names = list(scenarios)
+    multipliers = np.array([scenarios[s][0] for s in names], dtype=np.float64)
+    weights = np.array([scenarios[s][1] for s in names], dtype=np.float64)
+    weights = weights / weights.sum()
+
+    # Capital restant dû actuel : EAD observée si fournie, sinon annuité restante
+    schedule_ead = installment * _annuity_factor(rate, n_remaining)
+    if ead is None:
+        ead = schedule_ead
+    else:
+        ead = np.asarray(ead, dtype=np.float64)
+        missing = np.isnan(ead)
+        if missing.any():
+            ead = np.where(missing, schedule_ead, ead)
+
+    horizon = int(n_remaining.max()) if len(n_remaining) else 0
+    t = np.arange(1, horizon + 1)                                    # (H,)
+    alive = t[None, :] <= n_remaining[:, None]                       # (n, H)
+
+    # Perte actualisée en cas de défaut au mois t : LGD x EAD en début de mois x (1 + r)^-t.
+    # Avec v = 1 / (1 + r), le capital restant dû en début de mois t vaut
+    # EAD x (1 - v^(n-t+1)) / (1 - v^n), d'où EAD x (v^t - v^(n+1)) / (1 - v^n) une fois actualisé.
+    log_v = -np.log1p(rate)
+    discount = np.exp(log_v[:, None] * t[None, :])                  # (n, H)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = lgd * ead / -np.expm1(log_v * n_remaining)
+        loss_weight = scale[:, None] * (discount - np.exp(log_v * (n_remaining + 1))[:, None])
+    flat = rate <= 0
+    if flat.any():
+        # Taux nul : amortissement linéaire, pas d'actualisation
+        loss_weight[flat] = (lgd * ead[flat, None] * (n_remaining[flat, None] - t[None, :] + 1)
+                             / np.maximum(n_remaining[flat, None], 1))
+    loss_weight = np.where(alive, loss_weight, 0.0)                 # (n, H)
+
+    # Hazard mensuel par scénario et PD marginales (n, H, S)
+    hazard = 1.0 - (1.0 - pd_values) ** (1.0 / np.maximum(term, 1))
+    hazard = np.minimum(hazard[:, None] * multipliers[None, :], 1.0)  # (n, S)
+    survival = np.exp(np.log1p(-hazard)[:, None, :] * (t[None, :, None] - 1))
+    marginal = survival * hazard[:, None, :]
+
+    ecl_lifetime_s = np.einsum("nt,nts->ns", loss_weight, marginal)
+    ecl_12m_s = np.einsum("nt,nts->ns", loss_weight[:, :12], marginal[:, :12])
+    pd_lifetime_s = 1.0 - (1.0 - hazard) ** n_remaining[:, None]
+    pd_12m_s = 1.0 - (1.0 - hazard) ** np.minimum(n_remaining, 12)[:, None]
+
+    pd_12m = pd_12m_s @ weights
+    pd_lifetime = pd_lifetime_s @ weights
+    stage = assign_stages(pd_12m, pd_lifetime, pd_origination=pd_origination, defaulted=defaulted)
+
+    # Stage 1 : ECL 12 mois ; Stage 2 : ECL lifetime ; Stage 3 : défaut avéré (PD = 1)
+    ecl_s = np.where((stage == 1)[:, None], ecl_12m_s, ecl_lifetime_s)
+    ecl_s[stage == 3] = lgd * ead[stage == 3, None]
+
+    result = {
+        "stage": stage,
+        "pd_12m": pd_12m,
+        "pd_lifetime": pd_lifetime,
+        "ead": ead,
+        "ecl_12m": ecl_12m_s @ weights,
+        "ecl_lifetime": ecl_lifetime_s @ weights,
+        "ecl": ecl_s @ weights,
+    }
+    for j, name in enumerate(names):
+        result[f"ecl_{name}"] = ecl_s[:, j]
+    return result
+
+
+def ecl_portfolio(input_path, output_path=config.ecl_path, model_path=config.model_file,
+                  lgd=config.lgd, ead_col=config.ead_col, scenarios=config.ecl_scenarios,
+                  chunk_size=config.ecl_chunk_size, id_col=None, default_col=None, pd_origination_col=None,
+                  age_col=None, issue_date_col=config.ecl_issue_date_col, as_of=config.ecl_as_of,
+                  imputers_path=config.imputers_file, monitor=None):
+    """
+    ECL IFRS 9 (12 mois / lifetime, multi-scénarios, staging) d'un portefeuille complet.
+
+    Le portefeuille est lu par blocs ; chaque bloc est scoré par le pipeline PD
+    puis passé à `compute_ecl`. La taille des blocs borne la mémoire du
+    tenseur (prêts × mois × scénarios), environ `chunk_size` × 60 × S flottants.
+
+    Un prêt sans EAD observée (`ead_col` manquant) prend l'EAD de son
+    échéancier ; ces prêts sont comptés dans `n_missing_ead`. Un prêt non
+    scorable par le modèle PD (`portfolio.scorable_mask`) est écarté et
+    compté dans `n_unscored`.
+
+    L'EAD observée étant le capital restant dû, chaque prêt n'est projeté que
+    sur ses mensualités restantes : l'âge vient de `age_col` ou, à défaut, de
+    la date d'émission `issue_date_col` (utilisée si le fichier la contient).
+    Sans l'une ni l'autre, les prêts sont projetés sur toute leur durée.
+
+    Args:
+        input_path (str): Fichier de prêts (.csv/.parquet).
+        output_path (str): Parquet de sortie (une ligne par prêt).
+        model_path (str): Pipeline PD sauvegardé.
+        lgd (float): Loss Given Default.
+        ead_col (str, optional): Colonne du capital restant dû (None = déduit de la mensualité).
+        scenarios (dict): {nom: (multiplicateur du hazard, pondération)}.
+        chunk_size (int): Nombre de prêts par bloc.
+        id_col (str, optional): Identifiant du prêt recopié en sortie.
+        default_col (str, optional): Indicateur de défaut (Stage 3) ; une valeur manquante vaut non-défaut.
+        pd_origination_col (str, optional): PD à l'origination (critère SICR relatif).
+        age_col (str, optional): Nombre de mensualités déjà échues.
+        issue_date_col (str, optional): Date d'émission, utilisée pour l'âge si `age_col` est absent.
+        as_of (str, optional): Date d'arrêté du calcul de l'âge (aujourd'hui par défaut).
+        imputers_path (str): Imputeurs sauvegardés par `run_preprocessing`.
+        monitor (DriftMonitor, optional): Suivi de stabilité alimenté par chaque bloc scoré.
+
+    Returns:
+        dict: Agrégats (EAD, ECL, nombre de prêts et ECL par stage, ECL par scénario,
+            prêts sans EAD observée, prêts écartés, débit).
+    """
+    # Imports différés : `compute_ecl` seul (dashboard) ne charge pas la pile sklearn
+    import joblib
+    from src.imputers import load_imputers
+    from src.portfolio import model_features, iter_loan_chunks, file_columns, imputed_columns, scorable_mask
+
+    # Imputeurs et modèle appliqués séparément : le suivi de stabilité voit les variables imputées,
+    # comme la référence construite sur `train_imp.parquet`
+    imputers = load_imputers(imputers_path)
+    model = joblib.load(model_path)
+    imputed = imputed_columns(imputers)
+    if age_col is None and issue_date_col and issue_date_col not in file_columns(input_path):
+        issue_date_col = None
+    extra = [c for c in (ead_col, id_col, default_col, pd_origination_col, age_col, issue_date_col) if c]
+    columns = model_features + extra
+
+    summary = {"n_loans": 0, "n_unscored": 0, "n_missing_ead": 0, "ead": 0.0, "ecl": 0.0,
+               "by_stage": {str(s): {"n_loans": 0, "ead": 0.0, "ecl": 0.0} for s in (1, 2, 3)},
+               "by_scenario": {name: 0.0 for name in scenarios}}
+    writer = None
+    start = time.perf_counter()
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    try:
+        for chunk in iter_loan_chunks(input_path, columns, chunk_size=chunk_size):
+            scorable = scorable_mask(chunk, imputed)
+            if not scorable.all():
+                summary["n_unscored"] += int((~scorable).sum())
+                chunk = chunk[scorable]
+                if chunk.empty:
+                    continue
+            features = chunk[model_features] if imputers is None else imputers.transform(chunk[model_features])
+            pd_values = model.predict_proba(features)[:, 1]
+            if monitor is not None:
+                monitor.update(features, pd_values)
+            if age_col:
+                age = chunk[age_col].fillna(0).to_numpy(dtype=np.int64)
+            elif issue_date_col:
+                age = loan_age(chunk[issue_date_col], as_of=as_of)
+            else:
+                age = None
+            ead = chunk[ead_col].to_numpy(dtype=np.float64) if ead_col else None
+            res = compute_ecl(
+                pd_values, chunk["term"], chunk["int_rate"].to_numpy(), chunk["installment"].to_numpy(),
+                lgd=lgd, ead=ead, age=age, scenarios=scenarios,
+                pd_origination=chunk[pd_origination_col].to_numpy() if pd_origination_col else None,
+                defaulted=chunk[default_col].fillna(False).to_numpy(dtype=bool) if default_col else None,
+            )
+
+            out = pd.DataFrame({"grade": chunk["grade"].to_numpy(), "pd": pd_values, **res})
+            if id_col:
+                out.insert(0, id_col, chunk[id_col].to_numpy())
+            table = pa.Table.from_pandas(out, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+
+            summary["n_loans"] += len(out)
+            if ead is not None:
+                summary["n_missing_ead"] += int(np.isnan(ead).sum())
+            summary["ead"] += float(res["ead"].sum())
+            summary["ecl"] += float(res["ecl"].sum())
+            counts = np.bincount(res["stage"], minlength=4)
+            ead_by = np.bincount(res["stage"], weights=res["ead"], minlength=4)
+            ecl_by = np.bincount(res["stage"], weights=res["ecl"], minlength=4)
+            for s in (1, 2, 3):
+                cell = summary["by_stage"][str(s)]
+                cell["n_loans"] += int(counts[s])
+                cell["ead"] += float(ead_by[s])
+                cell["ecl"] += float(ecl_by[s])
+            for name in scenarios:
+                summary["by_scenario"][name] += float(res[f"ecl_{name}"].sum())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    summary["coverage"] = summary["ecl"] / summary["ead"] if summary["ead"] else 0.0
+    summary["lgd"] = lgd
+    summary["age_source"] = age_col or issue_date_col
+    summary["scenarios"] = {name: {"multiplier": m, "weight": w} for name, (m, w) in scenarios.items()}
+    summary["elapsed_s"] = elapsed
+    summary["rows_per_s"] = summary["n_loans"] / elapsed if elapsed > 0 else 0.0
+
+    with open(os.path.splitext(output_path)[0] + "_summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
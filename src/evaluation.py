@@ -0,0 +1,201 @@
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2
+from . import config
+
+# Scores triés, bornes des groupes d'ex-aequo et des classes de PD, partagés avec les workers
+_shared = {}
+
+_METRICS = ("auc", "gini", "ks", "brier", "hosmer_lemeshow")
+
+
+def prepare_scores(y, pd_values, n_bins=config.eval_n_bins):
+    """
+    Trie une seule fois les PD et prépare tout ce dont les métriques ont besoin.
+
+    - `starts` : début de chaque groupe de PD ex-aequo (AUC et KS sans biais sur les ex-aequo) ;
+    - `bin_starts` : début de chaque classe de PD (`n_bins` classes d'effectifs égaux,
+      découpées sur les rangs), pour Hosmer-Lemeshow et la calibration par classe.
+
+    Returns:
+        dict: Tableaux dans l'ordre croissant des PD ('order' ramène à l'ordre d'origine).
+    """
+    pd_values = np.asarray(pd_values, dtype=np.float64)
+    order = np.argsort(pd_values, kind="stable")
+    p = pd_values[order]
+    y = np.asarray(y, dtype=np.float64)[order]
+    n = len(p)
+    starts = np.flatnonzero(np.r_[True, p[1:] != p[:-1]])
+    bin_starts = np.unique(np.arange(n_bins) * n // n_bins)
+    return {"order": order, "p": p, "y": y, "sq": (p - y) ** 2, "starts": starts, "bin_starts": bin_starts}
+
+
+def _metrics(W, s):
+    """
+    AUC, Gini, KS, Brier et Hosmer-Lemeshow pour un ou plusieurs jeux de poids.
+
+    Chaque ligne de `W` (forme (B, n), dans l'ordre trié) pondère les prêts :
+    une ligne de 1 donne les métriques de l'échantillon, une ligne de comptes
+    de tirage celles d'un réplicat bootstrap. Aucun nouveau tri n'est nécessaire :
+    les sommes par groupe d'ex-aequo (`np.add.reduceat`) suivies de sommes
+    cumulées donnent l'AUC (Mann-Whitney, ex-aequo comptés pour 1/2) et le KS.
+
+    Returns:
+        dict: {métrique: tableau de B valeurs}.
+    """
+    Wy = W * s["y"]
+    pos = np.add.reduceat(Wy, s["starts"], axis=1)
+    neg = np.add.reduceat(W, s["starts"], axis=1) - pos
+    n_pos, n_neg = pos.sum(axis=1), neg.sum(axis=1)
+    cum_pos, cum_neg = np.cumsum(pos, axis=1), np.cumsum(neg, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        auc = (pos * (cum_neg - 0.5 * neg)).sum(axis=1) / (n_pos * n_neg)
+        ks = np.abs(cum_pos / n_pos[:, None] - cum_neg / n_neg[:, None]).max(axis=1)
+        brier = W @ s["sq"] / W.sum(axis=1)
+
+        n_bin = np.add.reduceat(W, s["bin_starts"], axis=1)
+        observed = np.add.reduceat(Wy, s["bin_starts"], axis=1)
+        expected = np.add.reduceat(W * s["p"], s["bin_starts"], axis=1)
+        hl = np.nansum((observed - expected) ** 2 / (expected * (1 - expected / n_bin)), axis=1)
+    return {"auc": auc, "gini": 2 * auc - 1, "ks": ks, "brier": brier, "hosmer_lemeshow": hl}
+
+
+def _init_worker(state):
+    _shared.update(state)
+
+
+def _bootstrap_task(task):
+    """
+    Métriques de `n_replicates` réplicats bootstrap, calculées par paquets de `chunk`.
+
+    Les poids de chaque paquet (comptes de tirages avec remise, loi multinomiale)
+    sont obtenus d'un seul `np.bincount` sur les indices tirés, décalés par réplicat.
+    """
+    task_id, n_replicates, chunk, random_state = task
+    s = _shared
+    n = len(s["p"])
+    rng = np.random.default_rng([random_state, task_id])
+    out = {m: [] for m in _METRICS}
+    for start in range(0, n_replicates, chunk):
+        b = min(chunk, n_replicates - start)
+        idx = rng.integers(0, n, size=(b, n)) + (np.arange(b) * n)[:, None]
+        W = np.bincount(idx.ravel(), minlength=b * n).reshape(b, n).astype(np.float64)
+        for name, values in _metrics(W, s).items():
+            out[name].append(values)
+    return {name: np.concatenate(values) for name, values in out.items()}
+
+
+def bootstrap_metrics(scores, n_bootstrap=config.eval_n_bootstrap, n_jobs=config.eval_n_jobs,
+                      chunk=config.eval_bootstrap_chunk, random_state=config.random_state):
+    """
+    Distribution bootstrap des métriques, sur un pool de processus.
+
+    Les scores triés (`prepare_scores`) sont envoyés une fois à chaque worker ;
+    chaque tâche tire ses réplicats sous forme de poids, par paquets vectorisés,
+    et réutilise le tri de l'échantillon.
+
+    Returns:
+        pd.DataFrame: Une ligne par réplicat, une colonne par métrique.
+    """
+    n_tasks = max(1, min(n_jobs or os.cpu_count() or 1, -(-n_bootstrap // chunk)))
+    sizes = [n_bootstrap // n_tasks + (i < n_bootstrap % n_tasks) for i in range(n_tasks)]
+    tasks = [(i, size, chunk, random_state) for i, size in enumerate(sizes) if size]
+    state = {k: v for k, v in scores.items() if k != "order"}
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(state,)) as pool:
+        parts = list(pool.map(_bootstrap_task, tasks))
+    return pd.DataFrame({m: np.concatenate([part[m] for part in parts]) for m in _METRICS})
+
+
+def calibration_table(y, pd_values, groups):
+    """
+    Calibration par groupe : taux de défaut observé vs PD moyenne.
+
+    `z` est l'écart standardisé (défauts observés - attendus) / √Σ PD (1 - PD) :
+    |z| > 1.96 signale une sous- ou sur-estimation significative à 5 %.
+    """
+    df = pd.DataFrame({"group": np.asarray(groups), "y": np.asarray(y, dtype=np.float64),
+                       "pd": np.asarray(pd_values, dtype=np.float64)})
+    df["var"] = df["pd"] * (1 - df["pd"])
+    table = df.groupby("group", observed=True).agg(n=("y", "size"), n_defaults=("y", "sum"), pd_sum=("pd", "sum"),
+                                                  pd_min=("pd", "min"), pd_max=("pd", "max"), var=("var", "sum"))
+    table["default_rate"] = table["n_defaults"] / table["n"]
+    table["pd_mean"] = table.pop("pd_sum") / table["n"]
+    table["z"] = (table["n_defaults"] - table["pd_mean"] * table["n"]) / np.sqrt(table.pop("var"))
+    table["n_defaults"] = table["n_defaults"].astype(np.int64)
+    return table.reset_index()
+
+
+def evaluation_report(y, pd_values, grades=None, n_bins=config.eval_n_bins, n_bootstrap=config.eval_n_bootstrap,
+                      ci=config.eval_ci, n_jobs=config.eval_n_jobs, random_state=config.random_state):
+    """
+    Rapport de validation d'un jeu scoré (format IFRS 9).
+
+    1. Les PD sont triées une seule fois (`prepare_scores`).
+    2. AUC, Gini, KS, Brier et Hosmer-Lemeshow (`n_bins` classes, p-value à
+       `n_bins` - 2 degrés de liberté) sont calculés sur ce tri.
+    3. Les intervalles de confiance sont les percentiles de `n_bootstrap`
+       réplicats (`bootstrap_metrics`, 0 pour s'en passer).
+    4. La calibration est détaillée par classe de PD et, si `grades` est fourni, par grade.
+
+    Args:
+        y (array-like): Défaut observé (0/1).
+        pd_values (array-like): PD prédites.
+        grades (array-like, optional): Grade de chaque prêt.
+        n_bins (int): Nombre de classes de PD (déciles par défaut).
+        n_bootstrap (int): Nombre de réplicats bootstrap.
+        ci (float): Niveau des intervalles de confiance.
+        n_jobs (int): Nombre de processus du bootstrap.
+
+    Returns:
+        dict: 'n', 'n_defaults', 'metrics' ({métrique: {'value', 'ci_low', 'ci_high'}}),
+            'calibration_decile' et 'calibration_grade' (listes de lignes).
+    """
+    scores = prepare_scores(y, pd_values, n_bins=n_bins)
+    point = {name: float(values[0]) for name, values in _metrics(np.ones((1, len(scores["p"]))), scores).items()}
+    metrics = {name: {"value": value} for name, value in point.items()}
+    metrics["hosmer_lemeshow"]["p_value"] = float(chi2.sf(point["hosmer_lemeshow"], len(scores["bin_starts"]) - 2))
+
+    if n_bootstrap:
+        replicates = bootstrap_metrics(scores, n_bootstrap=n_bootstrap, n_jobs=n_jobs, random_state=random_state)
+        q = [(1 - ci) / 2, (1 + ci) / 2]
+        for name in _METRICS:
+            low, high = np.nanquantile(replicates[name], q)
+            metrics[name].update({"ci_low": float(low), "ci_high": float(high)})
+
+    # Classes de PD : positions dans l'ordre trié, ramenées à l'ordre d'origine
+    bins = np.empty(len(scores["p"]), dtype=np.int64)
+    bins[scores["order"]] = np.searchsorted(scores["bin_starts"], np.arange(len(scores["p"])), side="right")
+    report = {
+        "n": len(scores["p"]),
+        "n_defaults": int(scores["y"].sum()),
+        "metrics": metrics,
+        "calibration_decile": calibration_table(y, pd_values, bins).rename(columns={"group": "bin"})
+                                                                  .to_dict(orient="records"),
+    }
+    if grades is not None:
+        report["calibration_grade"] = calibration_table(y, pd_values, grades).rename(columns={"group": "grade"}) \
+                                                                             .to_dict(orient="records")
+    return report
+
+
+def print_report(name, report):
+    """Affiche les métriques (avec IC) et la calibration par grade d'un rapport."""
+    print(f"{name}: {report['n']:,} prêts, {report['n_defaults']:,} défauts")
+    for metric, m in report["metrics"].items():
+        ci = f" [{m['ci_low']:.4f}, {m['ci_high']:.4f}]" if "ci_low" in m else ""
+        print(f"   {metric:<16} {m['value']:.4f}{ci}")
+    if "calibration_grade" in report:
+        print(pd.DataFrame(report["calibration_grade"])[["grade", "n", "default_rate", "pd_mean", "z"]]
+              .to_string(index=False, float_format="{:.4f}".format))
+
+
+def save_report(reports, path=config.eval_report_path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(reports, f, indent=2, default=str)
+    os.replace(tmp, path)
+    return path
@@ -0,0 +1,455 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import subprocess
+import numpy as np
+from . import config
+
+# Version du format de l'artefact allégé (incrémentée à chaque changement incompatible)
+SLIM_FORMAT_VERSION = 1
+
+
+class LinearPDScorer:
+    """
+    Scorer PD vectorisé, extrait du pipeline sklearn (StandardScaler + OrdinalEncoder + LogisticRegression).
+
+    Le logit du modèle est
+        b + Σ w_i (x_i - μ_i) / σ_i + Σ w_j code_j(x_j)
+    On le précalcule sous la forme
+        b' + Σ w'_i x_i + Σ T_j[code_j(x_j)]
+    avec w'_i = w_i / σ_i, b' = b - Σ w_i μ_i / σ_i et T_j la contribution de
+    chaque modalité. Le scoring se réduit alors à une combinaison linéaire, des
+    lookups de tables et une sigmoïde, sans DataFrame ni `ColumnTransformer`.
+
+    Args:
+        num_features (list): Colonnes numériques, dans l'ordre de `num_weights`.
+        num_weights (np.ndarray): Poids w'_i des variables numériques brutes.
+        intercept (float): Constante b'.
+        cat_features (list): Colonnes catégorielles.
+        categories (list): Modalités de chaque colonne catégorielle (ordre de l'encodeur).
+        cat_tables (list): Contribution au logit de chaque modalité.
+    """
+
+    def __init__(self, num_features, num_weights, intercept, cat_features, categories, cat_tables):
+        self.num_features = list(num_features)
+        self.num_weights = np.asarray(num_weights, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.cat_features = list(cat_features)
+        self.categories = [np.asarray(c, dtype=object) for c in categories]
+        self.cat_tables = [np.asarray(t, dtype=np.float64) for t in cat_tables]
+        self._lookups = [{c: i for i, c in enumerate(cats)} for cats in self.categories]
+        self.model_version = None
+
+    @classmethod
+    def from_pipeline(cls, model):
+        """
+        Extrait les paramètres fittés d'un pipeline issu de `model_trainning`.
+
+        Args:
+            model (Pipeline): Pipeline ('preprocessor' -> 'classifier').
+
+        Returns:
+            LinearPDScorer
+        """
+        preprocessor = model.named_steps["preprocessor"]
+        classifier = model.named_steps["classifier"]
+        coef = classifier.coef_.ravel()
+
+        transformers = {name: (trans, cols) for name, trans, cols in preprocessor.transformers_}
+        num_trans, num_cols = transformers["num"]
+        cat_trans, cat_cols = transformers["cat"]
+        scaler = num_trans.named_steps["scaler"]
+        encoder = cat_trans.named_steps["ord_enc"]
+
+        # Les sorties du ColumnTransformer sont concaténées : numériques puis catégorielles
+        w_num = coef[:len(num_cols)]
+        w_cat = coef[len(num_cols):len(num_cols) + len(cat_cols)]
+
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(len(num_cols))
+        scale = scaler.scale_ if scaler.with_std else np.ones(len(num_cols))
+        num_weights = w_num / scale
+        intercept = classifier.intercept_[0] - float(np.dot(w_num, mean / scale))
+
+        categories = encoder.categories_
+        cat_tables = [w * np.arange(len(cats), dtype=np.float64) for w, cats in zip(w_cat, categories)]
+        return cls(num_cols, num_weights, intercept, cat_cols, categories, cat_tables)
+
+    def save(self, path=config.fast_scorer_file):
+        """Sauvegarde les tableaux du scorer dans une archive `.npz` (sans pickle)."""
+        arrays = {
+            "num_features": np.asarray(self.num_features, dtype=str),
+            "num_weights": self.num_weights,
+            "intercept": np.asarray(self.intercept),
+            "cat_features": np.asarray(self.cat_features, dtype=str),
+        }
+        for j, (cats, table) in enumerate(zip(self.categories, self.cat_tables)):
+            arrays[f"categories_{j}"] = cats.astype(str)
+            arrays[f"cat_table_{j}"] = table
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path=config.fast_scorer_file):
+        """Recharge un scorer sauvegardé par `save`."""
+        with np.load(path, allow_pickle=False) as f:
+            cat_features = f["cat_features"].tolist()
+            return cls(
+                num_features=f["num_features"].tolist(),
+                num_weights=f["num_weights"],
+                intercept=float(f["intercept"]),
+                cat_features=cat_features,
+                categories=[f[f"categories_{j}"].tolist() for j in range(len(cat_features))],
+                cat_tables=[f[f"cat_table_{j}"] for j in range(len(cat_features))],
+            )
+
+    def save_slim(self, path=config.slim_model_dir, model_version=None):
+        """
+        Sauvegarde le scorer au format allégé : un `.npy` par tableau et un `metadata.json`.
+
+        Le JSON décrit le format, la version du modèle, les colonnes, les modalités
+        et chaque tableau (fichier, dtype, forme, SHA-256). Il est écrit en dernier
+        et de façon atomique : un dossier sans `metadata.json` n'est pas un artefact.
+
+        Args:
+            path (str): Dossier de l'artefact.
+            model_version (str, optional): Identifiant du modèle source (ex: empreinte du pickle).
+
+        Returns:
+            str: Chemin du `metadata.json`.
+        """
+        os.makedirs(path, exist_ok=True)
+        arrays = {"num_weights": self.num_weights}
+        arrays.update({f"cat_table_{j}": table for j, table in enumerate(self.cat_tables)})
+
+        described = {}
+        for name, array in arrays.items():
+            file_name = f"{name}.npy"
+            np.save(os.path.join(path, file_name), np.ascontiguousarray(array, dtype=np.float64))
+            with open(os.path.join(path, file_name), "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            described[name] = {"file": file_name, "dtype": "float64", "shape": list(array.shape), "sha256": digest}
+
+        metadata = {
+            "format_version": SLIM_FORMAT_VERSION,
+            "model_type": "linear_pd",
+            "model_version": model_version,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "intercept": self.intercept,
+            "num_features": self.num_features,
+            "cat_features": self.cat_features,
+            "categories": [[str(c) for c in cats] for cats in self.categories],
+            "arrays": described,
+        }
+        meta_path = os.path.join(path, "metadata.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(meta_path + ".tmp", meta_path)
+        return meta_path
+
+    @classmethod
+    def load_slim(cls, path=config.slim_model_dir, mmap=True, verify=False):
+        """
+        Recharge un artefact allégé sans sklearn, pandas ni pickle.
+
+        Les tableaux sont projetés en mémoire (`np.load(mmap_mode='r')`) : le
+        chargement ne lit que le JSON, les pages sont lues au premier scoring et
+        partagées entre les processus qui servent le même fichier.
+
+        Args:
+            path (str): Dossier de l'artefact.
+            mmap (bool): Projection mémoire (sinon lecture complète).
+            verify (bool): Contrôle les SHA-256 des tableaux (lit les fichiers).
+
+        Raises:
+            ValueError: Format inconnu ou tableau corrompu.
+        """
+        with open(os.path.join(path, "metadata.json")) as f:
+            metadata = json.load(f)
+        if metadata.get("format_version") != SLIM_FORMAT_VERSION:
+            raise ValueError(f"Format d'artefact {metadata.get('format_version')} non supporté "
+                             f"(attendu: {SLIM_FORMAT_VERSION})")
+
+        arrays = {}
+        for name, desc in metadata["arrays"].items():
+            file_path = os.path.join(path, desc["file"])
+            if verify:
+                with open(file_path, "rb") as f:
+                    if hashlib.sha256(f.read()).hexdigest() != desc["sha256"]:
+                        raise ValueError(f"Empreinte invalide pour '{desc['file']}'")
+            arrays[name] = np.load(file_path, mmap_mode="r" if mmap else None, allow_pickle=False)
+            if list(arrays[name].shape) != desc["shape"]:
+                raise ValueError(f"Forme inattendue pour '{desc['file']}': {arrays[name].shape}")
+
+        scorer = cls(
+            num_features=metadata["num_features"],
+            num_weights=arrays["num_weights"],
+            intercept=metadata["intercept"],
+            cat_features=metadata["cat_features"],
+            categories=metadata["categories"],
+            cat_tables=[arrays[f"cat_table_{j}"] for j in range(len(metadata["cat_features"]))],
+        )
+        scorer.model_version = metadata.get("model_version")
+        return scorer
+
+    def _codes_of(self, j, values):
+        """Codes ordinaux de valeurs brutes (lookup dans la table des modalités)."""
+        lookup = self._lookups[j]
+        try:
+            return np.fromiter(map(lookup.__getitem__, values), dtype=np.intp, count=len(values))
+        except KeyError:
+            unknown = sorted({str(v) for v in values if v not in lookup})
+            raise ValueError(f"Modalités inconnues {unknown} pour la colonne '{self.cat_features[j]}'") from None
+
+    def _cat_codes(self, j, values):
+        """
+        Codes ordinaux d'une colonne catégorielle.
+
+        Les colonnes déjà encodées en dictionnaire (Arrow `DictionaryArray`,
+        pandas `category`) ne traduisent que leur dictionnaire ; les autres
+        sont traduites valeur par valeur via une table de hachage.
+        """
+        if hasattr(values, "combine_chunks"):
+            values = values.combine_chunks()
+        if hasattr(values, "dictionary") and hasattr(values, "indices"):
+            if values.null_count:
+                raise ValueError(f"Valeurs manquantes dans la colonne '{self.cat_features[j]}'")
+            return self._codes_of(j, values.dictionary.to_pylist())[values.indices.to_numpy()]
+        if hasattr(values, "to_pylist"):
+            values = values.to_numpy(zero_copy_only=False)
+        if hasattr(values, "cat"):
+            if values.isna().any():
+                raise ValueError(f"Valeurs manquantes dans la colonne '{self.cat_features[j]}'")
+            return self._codes_of(j, list(values.cat.categories))[values.cat.codes.to_numpy()]
+        return self._codes_of(j, values)
+
+    def logit(self, columns):
+        """
+        Logit du modèle pour des colonnes brutes.
+
+        Args:
+            columns (Mapping): {nom de colonne: tableau NumPy, Series ou colonne Arrow}.
+
+        Returns:
+            np.ndarray: Logits (float64), un par ligne.
+        """
+        z = np.full(len(columns[self.num_features[0]]), self.intercept)
+        for c, w in zip(self.num_features, self.num_weights):
+            z += w * np.asarray(columns[c], dtype=np.float64)
+        for j, col in enumerate(self.cat_features):
+            z += self.cat_tables[j][self._cat_codes(j, columns[col])]
+        return z
+
+    def predict_pd(self, columns):
+        """Probabilité de défaut (classe 1) pour des colonnes brutes."""
+        return 1.0 / (1.0 + np.exp(-self.logit(columns)))
+
+    def predict_proba(self, columns):
+        """Même sortie que `Pipeline.predict_proba` : colonnes [P(0), P(1)]."""
+        p = self.predict_pd(columns)
+        return np.column_stack([1.0 - p, p])
+
+
+def check_parity(model, df, scorer=None, atol=1e-9):
+    """
+    Vérifie que le scorer rapide reproduit `model.predict_proba`.
+
+    Args:
+        model (Pipeline): Pipeline sklearn de référence.
+        df (pd.DataFrame): Prêts de contrôle (features du modèle).
+        scorer (LinearPDScorer, optional): Scorer à vérifier (extrait de `model` par défaut).
+        atol (float): Écart absolu maximal toléré sur la PD.
+
+    Returns:
+        float: Écart absolu maximal observé.
+
+    Raises:
+        AssertionError: Si l'écart dépasse `atol`.
+    """
+    scorer = scorer or LinearPDScorer.from_pipeline(model)
+    expected = model.predict_proba(df)[:, 1]
+    got = scorer.predict_pd({c: df[c].to_numpy() for c in df.columns})
+    max_diff = float(np.max(np.abs(expected - got))) if len(df) else 0.0
+    if max_diff > atol:
+        raise AssertionError(f"Écart de parité {max_diff:.3e} > {atol:.1e}")
+    return max_diff
+
+
+def benchmark(model, df, batch_sizes=(1, 100, 10_000, 1_000_000), repeat=5):
+    """
+    Compare les temps de scoring du pipeline sklearn et du scorer rapide.
+
+    Pour chaque taille de batch, on mesure le meilleur temps sur `repeat`
+    exécutions, en partant d'un DataFrame (sklearn) et de colonnes NumPy
+    déjà extraites (scorer rapide).
+
+    Returns:
+        list: Un dict par taille de batch (temps en ms, µs par ligne, gain).
+    """
+    scorer = LinearPDScorer.from_pipeline(model)
+    results = []
+    for n in batch_sizes:
+        batch = df.sample(n=n, replace=len(df) < n, random_state=0).reset_index(drop=True)
+        columns = {c: batch[c].to_numpy() for c in batch.columns}
+
+        def best_of(fn):
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - t0)
+            return min(times)
+
+        t_sklearn = best_of(lambda: model.predict_proba(batch))
+        t_fast = best_of(lambda: scorer.predict_pd(columns))
+        results.append({
+            "batch_size": n,
+            "sklearn_ms": t_sklearn * 1000,
+            "fast_ms": t_fast * 1000,
+            "sklearn_us_per_row": t_sklearn / n * 1e6,
+            "fast_us_per_row": t_fast / n * 1e6,
+            "speedup": t_sklearn / t_fast,
+        })
+    return results
+
+
+def export_scorer(model_path=config.model_file, out_path=config.fast_scorer_file):
+    """
+    Exporte le pipeline sauvegardé (`scoring_model.pkl`) en scorer rapide `.npz`.
+
+    Returns:
+        LinearPDScorer: Le scorer exporté.
+    """
+    import joblib
+
+    scorer = LinearPDScorer.from_pipeline(joblib.load(model_path))
+    scorer.save(out_path)
+    return scorer
+
+
+def export_slim(model_path=config.model_file, out_dir=config.slim_model_dir):
+    """
+    Exporte le pipeline sauvegardé au format allégé (`save_slim`).
+
+    La version du modèle est l'empreinte SHA-256 (12 caractères) du pickle source.
+
+    Returns:
+        LinearPDScorer: Le scorer exporté.
+    """
+    import joblib
+
+    scorer = LinearPDScorer.from_pipeline(joblib.load(model_path))
+    scorer.save_slim(out_dir, model_version=model_version(model_path))
+    return scorer
+
+
+def model_version(model_path=config.model_file):
+    """Version d'un pickle de modèle : empreinte SHA-256 (12 caractères) de son contenu."""
+    with open(model_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def slim_is_current(model_path=config.model_file, slim_dir=config.slim_model_dir):
+    """
+    Vrai si l'artefact allégé existe et a été exporté depuis le pickle actuel.
+
+    Après un réentraînement, l'artefact d'un ancien modèle n'est pas réutilisé.
+    """
+    meta_path = os.path.join(slim_dir, "metadata.json")
+    if not os.path.exists(meta_path) or not os.path.exists(model_path):
+        return False
+    with open(meta_path) as f:
+        return json.load(f).get("model_version") == model_version(model_path)
+
+
+# Code exécuté dans un interpréteur neuf par `measure_cold_start` (un par mesure)
+_COLD_START_CODE = {
+    "pickle": """
+import json, sys, time
+t0 = time.perf_counter()
+import joblib
+import pandas as pd
+t1 = time.perf_counter()
+model = joblib.load(sys.argv[1])
+t2 = time.perf_counter()
+pd_value = float(model.predict_proba(pd.DataFrame({k: [v] for k, v in json.loads(sys.argv[2]).items()}))[0, 1])
+t3 = time.perf_counter()
+""",
+    "slim": """
+import json, sys, time
+t0 = time.perf_counter()
+from src.fast_scorer import LinearPDScorer
+t1 = time.perf_counter()
+scorer = LinearPDScorer.load_slim(sys.argv[1])
+t2 = time.perf_counter()
+pd_value = float(scorer.predict_pd({k: [v] for k, v in json.loads(sys.argv[2]).items()})[0])
+t3 = time.perf_counter()
+""",
+}
+_COLD_START_REPORT = """
+print(json.dumps({"import_s": t1 - t0, "load_s": t2 - t1, "first_predict_s": t3 - t2, "pd": pd_value,
+                  "sklearn_imported": "sklearn" in sys.modules, "pandas_imported": "pandas" in sys.modules}))
+"""
+
+
+def measure_cold_start(model_path=config.model_file, slim_dir=config.slim_model_dir, repeat=5):
+    """
+    Mesure le démarrage à froid du scoring : pickle sklearn (`joblib.load`) contre artefact allégé.
+
+    Chaque mesure lance un interpréteur Python neuf (aucun module déjà
+    importé) qui importe le runtime, charge le modèle et score un prêt. On
+    relève l'import, le chargement, la première prédiction et le temps total
+    du processus (démarrage de l'interpréteur compris). Le cache disque de
+    l'OS est chaud après la première exécution : les médianes mesurent le
+    coût CPU du démarrage, pas celui des lectures disque.
+
+    Args:
+        model_path (str): Pipeline sklearn sauvegardé.
+        slim_dir (str): Artefact allégé exporté par `export_slim`.
+        repeat (int): Nombre de processus par mode.
+
+    Returns:
+        list: Un dict par mode (médianes en ms, modules lourds importés, PD obtenue).
+    """
+    scorer = LinearPDScorer.load_slim(slim_dir)
+    # Prêt de référence : modalités de référence et variables numériques à 1
+    loan = {c: 1.0 for c in scorer.num_features}
+    loan.update({c: str(cats[0]) for c, cats in zip(scorer.cat_features, scorer.categories)})
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    results = []
+    for mode, path in (("pickle", model_path), ("slim", slim_dir)):
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", _COLD_START_CODE[mode] + _COLD_START_REPORT,
+                                  os.path.abspath(path), json.dumps(loan)],
+                                 cwd=root, capture_output=True, text=True, check=True)
+            run = json.loads(out.stdout.strip().splitlines()[-1])
+            run["process_s"] = time.perf_counter() - start
+            runs.append(run)
+        results.append({
+            "mode": mode,
+            **{f"{k[:-2]}_ms": float(np.median([r[k] for r in runs]) * 1000)
+               for k in ("import_s", "load_s", "first_predict_s", "process_s")},
+            "sklearn_imported": runs[0]["sklearn_imported"],
+            "pandas_imported": runs[0]["pandas_imported"],
+            "pd": runs[0]["pd"],
+        })
+    return results
+
+
+if __name__ == "__main__":
+    import joblib
+    import pandas as pd
+
+    model = joblib.load(config.model_file)
+    scorer = export_scorer(config.model_file, config.fast_scorer_file)
+    print(f"Scorer rapide exporté dans {config.fast_scorer_file}")
+    export_slim(config.model_file, config.slim_model_dir)
+    print(f"Artefact allégé exporté dans {config.slim_model_dir}")
+
+    df = pd.read_parquet(config.test_path, columns=scorer.num_features + scorer.cat_features)
+    print(f"Parité avec predict_proba : écart max = {check_parity(model, df, LinearPDScorer.load()):.2e}")
+    print(pd.DataFrame(benchmark(model, df)).to_string(index=False))
+    print(pd.DataFrame(measure_cold_start(config.model_file, config.slim_model_dir)).to_string(index=False))
@@ -0,0 +1,290 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler, OneHotEncoder, OrdinalEncoder
+from sklearn.compose import ColumnTransformer
+from src.neighbors import make_backend, block_categories, block_labels
+from src.instrumentation import stage
+from . import config
+
+
+class DeterministicImputer(BaseEstimator, TransformerMixin):
+    """
+    Imputation déterministe (moyenne/mode) des variables à faible % de NaN.
+
+    `fit` sélectionne les colonnes de `var` ayant entre 0 et `max_na_pct` % de
+    valeurs manquantes sur le train (plus 'annual_inc', toujours imputée) et
+    apprend la moyenne (numériques) ou le mode (catégorielles). `transform`
+    applique ces valeurs à n'importe quel lot, sans réapprentissage.
+
+    Args:
+        var (list): Colonnes candidates à l'imputation.
+        max_na_pct (float): Seuil maximal de NaN (en %) pour l'imputation déterministe.
+    """
+
+    def __init__(self, var, max_na_pct=10):
+        self.var = var
+        self.max_na_pct = max_na_pct
+
+    def fit(self, X, y=None):
+        per = round((X[self.var].isna().sum() / X.shape[0]) * 100, 2)
+        col_fill = [p for p in self.var if 0 < per[p] <= self.max_na_pct]
+        if 'annual_inc' not in col_fill and 'annual_inc' in X.columns:
+            col_fill.append('annual_inc')
+
+        self.num_cols_ = [n for n in col_fill if pd.api.types.is_numeric_dtype(X[n])]
+        self.cat_cols_ = [ch for ch in col_fill if not pd.api.types.is_numeric_dtype(X[ch])]
+
+        #  Imputation Numérique (Moyenne)
+        self.imp_mean_ = SimpleImputer(strategy='mean').fit(X[self.num_cols_]) if self.num_cols_ else None
+        #  Imputation Catégorielle (Mode)
+        self.imp_mode_ = SimpleImputer(strategy='most_frequent').fit(X[self.cat_cols_]) if self.cat_cols_ else None
+        return self
+
+    def transform(self, X):
+        X_imp = X.copy()
+        if self.imp_mean_ is not None:
+            X_imp[self.num_cols_] = self.imp_mean_.transform(X_imp[self.num_cols_])
+        if self.imp_mode_ is not None:
+            X_imp[self.cat_cols_] = self.imp_mode_.transform(X_imp[self.cat_cols_])
+        return X_imp
+
+
+class HotDeckKNNImputer(BaseEstimator, TransformerMixin):
+    """
+    Imputation k-NN stochastique (hot-deck) réutilisable.
+
+    `fit` apprend le preprocessor des variables auxiliaires, identifie les
+    donneurs (lignes sans NaN sur `target_vars`) et construit l'index des
+    voisins. L'objet conserve la matrice prétraitée des donneurs et leurs
+    valeurs cibles : `transform` sur un nouveau lot ne coûte donc qu'une
+    requête de voisinage suivie d'un tirage aléatoire parmi les k voisins.
+    Le tirage ne dépend que de `random_state` et du contenu de la ligne (aucun
+    état modifié par `transform`) : un même prêt reçoit le même donneur quels
+    que soient le lot, l'ordre des lignes ou les appels précédents.
+
+    Args:
+        target_vars (list): Colonnes à imputer (ex: ['open_acc_6m', ...]).
+        numeric_features (list): Colonnes numériques pour le k-NN.
+        categorical_features_ordinal (list): Colonnes ordinales (ex: ['grade']).
+        grade_order (list): Ordre des catégories pour la variable 'grade'.
+        categorical_features_nominal (list): Colonnes nominales (ex: ['home_ownership']).
+        k_neighbors (int): Nombre de voisins à considérer.
+        random_state (int): Seed du tirage aléatoire du donneur.
+        backend (str): Backend de recherche des voisins (voir `src.neighbors`).
+        block_keys (list, optional): Colonnes définissant les blocs du backend 'blocked'.
+        lean (bool): Matrices allégées (voir `_design_matrix`) : float32, one-hot
+            écrit directement à partir des codes, donneurs et receveurs
+            sélectionnés par tableaux d'indices, colonne par colonne.
+    """
+
+    def __init__(self, target_vars, numeric_features, categorical_features_ordinal,
+                 grade_order, categorical_features_nominal, k_neighbors=10,
+                 random_state=44, backend="auto", block_keys=None, lean=False):
+        self.target_vars = target_vars
+        self.numeric_features = numeric_features
+        self.categorical_features_ordinal = categorical_features_ordinal
+        self.grade_order = grade_order
+        self.categorical_features_nominal = categorical_features_nominal
+        self.k_neighbors = k_neighbors
+        self.random_state = random_state
+        self.backend = backend
+        self.block_keys = block_keys
+        self.lean = lean
+
+    @property
+    def aux_vars(self):
+        return self.numeric_features + self.categorical_features_ordinal + self.categorical_features_nominal
+
+    def _design_matrix(self, X, rows):
+        """
+        Matrice des variables auxiliaires des lignes `rows` de X (sortie du preprocessor).
+
+        Chemin standard : sélection des lignes (copie du DataFrame) puis
+        `ColumnTransformer.transform`, en float64.
+
+        Chemin allégé (`lean=True`) : la matrice float32 est allouée une fois et
+        remplie colonne par colonne, en ne lisant que les lignes `rows` de
+        chaque colonne utile (aucune copie du DataFrame). Les blocs one-hot sont
+        écrits à partir des codes des modalités (un 1 par ligne) au lieu de
+        passer par la matrice creuse puis dense de l'encodeur. Même disposition
+        que le preprocessor : numériques, one-hot nominales, ordinales. Une
+        modalité ordinale inconnue (ou manquante) lève une ValueError, comme
+        l'OrdinalEncoder du chemin standard.
+        """
+        # Imputeurs sauvegardés avant l'option `lean` : chemin standard
+        if not getattr(self, "lean", False):
+            return np.asarray(self.preprocessor_.transform(X.iloc[rows][self.aux_vars]), dtype=np.float64)
+
+        scaler = self.preprocessor_.named_transformers_["num"]
+        one_hot = self.preprocessor_.named_transformers_["cat_nom"]
+        ordinal = self.preprocessor_.named_transformers_["cat_ord"]
+        n_one_hot = sum(len(c) for c in one_hot.categories_)
+        n_cols = len(self.numeric_features) + n_one_hot + len(self.categorical_features_ordinal)
+        out = np.zeros((len(rows), n_cols), dtype=np.float32)
+
+        for j, col in enumerate(self.numeric_features):
+            values = X[col].to_numpy(dtype=np.float32)[rows]
+            out[:, j] = (values - np.float32(scaler.mean_[j])) / np.float32(scaler.scale_[j])
+
+        offset = len(self.numeric_features)
+        for col, cats in zip(self.categorical_features_nominal, one_hot.categories_):
+            codes = pd.Index(cats).get_indexer(X[col].to_numpy()[rows])
+            known = np.flatnonzero(codes >= 0)  # modalité inconnue : ligne de zéros (handle_unknown='ignore')
+            out[known, offset + codes[known]] = 1.0
+            offset += len(cats)
+
+        for col, cats in zip(self.categorical_features_ordinal, ordinal.categories_):
+            values = X[col].to_numpy()[rows]
+            codes = pd.Index(cats).get_indexer(values)
+            if (codes < 0).any():
+                # Comme l'OrdinalEncoder du chemin standard (handle_unknown='error'), NaN compris
+                unknown = pd.unique(values[codes < 0]).tolist()
+                raise ValueError(f"Modalités inconnues {unknown} dans la colonne '{col}'")
+            out[:, offset] = codes
+            offset += 1
+        return out
+
+    def fit(self, X, y=None):
+        self.preprocessor_ = ColumnTransformer(
+            transformers=[
+                ('num', StandardScaler(), self.numeric_features),
+                ('cat_nom', OneHotEncoder(handle_unknown='ignore'), self.categorical_features_nominal),
+                ('cat_ord', OrdinalEncoder(categories=[self.grade_order]), self.categorical_features_ordinal)
+            ],
+            remainder='passthrough'
+        )
+        with stage("preprocessor_fit", rows=len(X)):
+            self.preprocessor_.fit(X[self.aux_vars])
+
+        # Donneurs : lignes du train sans NaN sur les variables cibles (indices, sans copier X)
+        donor_rows = np.flatnonzero(X[self.target_vars].notna().all(axis=1).to_numpy())
+        with stage("donors_transform", rows=len(donor_rows)):
+            self.donor_X_ = self._design_matrix(X, donor_rows)
+            self.donor_values_ = X[self.target_vars].to_numpy(dtype=np.float64)[donor_rows]
+
+        donor_groups = None
+        if self.backend == "blocked":
+            donor_keys = X[self.block_keys].iloc[donor_rows]
+            self.block_categories_ = block_categories(donor_keys, self.block_keys)
+            donor_groups = block_labels(donor_keys, self.block_keys, self.block_categories_)
+
+        with stage("index_build", rows=len(donor_rows)):
+            self.nn_model_ = make_backend(self.backend, n_neighbors=self.k_neighbors)
+            self.nn_model_.fit(self.donor_X_, groups=donor_groups)
+        return self
+
+    def _draw(self, X, recipient_rows, k):
+        """
+        Rang (0..k-1) du donneur tiré pour chaque receveur.
+
+        Le tirage est dérivé de l'empreinte de la ligne (`hash_pandas_object`
+        sur les variables auxiliaires et cibles) mélangée à `random_state`
+        (finaliseur splitmix64) : il est déterministe, vectorisé, et ne dépend
+        ni de la position de la ligne dans le lot ni de l'historique des appels.
+        """
+        row_hash = pd.util.hash_pandas_object(X.iloc[recipient_rows][self.aux_vars + self.target_vars],
+                                              index=False).to_numpy(dtype=np.uint64)
+        seed = np.uint64((self.random_state or 0) & 0xFFFFFFFFFFFFFFFF)
+        with np.errstate(over="ignore"):
+            z = row_hash ^ (seed * np.uint64(0x9E3779B97F4A7C15))
+            z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            z ^= z >> np.uint64(31)
+        return (z % np.uint64(k)).astype(np.intp)
+
+    def kneighbors(self, X):
+        """
+        Identifie les receveurs de X et recherche leurs k voisins parmi les donneurs.
+
+        Returns:
+            tuple: (masque booléen des receveurs, indices (n_receveurs, k) des donneurs).
+        """
+        # Un receveur est une ligne avec au moins un NaN dans les cibles
+        is_recipient = X[self.target_vars].isna().any(axis=1).to_numpy()
+        if not is_recipient.any():
+            return is_recipient, np.empty((0, self.k_neighbors), dtype=np.intp)
+
+        recipient_rows = np.flatnonzero(is_recipient)
+        with stage("kneighbors", rows=len(recipient_rows)):
+            X_recip = self._design_matrix(X, recipient_rows)
+            groups = None
+            if self.backend == "blocked":
+                groups = block_labels(X[self.block_keys].iloc[recipient_rows], self.block_keys,
+                                      self.block_categories_)
+            return is_recipient, self.nn_model_.kneighbors(X_recip, groups=groups)
+
+    def fill(self, X, is_recipient, donor_idx):
+        """Remplace les NaN des receveurs par les valeurs des donneurs `donor_idx` (un par receveur)."""
+        with stage("fill", rows=len(donor_idx)):
+            return fill_recipients(X, self.target_vars, is_recipient, self.donor_values_[donor_idx])
+
+    def transform(self, X):
+        is_recipient, idx = self.kneighbors(X)
+        if not is_recipient.any():
+            return X.copy()
+
+        # Tirage d'un donneur parmi les k voisins de chaque receveur (reproductible, sans état)
+        n_recip, k = idx.shape
+        donor_idx = idx[np.arange(n_recip), self._draw(X, np.flatnonzero(is_recipient), k)]
+        return self.fill(X, is_recipient, donor_idx)
+
+
+def fill_recipients(X, target_vars, is_recipient, values):
+    """
+    Remplace uniquement les NaN des variables cibles des receveurs.
+
+    Args:
+        X (pd.DataFrame): Lot à imputer.
+        target_vars (list): Variables imputées.
+        is_recipient (np.ndarray): Masque booléen des receveurs dans X.
+        values (np.ndarray): Valeurs (n_receveurs, n_cibles) des donneurs tirés.
+
+    Returns:
+        pd.DataFrame: Copie imputée de X.
+    """
+    X_imp = X.copy()
+    bloc = pd.DataFrame(values, index=X.index[is_recipient], columns=target_vars)
+    for p in target_vars:
+        X_imp[p] = X_imp[p].fillna(bloc[p])
+    return X_imp
+
+
+def save_imputers(det_imputer, knn_imputer, path=config.imputers_file):
+    """
+    Sauvegarde les imputeurs fittés (à côté de `scoring_model.pkl`).
+
+    Le fichier est écrit sans compression pour que les tableaux des donneurs
+    puissent être mémoire-mappés au chargement.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    imputers = Pipeline(steps=[("det", det_imputer), ("knn", knn_imputer)])
+    joblib.dump(imputers, path)
+    return imputers
+
+
+def load_imputers(path=config.imputers_file, mmap_mode="r"):
+    """
+    Charge les imputeurs sauvegardés par `save_imputers`.
+
+    Avec `mmap_mode='r'`, les tableaux NumPy (matrice des donneurs, index des
+    voisins) sont mémoire-mappés au lieu d'être copiés en RAM : le chargement
+    est quasi instantané et la mémoire est partagée entre processus.
+
+    Returns:
+        Pipeline: Imputation déterministe puis hot-deck k-NN, ou None si absent.
+    """
+    if not os.path.exists(path):
+        return None
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def make_scoring_pipeline(imputers, model):
+    """Chaîne les imputeurs fittés et le pipeline PD en un seul estimateur de scoring."""
+    if imputers is None:
+        return model
+    return Pipeline(steps=[("imputation", imputers), ("pd_model", model)])
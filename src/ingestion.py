@@ -0,0 +1,123 @@
+import os
+import glob
+import json
+import numpy as np
+import pandas as pd
+from src.config import num_features, cat_features, cat_order
+from . import config
+
+
+def raw_dtypes():
+    """
+    Types explicites et compacts pour la lecture des données brutes.
+
+    - Variables catégorielles (`cat_features`) : `category` avec les modalités
+      de `cat_order`, identiques d'un bloc à l'autre.
+    - Variables numériques (`num_features`) : float32.
+    - La cible est laissée en texte pour le mapping de `model_trainning`.
+
+    Returns:
+        dict: Dictionnaire {colonne: dtype} utilisable par `pd.read_csv`.
+    """
+    dtypes = {col: pd.CategoricalDtype(categories=cats) for col, cats in zip(cat_features, cat_order)}
+    dtypes.update({col: np.float32 for col in num_features})
+    return dtypes
+
+
+def _source_signature(data_path):
+    """Identité du CSV source : chemin absolu, taille, date de modification et colonnes lues."""
+    stat = os.stat(data_path)
+    return {"source": os.path.abspath(data_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "features": list(config.features)}
+
+
+def _to_categories(chunk, first_row):
+    """
+    Convertit les variables catégorielles (lues en texte) vers les modalités de `cat_order`.
+
+    Raises:
+        ValueError: Modalité hors de `cat_order` (elle deviendrait NaN sans bruit).
+    """
+    for col, cats in zip(cat_features, cat_order):
+        if col not in chunk:
+            continue
+        values = chunk[col]
+        unknown = values.notna() & ~values.isin(cats)
+        if unknown.any():
+            rows = first_row + np.flatnonzero(unknown.to_numpy())[:5]
+            raise ValueError(f"Modalités inconnues dans '{col}': {sorted(values[unknown].unique())[:10]} "
+                             f"(lignes {rows.tolist()}...) ; attendues: {cats}")
+        chunk[col] = values.astype(pd.CategoricalDtype(categories=cats))
+    return chunk
+
+
+def csv_to_parquet(data_path=config.data_path, cache_dir=config.raw_cache_path,
+                   chunk_size=config.chunk_size):
+    """
+    Convertit le CSV brut en un jeu Parquet partitionné, lu une seule fois par blocs.
+
+    Seules les colonnes de `config.features` sont lues, avec les types de
+    `raw_dtypes()`. Chaque bloc de `chunk_size` lignes devient une partition
+    `part-XXXXX.parquet`. Un fichier `_SUCCESS` marque une conversion complète
+    et enregistre l'identité du CSV source (chemin, taille, date de
+    modification, colonnes) : la conversion n'est ignorée que si elle
+    correspond au CSV actuel.
+
+    Les variables catégorielles sont validées contre `cat_order` : une modalité
+    inconnue lève une erreur au lieu de devenir NaN (le chemin sans streaming
+    la conserverait telle quelle).
+
+    Args:
+        data_path (str): Chemin du CSV brut.
+        cache_dir (str): Dossier du jeu Parquet partitionné.
+        chunk_size (int): Nombre de lignes par partition.
+
+    Returns:
+        str: Le dossier `cache_dir`.
+    """
+    success_path = os.path.join(cache_dir, "_SUCCESS")
+    signature = _source_signature(data_path)
+    if os.path.exists(success_path):
+        with open(success_path) as f:
+            marker = json.load(f)
+        if all(marker.get(k) == v for k, v in signature.items()):
+            print(f"Cache Parquet des données brutes trouvé dans {cache_dir}")
+            return cache_dir
+        print(f"Cache Parquet de {cache_dir} obsolète (CSV source modifié) : reconversion")
+        os.remove(success_path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for old_part in glob.glob(os.path.join(cache_dir, "part-*.parquet")):
+        os.remove(old_part)
+
+    # Catégorielles lues en texte puis validées bloc par bloc (voir `_to_categories`)
+    dtypes = {col: (str if col in cat_features else dtype) for col, dtype in raw_dtypes().items()}
+    n_rows = n_parts = 0
+    reader = pd.read_csv(data_path, usecols=config.features, dtype=dtypes, chunksize=chunk_size)
+    for chunk in reader:
+        chunk = _to_categories(chunk, n_rows)
+        chunk.to_parquet(os.path.join(cache_dir, f"part-{n_parts:05d}.parquet"), index=False)
+        n_rows += len(chunk)
+        n_parts += 1
+
+    with open(success_path, "w") as f:
+        json.dump({**signature, "n_rows": n_rows, "n_parts": n_parts}, f)
+
+    print(f"{n_rows} lignes converties en {n_parts} partitions Parquet")
+    return cache_dir
+
+
+def load_parquet_cache(cache_dir=config.raw_cache_path, columns=None):
+    """
+    Charge le jeu Parquet partitionné produit par `csv_to_parquet`.
+
+    Args:
+        cache_dir (str): Dossier du jeu Parquet partitionné.
+        columns (list, optional): Sous-ensemble de colonnes à charger.
+
+    Returns:
+        pd.DataFrame: Les données brutes avec leurs types compacts.
+    """
+    if not glob.glob(os.path.join(cache_dir, "part-*.parquet")):
+        raise FileNotFoundError(f"Aucune partition Parquet trouvée dans {cache_dir}")
+    return pd.read_parquet(cache_dir, columns=columns)
@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from src.utils import current_rss_mb, peak_rss_mb
+from . import config
+
+# Instrumentation active (None = `stage()` ne fait rien)
+_current = contextvars.ContextVar("instrumentation", default=None)
+
+
+def stage(name, rows=None):
+    """
+    Mesure un bloc de code comme une étape de l'exécution en cours.
+
+    Sans instrumentation active (voir `Instrumentation.activate`), renvoie un
+    contexte vide : les modules (imputeurs, modèle...) peuvent donc déclarer
+    leurs étapes sans dépendre du pipeline.
+
+    Usage:
+        with stage("knn/kneighbors", rows=len(X)) as rec:
+            ...
+            rec["rows"] = n  # le nombre de lignes peut être renseigné après coup
+    """
+    instr = _current.get()
+    if instr is None:
+        return nullcontext({})
+    return instr.stage(name, rows=rows)
+
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage : un thread relève la pile du thread observé
+    toutes les `interval_ms` millisecondes.
+
+    Le surcoût est indépendant du nombre d'appels (contrairement à cProfile).
+    Chaque échantillon est attribué à l'étape en cours ; les piles sont
+    agrégées au format « folded » (compatible flamegraph).
+    """
+
+    def __init__(self, interval_ms=config.profile_interval_ms, current_stage=lambda: ""):
+        self.interval = interval_ms / 1000
+        self.current_stage = current_stage
+        self.stacks = Counter()
+        self.leaves = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            path = self.current_stage()
+            self.stacks[";".join(([path] if path else []) + names[::-1])] += 1
+            self.leaves[(path, names[0])] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def top(self, n=20):
+        """Fonctions feuilles les plus échantillonnées, par étape."""
+        total = sum(self.leaves.values()) or 1
+        return [{"stage": s, "function": f, "samples": c, "share": c / total}
+                for (s, f), c in self.leaves.most_common(n)]
+
+    def save_folded(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Instrumentation:
+    """
+    Instrumentation structurée d'une exécution du pipeline.
+
+    Chaque étape (`stage`) enregistre son temps (mur et CPU), le nombre de
+    lignes traitées, la RSS avant/après et le pic de RSS ; les étapes peuvent
+    être imbriquées ('knn/fit/preprocessor'). Les hooks sont appelés à
+    l'entrée et à la sortie de chaque étape avec `(événement, enregistrement)`,
+    événement valant 'start' ou 'end'.
+
+    Le profilage est optionnel :
+    - 'cprofile' : un profil déterministe par étape de premier niveau ;
+    - 'sampling' : échantillonnage périodique de la pile (faible surcoût).
+
+    Args:
+        run (str): Nom de l'exécution (ex: 'preprocessing').
+        profile (str, optional): None, 'cprofile' ou 'sampling'.
+        hooks (list, optional): Callables `hook(event, record)`.
+        profile_dir (str, optional): Dossier des profils (.prof / .folded).
+    """
+
+    def __init__(self, run, profile=config.profile, hooks=None, profile_dir=config.profile_dir):
+        if profile not in (None, "cprofile", "sampling"):
+            raise ValueError(f"Profilage inconnu: '{profile}' (attendu: None, 'cprofile' ou 'sampling')")
+        self.run = run
+        self.profile = profile
+        self.hooks = list(hooks or [])
+        self.profile_dir = profile_dir
+        self.records = []
+        self.extra = {}
+        self._stack = []
+        self._path = ""
+        self._profiles = {}
+        self._sampler = None
+        self._started = None
+        self._finished = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _emit(self, event, record):
+        for hook in self.hooks:
+            hook(event, record)
+
+    @contextmanager
+    def activate(self):
+        """Rend l'instrumentation active pour `stage()` le temps du bloc."""
+        token = _current.set(self)
+        self._started = time.time()
+        if self.profile == "sampling":
+            self._sampler = SamplingProfiler(current_stage=lambda: self._path)
+            self._sampler.start()
+        try:
+            yield self
+        finally:
+            if self._sampler is not None:
+                self._sampler.stop()
+            self._finished = time.time()
+            _current.reset(token)
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        path = "/".join(self._stack + [name])
+        record = {"stage": path, "depth": len(self._stack), "rows": rows, "started": time.time(),
+                  "rss_before_mb": current_rss_mb()}
+        self._stack.append(name)
+        self._path = path
+        self._emit("start", record)
+
+        profiler = None
+        if self.profile == "cprofile" and record["depth"] == 0:
+            # Une étape répétée cumule ses appels dans le même profil
+            profiler = self._profiles.get(path) or cProfile.Profile()
+            profiler.enable()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+            record["status"] = "ok"
+        except BaseException as e:
+            record["status"] = "error"
+            record["error"] = repr(e)
+            raise
+        finally:
+            record["wall_s"] = time.perf_counter() - wall
+            record["cpu_s"] = time.process_time() - cpu
+            if profiler is not None:
+                profiler.disable()
+                self._profiles[path] = profiler
+            record["rss_after_mb"] = current_rss_mb()
+            record["rss_delta_mb"] = record["rss_after_mb"] - record["rss_before_mb"]
+            record["peak_rss_mb"] = peak_rss_mb()
+            if record["rows"] and record["wall_s"] > 0:
+                record["rows_per_s"] = record["rows"] / record["wall_s"]
+            self._stack.pop()
+            self._path = "/".join(self._stack)
+            self.records.append(record)
+            self._emit("end", record)
+
+    def _profile_summary(self, n=15):
+        if self.profile == "sampling" and self._sampler is not None:
+            return {"type": "sampling", "interval_ms": self._sampler.interval * 1000, "top": self._sampler.top(n)}
+        if self.profile == "cprofile":
+            summary = {}
+            for path, profiler in self._profiles.items():
+                stats = pstats.Stats(profiler).stats
+                top = sorted(stats.items(), key=lambda kv: kv[1][3], reverse=True)[:n]
+                summary[path] = [{"function": f"{os.path.basename(file)}:{line}({func})", "ncalls": nc,
+                                  "tottime": tt, "cumtime": ct} for (file, line, func), (_, nc, tt, ct, _) in top]
+            return {"type": "cprofile", "stages": summary}
+        return None
+
+    def report(self):
+        """Rapport JSON-sérialisable de l'exécution (étapes dans l'ordre de fin, profils)."""
+        finished = self._finished or time.time()
+        return {
+            "run": self.run,
+            "started": self._started,
+            "finished": finished,
+            "wall_s": finished - self._started if self._started else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.records,
+            "profile": self._profile_summary(),
+            **self.extra,
+        }
+
+    def save_report(self, path=None):
+        """Écrit le rapport JSON (`config.run_report_path` par défaut) et les profils bruts dans `profile_dir`."""
+        path = path or config.run_report_path.format(run=self.run)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.report(), f, indent=2, default=str)
+        os.replace(tmp, path)
+
+        if self.profile_dir and (self._profiles or self._sampler is not None):
+            os.makedirs(self.profile_dir, exist_ok=True)
+            for stage_path, profiler in self._profiles.items():
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{self.run}-{stage_path.replace('/', '_')}.prof"))
+            if self._sampler is not None:
+                self._sampler.save_folded(os.path.join(self.profile_dir, f"{self.run}.folded"))
+        return path
+
+    def prometheus(self, prefix="scoring"):
+        """
+        Métriques au format texte Prometheus (une série par étape et par métrique).
+
+        Returns:
+            str: Exposition texte (HELP/TYPE puis échantillons étiquetés par run et étape).
+        """
+        def esc(v):
+            return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        # Une étape exécutée plusieurs fois (ex: 'parquet_write') est agrégée : sommes, pic maximal
+        stages = {}
+        for rec in self.records:
+            agg = stages.setdefault(rec["stage"], {"wall_s": 0.0, "cpu_s": 0.0, "rows": None, "rss_delta_mb": 0.0,
+                                                   "peak_rss_mb": 0.0, "status": "ok"})
+            agg["wall_s"] += rec["wall_s"]
+            agg["cpu_s"] += rec["cpu_s"]
+            agg["rss_delta_mb"] += rec["rss_delta_mb"]
+            agg["peak_rss_mb"] = max(agg["peak_rss_mb"], rec["peak_rss_mb"])
+            if rec["rows"] is not None:
+                agg["rows"] = (agg["rows"] or 0) + rec["rows"]
+            if rec["status"] != "ok":
+                agg["status"] = rec["status"]
+
+        metrics = [
+            ("stage_duration_seconds", "Durée (temps mur) de l'étape", lambda r: r["wall_s"]),
+            ("stage_cpu_seconds", "Temps CPU de l'étape", lambda r: r["cpu_s"]),
+            ("stage_rows", "Lignes traitées par l'étape", lambda r: r["rows"]),
+            ("stage_rss_delta_bytes", "Variation de RSS pendant l'étape", lambda r: r["rss_delta_mb"] * 1024 ** 2),
+            ("stage_peak_rss_bytes", "Pic de RSS du processus à la fin de l'étape",
+             lambda r: r["peak_rss_mb"] * 1024 ** 2),
+            ("stage_success", "1 si l'étape s'est terminée sans erreur", lambda r: int(r["status"] == "ok")),
+        ]
+        lines = []
+        for name, help_text, value in metrics:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            for path, rec in stages.items():
+                v = value(rec)
+                if v is not None:
+                    lines.append(f'{prefix}_{name}{{run="{esc(self.run)}",stage="{esc(path)}"}} {float(v):.6g}')
+
+        report = self.report()
+        lines += [
+            f"# HELP {prefix}_run_duration_seconds Durée totale de l'exécution",
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f'{prefix}_run_duration_seconds{{run="{esc(self.run)}"}} {float(report["wall_s"] or 0):.6g}',
+            f"# HELP {prefix}_run_last_success_timestamp_seconds Fin de la dernière exécution réussie",
+            f"# TYPE {prefix}_run_last_success_timestamp_seconds gauge",
+        ]
+        if all(r["status"] == "ok" for r in self.records):
+            lines.append(f'{prefix}_run_last_success_timestamp_seconds{{run="{esc(self.run)}"}} '
+                         f'{report["finished"]:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def save_prometheus(self, path=None):
+        """
+        Écrit les métriques Prometheus de façon atomique (collecteur « textfile »
+        de node_exporter ou tout scraper local lisant le fichier).
+        """
+        path = path or config.metrics_path.format(run=self.run)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+        return path
+
+
+def print_hook(event, record):
+    """Hook d'exemple : affiche la durée, les lignes et la variation de RSS de chaque étape terminée."""
+    if event != "end":
+        return
+    rows = f" | {record['rows']:,} lignes" if record.get("rows") else ""
+    print(f"   [{record['stage']}] {record['wall_s']:.2f} s{rows} | "
+          f"ΔRSS {record['rss_delta_mb']:+,.0f} Mo | pic {record['peak_rss_mb']:,.0f} Mo")
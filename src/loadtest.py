@@ -0,0 +1,91 @@
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.serving import make_server
+from . import config
+
+# Prêt type (mêmes valeurs par défaut que le dashboard)
+sample_loan = {
+    "term": " 36 months", "int_rate": 12.5, "installment": 450.0, "grade": "B",
+    "emp_length": "5 years", "home_ownership": "MORTGAGE", "annual_inc": 60000,
+    "dti": 15.0, "tot_cur_bal": 150000, "open_acc_6m": 0, "total_bal_il": 50000,
+    "inq_fi": 0, "mort_acc": 1, "num_sats": 8,
+}
+
+
+def _post(url, payload):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read())
+
+
+def run_load_test(base_url, n_requests=5000, concurrency=32, loans_per_request=1):
+    """
+    Envoie `n_requests` requêtes de scoring concurrentes et mesure les latences côté client.
+
+    Args:
+        base_url (str): URL du service (ex: 'http://127.0.0.1:8000').
+        n_requests (int): Nombre total de requêtes.
+        concurrency (int): Nombre de clients simultanés.
+        loans_per_request (int): 1 = scoring unitaire, > 1 = scoring par lot.
+
+    Returns:
+        dict: Latences client (p50/p99 en ms), débit (requêtes/s, prêts/s),
+            erreurs et métriques exposées par le serveur (/metrics).
+    """
+    payload = sample_loan if loans_per_request == 1 else {"loans": [sample_loan] * loans_per_request}
+    url = base_url + "/score"
+
+    def one_call(_):
+        t0 = time.perf_counter()
+        try:
+            _post(url, payload)
+            return time.perf_counter() - t0, True
+        except Exception:
+            return time.perf_counter() - t0, False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_call, range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    lat = np.array([r[0] for r in results]) * 1000
+    n_ok = sum(r[1] for r in results)
+    with urllib.request.urlopen(base_url + "/metrics", timeout=30) as resp:
+        server_metrics = json.loads(resp.read())
+
+    return {
+        "n_requests": n_requests,
+        "concurrency": concurrency,
+        "loans_per_request": loans_per_request,
+        "errors": n_requests - n_ok,
+        "client_p50_ms": float(np.percentile(lat, 50)),
+        "client_p99_ms": float(np.percentile(lat, 99)),
+        "requests_per_s": n_requests / elapsed,
+        "loans_per_s": n_ok * loans_per_request / elapsed,
+        "server": server_metrics,
+    }
+
+
+def main(n_requests=5000, concurrency=32):
+    """Démarre le service sur un port libre de localhost et lance le test de charge."""
+    server, batcher = make_server(config.serving_host, 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{config.serving_host}:{server.server_port}"
+    try:
+        for loans_per_request in (1, 100):
+            report = run_load_test(base_url, n_requests, concurrency, loans_per_request)
+            print(json.dumps(report, indent=2))
+    finally:
+        server.shutdown()
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from src.pipeline import run_preprocessing, run_model
+from src.pipeline import run_preprocessing, run_model, run_evaluation
 
 if __name__ == "__main__":
     print("Lancement du pipeline de preprocessing...")
@@ -9,7 +9,5 @@ if __name__ == "__main__":
     model, acc, roc, y_proba = run_model()
     print("Entraînement terminé avec succès.\n")
 
-
-
-
-
+    print("Évaluation du modele (validation et test)...")
+    run_evaluation()
@@ -1,5 +1,6 @@
 import os
 import joblib
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
@@ -8,38 +9,70 @@ from sklearn.compose import ColumnTransformer
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, roc_auc_score
 from src.config import num_features, cat_features, cat_order
+from src.instrumentation import stage
 from . import config
 
-def model_trainning(train_df: pd.DataFrame, test_df: pd.DataFrame, save_dir=config.processed_path):
-# --- Mapping des labels ---
-    mapping = {'Fully Paid': 0, 'Charged Off': 1}
-    train_df["loan_status"] = train_df["loan_status"].map(mapping)
-    test_df["loan_status"] = test_df["loan_status"].map(mapping)
+def build_model(lean=False):
+    """
+    Pipeline PD non fitté : standardisation des numériques, encodage ordinal, régression logistique.
 
-    # --- Split train/test ---
-    X, y = train_df.drop("loan_status", axis=1), train_df["loan_status"]
-    X_train, X_valid, y_train, y_valid = train_test_split(X, y, test_size=0.2, random_state=42)
-
-    # --- Pipeline ---
+    Avec `lean=True`, les codes ordinaux sont en float32 : avec des numériques
+    en float32, toute la matrice de design reste en float32.
+    """
     num_transformer = Pipeline(steps=[("scaler", StandardScaler())])
-    cat_transformer = Pipeline(steps=[("ord_enc", OrdinalEncoder(categories=cat_order))])
+    cat_transformer = Pipeline(steps=[("ord_enc", OrdinalEncoder(categories=cat_order,
+                                                                 dtype=np.float32 if lean else np.float64))])
 
     preprocessor = ColumnTransformer(transformers=[
         ("num", num_transformer, num_features),
         ("cat", cat_transformer, cat_features)
     ])
 
-    model = Pipeline(steps=[
+    return Pipeline(steps=[
         ("preprocessor", preprocessor),
         ("classifier", LogisticRegression(max_iter=1000, solver="lbfgs"))
     ])
 
+def _lean_rows(df, columns, rows):
+    """
+    Lignes `rows` de `columns`, construites colonne par colonne (sans copier tout le DataFrame) ;
+    les colonnes float64 sont converties en float32.
+    """
+    return pd.DataFrame({
+        c: df[c].to_numpy(dtype=np.float32)[rows] if df[c].dtype == np.float64 else df[c].to_numpy()[rows]
+        for c in columns
+    })
+
+
+def model_trainning(train_df: pd.DataFrame, test_df: pd.DataFrame, save_dir=config.processed_path, lean=False):
+# --- Mapping des labels ---
+    mapping = {'Fully Paid': 0, 'Charged Off': 1}
+    train_df["loan_status"] = train_df["loan_status"].map(mapping)
+    test_df["loan_status"] = test_df["loan_status"].map(mapping)
+
+    # --- Split train/test ---
+    if lean:
+        # Même découpage, par tableaux d'indices : seules les lignes et colonnes utiles sont matérialisées
+        columns = [c for c in train_df.columns if c != "loan_status"]
+        train_idx, valid_idx = train_test_split(np.arange(len(train_df)), test_size=0.2, random_state=42)
+        y = train_df["loan_status"].to_numpy()
+        X_train, X_valid = _lean_rows(train_df, columns, train_idx), _lean_rows(train_df, columns, valid_idx)
+        y_train, y_valid = y[train_idx], y[valid_idx]
+    else:
+        X, y = train_df.drop("loan_status", axis=1), train_df["loan_status"]
+        X_train, X_valid, y_train, y_valid = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # --- Pipeline ---
+    model = build_model(lean=lean)
+
     # --- Entraînement ---
-    model.fit(X_train, y_train)
+    with stage("model_fit", rows=len(X_train)):
+        model.fit(X_train, y_train)
 
     # --- Prédiction ---
-    y_pred = model.predict(X_valid)
-    y_proba = model.predict_proba(X_valid)[:, 1]
+    with stage("model_predict", rows=len(X_valid)):
+        y_pred = model.predict(X_valid)
+        y_proba = model.predict_proba(X_valid)[:, 1]
 
     # --- Scores ---
     acc = accuracy_score(y_valid, y_pred)
@@ -49,7 +82,8 @@ def model_trainning(train_df: pd.DataFrame, test_df: pd.DataFrame, save_dir=conf
     print(f"ROC AUC: {roc:.4f}")
 
     # --- Sauvegarde ---
-    os.makedirs(save_dir, exist_ok=True)
-    joblib.dump(model, os.path.join(save_dir, "scoring_model.pkl"))
+    with stage("model_save"):
+        os.makedirs(save_dir, exist_ok=True)
+        joblib.dump(model, os.path.join(save_dir, "scoring_model.pkl"))
 
     return model, acc, roc, y_proba
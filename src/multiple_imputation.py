@@ -0,0 +1,162 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sklearn.metrics import roc_auc_score
+from src.imputers import fill_recipients
+from src.models import build_model
+from . import config
+
+# Données partagées par les workers (envoyées une seule fois, à l'initialisation)
+_shared = {}
+
+
+def draw_donors(idx, m, random_state=config.random_state):
+    """
+    Tire M donneurs par receveur parmi ses k voisins, avec M flux aléatoires indépendants.
+
+    Chaque imputation m utilise son propre `np.random.Generator`, issu de
+    `SeedSequence(random_state).spawn(m)` : les tirages sont reproductibles,
+    indépendants entre eux et ne dépendent d'aucun état global.
+
+    Args:
+        idx (np.ndarray): Indices (n_receveurs, k) des voisins donneurs.
+        m (int): Nombre d'imputations.
+        random_state (int): Seed racine.
+
+    Returns:
+        np.ndarray: Indices des donneurs tirés, de forme (m, n_receveurs).
+    """
+    n_recip, k = idx.shape
+    rows = np.arange(n_recip)
+    streams = [np.random.default_rng(seed) for seed in np.random.SeedSequence(random_state).spawn(m)]
+    return np.stack([idx[rows, rng.integers(0, k, size=n_recip)] for rng in streams])
+
+
+def auc_variance(auc, n_pos, n_neg):
+    """Variance de l'AUC selon Hanley & McNeil (1982)."""
+    q1 = auc / (2 - auc)
+    q2 = 2 * auc ** 2 / (1 + auc)
+    return (auc * (1 - auc) + (n_pos - 1) * (q1 - auc ** 2) + (n_neg - 1) * (q2 - auc ** 2)) / (n_pos * n_neg)
+
+
+def pool_rubin(estimates, variances, alpha=0.05):
+    """
+    Combine M estimations par les règles de Rubin.
+
+    Args:
+        estimates (array-like): Estimation Q_m de chaque jeu imputé.
+        variances (array-like): Variance intra-imputation U_m de chaque estimation.
+        alpha (float): Niveau de l'intervalle de confiance.
+
+    Returns:
+        dict: Estimation poolée, variances intra (Ū), inter (B) et totale (T),
+            erreur standard, degrés de liberté, IC et fraction d'information manquante.
+    """
+    q = np.asarray(estimates, dtype=np.float64)
+    u = np.asarray(variances, dtype=np.float64)
+    m = len(q)
+    q_bar = q.mean()
+    u_bar = u.mean()
+    b = q.var(ddof=1) if m > 1 else 0.0
+    t = u_bar + (1 + 1 / m) * b
+    if b > 0:
+        dof = (m - 1) * (1 + u_bar / ((1 + 1 / m) * b)) ** 2
+    else:
+        dof = np.inf
+    half = stats.t.ppf(1 - alpha / 2, dof) * np.sqrt(t)
+    return {
+        "estimate": float(q_bar),
+        "within_var": float(u_bar),
+        "between_var": float(b),
+        "total_var": float(t),
+        "se": float(np.sqrt(t)),
+        "df": float(dof),
+        "ci_low": float(q_bar - half),
+        "ci_high": float(q_bar + half),
+        "fmi": float((1 + 1 / m) * b / t) if t > 0 else 0.0,
+    }
+
+
+def _init_worker(payload):
+    _shared.update(payload)
+
+
+def _fit_one(m):
+    """Construit le m-ième jeu imputé, entraîne le modèle PD et l'évalue sur le test imputé."""
+    s = _shared
+    train_m = fill_recipients(s["train"], s["target_vars"], s["train_recip"], s["donor_values"][s["train_draws"][m]])
+    test_m = fill_recipients(s["test"], s["target_vars"], s["test_recip"], s["donor_values"][s["test_draws"][m]])
+
+    mapping = {'Fully Paid': 0, 'Charged Off': 1}
+    y_train = train_m.pop("loan_status").map(mapping).to_numpy()
+    y_test = test_m.pop("loan_status").map(mapping).to_numpy()
+
+    model = build_model().fit(train_m, y_train)
+    pd_test = model.predict_proba(test_m)[:, 1]
+
+    auc = roc_auc_score(y_test, pd_test)
+    n_pos = int(y_test.sum())
+    return {
+        "m": m,
+        "auc": auc,
+        "auc_var": auc_variance(auc, n_pos, len(y_test) - n_pos),
+        "pd_mean": float(pd_test.mean()),
+        "pd_mean_var": float(pd_test.var(ddof=1) / len(pd_test)),
+        "pd_test": pd_test.astype(np.float32),
+    }
+
+
+def multiple_imputation(train_set_det, test_set_det, knn_imputer, m=config.mi_n_imputations,
+                        n_jobs=config.mi_n_jobs, random_state=config.random_state):
+    """
+    Imputation multiple (M tirages hot-deck) et pooling des métriques par les règles de Rubin.
+
+    1. Les k voisins des receveurs (train et test) sont calculés une seule fois.
+    2. Les M tirages de donneurs sont générés de façon vectorisée, chacun avec
+       son propre flux `np.random.Generator`.
+    3. Les M jeux imputés sont entraînés/évalués en parallèle : les données
+       déterministes et les tirages sont envoyés une seule fois à chaque worker.
+    4. L'AUC test et la PD moyenne du portefeuille test sont combinées par les
+       règles de Rubin ; la dispersion des PD individuelles entre imputations
+       mesure la variance due à l'imputation.
+
+    Args:
+        train_set_det (pd.DataFrame): Train après imputation déterministe.
+        test_set_det (pd.DataFrame): Test après imputation déterministe.
+        knn_imputer (HotDeckKNNImputer): Imputeur hot-deck fitté sur `train_set_det`.
+        m (int): Nombre d'imputations.
+        n_jobs (int): Nombre de processus.
+        random_state (int): Seed racine des M flux aléatoires.
+
+    Returns:
+        dict: 'imputations' (DataFrame des M résultats), 'auc' et 'pd_mean'
+            (pooling de Rubin), 'pd_loan_std' (écart-type moyen des PD individuelles entre imputations).
+    """
+    train_recip, train_idx = knn_imputer.kneighbors(train_set_det)
+    test_recip, test_idx = knn_imputer.kneighbors(test_set_det)
+
+    root = np.random.SeedSequence(random_state)
+    train_seed, test_seed = (int(s.generate_state(1)[0]) for s in root.spawn(2))
+    payload = {
+        "train": train_set_det,
+        "test": test_set_det,
+        "target_vars": knn_imputer.target_vars,
+        "donor_values": np.asarray(knn_imputer.donor_values_),
+        "train_recip": train_recip,
+        "test_recip": test_recip,
+        "train_draws": draw_donors(train_idx, m, train_seed),
+        "test_draws": draw_donors(test_idx, m, test_seed),
+    }
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(payload,)) as pool:
+        results = list(pool.map(_fit_one, range(m)))
+
+    pd_tests = np.stack([r.pop("pd_test") for r in results])
+    imputations = pd.DataFrame(results)
+    return {
+        "imputations": imputations,
+        "auc": pool_rubin(imputations["auc"], imputations["auc_var"]),
+        "pd_mean": pool_rubin(imputations["pd_mean"], imputations["pd_mean_var"]),
+        "pd_loan_std": float(pd_tests.std(axis=0, ddof=1).mean()) if m > 1 else 0.0,
+    }
@@ -0,0 +1,226 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler, OrdinalEncoder
+from src.config import num_features, cat_features, cat_order
+from src.models import build_model
+from src.utils import peak_rss_mb
+from src.instrumentation import stage
+from . import config
+
+_columns = num_features + cat_features + [config.y]
+
+
+def iter_batches(path, batch_size=config.ooc_batch_size, columns=_columns):
+    """
+    Parcourt un Parquet par lots de `batch_size` lignes (seules `columns` sont lues).
+
+    Yields:
+        tuple: (indice du lot, features pd.DataFrame, cible np.ndarray int8).
+    """
+    parquet_file = pq.ParquetFile(path)
+    for i, batch in enumerate(parquet_file.iter_batches(batch_size=batch_size, columns=columns)):
+        df = batch.to_pandas()
+        y = (df.pop(config.y).astype(str) == 'Charged Off').to_numpy(dtype=np.int8)
+        yield i, df, y
+
+
+def _valid_mask(batch_idx, n, valid_size, random_state):
+    """Masque de validation d'un lot, identique d'une passe à l'autre (seed dérivée de l'indice du lot)."""
+    return np.random.default_rng([random_state, batch_idx]).random(n) < valid_size
+
+
+class StreamingAUC:
+    """
+    AUC, accuracy et log-loss calculées en flux, en mémoire constante.
+
+    Les scores sont répartis dans `n_bins` intervalles réguliers de [0, 1] :
+    l'AUC est calculée à partir des histogrammes des positifs et des négatifs
+    (les ex-aequo d'un même intervalle comptent pour 1/2). Avec 100 000
+    intervalles, l'écart à l'AUC exacte est négligeable.
+    """
+
+    def __init__(self, n_bins=100_000):
+        self.n_bins = n_bins
+        self.pos = np.zeros(n_bins, dtype=np.int64)
+        self.neg = np.zeros(n_bins, dtype=np.int64)
+        self.n_correct = 0
+        self.log_loss_sum = 0.0
+
+    def update(self, y, proba):
+        bins = np.minimum((proba * self.n_bins).astype(np.int64), self.n_bins - 1)
+        self.pos += np.bincount(bins[y == 1], minlength=self.n_bins)
+        self.neg += np.bincount(bins[y == 0], minlength=self.n_bins)
+        self.n_correct += int(((proba >= 0.5) == (y == 1)).sum())
+        p = np.clip(proba, 1e-15, 1 - 1e-15)
+        self.log_loss_sum += float(-(y * np.log(p) + (1 - y) * np.log1p(-p)).sum())
+
+    @property
+    def n(self):
+        return int(self.pos.sum() + self.neg.sum())
+
+    def auc(self):
+        n_pos, n_neg = self.pos.sum(), self.neg.sum()
+        if n_pos == 0 or n_neg == 0:
+            return float("nan")
+        # Pour chaque intervalle : négatifs strictement en dessous + moitié des ex-aequo
+        neg_below = np.cumsum(self.neg) - self.neg
+        return float((self.pos * (neg_below + 0.5 * self.neg)).sum() / (n_pos * n_neg))
+
+    def result(self):
+        n = self.n
+        return {"n": n, "auc": self.auc(), "accuracy": self.n_correct / n if n else float("nan"),
+                "log_loss": self.log_loss_sum / n if n else float("nan")}
+
+
+def _assemble_pipeline(scaler, classifier, sample):
+    """
+    Pipeline au format de `build_model` ('preprocessor' -> 'classifier') à partir
+    du scaler estimé en flux et du classifieur entraîné par minibatchs.
+
+    Le ColumnTransformer est fitté sur un petit échantillon (pour ses métadonnées),
+    puis son scaler est remplacé par celui estimé sur toutes les données.
+    """
+    preprocessor = ColumnTransformer(transformers=[
+        ("num", Pipeline(steps=[("scaler", StandardScaler())]), num_features),
+        ("cat", Pipeline(steps=[("ord_enc", OrdinalEncoder(categories=cat_order))]), cat_features),
+    ])
+    preprocessor.fit(sample)
+    preprocessor.named_transformers_["num"].steps[0] = ("scaler", scaler)
+    return Pipeline(steps=[("preprocessor", preprocessor), ("classifier", classifier)])
+
+
+def train_out_of_core(train_path=config.train_path, test_path=config.test_path,
+                      batch_size=config.ooc_batch_size, n_epochs=config.ooc_epochs, alpha=config.ooc_alpha,
+                      valid_size=0.2, random_state=42):
+    """
+    Entraîne le modèle PD sans jamais charger le jeu complet en mémoire.
+
+    1. Une passe en flux estime moyenne et variance des variables numériques
+       et des codes ordinaux (`StandardScaler.partial_fit`) sur la partie entraînement.
+    2. `n_epochs` passes entraînent une régression logistique par descente de
+       gradient stochastique (`SGDClassifier(loss='log_loss').partial_fit`),
+       lot par lot (lots mélangés en interne).
+    3. AUC, accuracy et log-loss sont calculées en flux (`StreamingAUC`) sur la
+       validation (20 % des lignes du train, tirées par lot) et sur le test.
+
+    La mémoire est bornée par la taille d'un lot, quel que soit le nombre de lignes.
+
+    Args:
+        train_path (str): Parquet d'entraînement (imputé).
+        test_path (str): Parquet de test (imputé), None pour ne pas l'évaluer.
+        batch_size (int): Nombre de lignes par lot.
+        n_epochs (int): Nombre de passes d'entraînement.
+        alpha (float): Régularisation L2 du SGD.
+        valid_size (float): Part des lignes du train réservée à la validation.
+        random_state (int): Seed du découpage train/validation et du mélange.
+
+    Returns:
+        tuple: (pipeline PD, dict des métriques 'valid' et 'test').
+    """
+    scaler = StandardScaler()
+    code_scaler = StandardScaler()
+    encoder = OrdinalEncoder(categories=cat_order)
+    sample = None
+    with stage("scaler_pass") as rec:
+        n_rows = 0
+        for i, X, y in iter_batches(train_path, batch_size):
+            if sample is None:
+                sample = X.head(1000)
+                encoder.fit(sample[cat_features])
+            train = ~_valid_mask(i, len(X), valid_size, random_state)
+            scaler.partial_fit(X.loc[train, num_features].to_numpy(dtype=np.float64))
+            code_scaler.partial_fit(encoder.transform(X.loc[train, cat_features]))
+            n_rows += len(X)
+        rec["rows"] = n_rows
+
+    # Le SGD converge mal sur des codes ordinaux non centrés : ils sont standardisés
+    # pendant l'entraînement, puis cette standardisation est repliée dans les coefficients.
+    def design(X):
+        return np.column_stack([scaler.transform(X[num_features].to_numpy(dtype=np.float64)),
+                                code_scaler.transform(encoder.transform(X[cat_features]))])
+
+    classifier = SGDClassifier(loss="log_loss", alpha=alpha, average=True, random_state=random_state)
+    rng = np.random.default_rng(random_state)
+    for epoch in range(n_epochs):
+        with stage(f"epoch_{epoch + 1}", rows=n_rows):
+            for i, X, y in iter_batches(train_path, batch_size):
+                train = ~_valid_mask(i, len(X), valid_size, random_state)
+                order = rng.permutation(np.flatnonzero(train))
+                classifier.partial_fit(design(X.iloc[order]), y[order], classes=np.array([0, 1]))
+
+    w_cat = classifier.coef_[0, len(num_features):].copy()
+    classifier.coef_[0, len(num_features):] = w_cat / code_scaler.scale_
+    classifier.intercept_[0] -= float(np.dot(w_cat, code_scaler.mean_ / code_scaler.scale_))
+
+    model = _assemble_pipeline(scaler, classifier, sample)
+
+    metrics = {}
+    with stage("evaluate"):
+        valid = StreamingAUC()
+        for i, X, y in iter_batches(train_path, batch_size):
+            mask = _valid_mask(i, len(X), valid_size, random_state)
+            valid.update(y[mask], model.predict_proba(X[mask])[:, 1])
+        metrics["valid"] = valid.result()
+        if test_path:
+            test = StreamingAUC()
+            for _, X, y in iter_batches(test_path, batch_size):
+                test.update(y, model.predict_proba(X)[:, 1])
+            metrics["test"] = test.result()
+    return model, metrics
+
+
+def _fit_in_memory(train_path, test_path):
+    start = time.perf_counter()
+    train_df = pd.read_parquet(train_path, columns=_columns)
+    test_df = pd.read_parquet(test_path, columns=_columns)
+    y_train = (train_df.pop(config.y).astype(str) == 'Charged Off').to_numpy(dtype=np.int8)
+    y_test = (test_df.pop(config.y).astype(str) == 'Charged Off').to_numpy(dtype=np.int8)
+    model = build_model().fit(train_df, y_train)
+    auc = roc_auc_score(y_test, model.predict_proba(test_df)[:, 1])
+    return {"mode": "in_memory", "test_auc": auc, "wall_s": time.perf_counter() - start,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def _fit_out_of_core(train_path, test_path, batch_size):
+    start = time.perf_counter()
+    _, metrics = train_out_of_core(train_path, test_path, batch_size=batch_size)
+    return {"mode": "out_of_core", "test_auc": metrics["test"]["auc"], "wall_s": time.perf_counter() - start,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def compare_with_in_memory(train_path=config.train_path, test_path=config.test_path,
+                           batch_size=config.ooc_batch_size):
+    """
+    Compare l'entraînement en flux à l'entraînement en mémoire (`build_model().fit`).
+
+    Chaque mode s'exécute dans un processus neuf : le pic de RSS reporté est
+    celui du mode seul. L'AUC est mesurée sur le même jeu de test.
+
+    Returns:
+        pd.DataFrame: AUC test, temps et pic de RSS de chaque mode.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    rows = []
+    for fn, args in ((_fit_in_memory, (train_path, test_path)),
+                     (_fit_out_of_core, (train_path, test_path, batch_size))):
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            rows.append(pool.submit(fn, *args).result())
+    comparison = pd.DataFrame(rows)
+    comparison["auc_gap"] = comparison["test_auc"] - comparison["test_auc"].iloc[0]
+    return comparison
+
+
+def save_model(model, path=config.ooc_model_file):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    joblib.dump(model, path)
+    return path
@@ -1,72 +1,525 @@
 import os
+import json
+import shutil
+from functools import partial
+import joblib
+import numpy as np
 import pandas as pd
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
 from . import config
-from src.preprocessing import split_data, impute_det, impute_knn_hotdeck
-from src.models import model_trainning
+from . import imputers, ingestion, neighbors
+from src.cache import StageCache, file_fingerprint, source_fingerprint, make_key
+from src.preprocessing import split_data
+from src.imputers import DeterministicImputer, HotDeckKNNImputer, save_imputers
+from src.models import build_model, model_trainning
+from src.search import build_design_matrix, successive_halving
+from src.out_of_core import train_out_of_core, compare_with_in_memory, save_model
+from src.multiple_imputation import multiple_imputation
+from src.portfolio import score_portfolio
+from src.ecl import ecl_portfolio
+from src.stress import stress_test, PD_SHOCKS
+from src.drift import DriftMonitor, build_reference, save_reference, load_reference, print_alert
+from src.fast_scorer import LinearPDScorer
+from src.registry import ModelRegistry
+from src.evaluation import evaluation_report, print_report, save_report
+from src.segments import SegmentedPDModel
+from src.ingestion import csv_to_parquet, load_parquet_cache
+from src.utils import report_rss
+from src.instrumentation import Instrumentation, stage
 
-def run_preprocessing():
-    """
-    Script principal pour orchestrer l'ensemble du pipeline de preprocessing.
-    1. Charge les données brutes.
-    2. Divise en train/test.
-    3. Exécute l'imputation déterministe.
-    4. Exécute l'imputation stochastique k-NN.
-    
-    """
-    # Vérification si les fichiers existent déjà
-    if os.path.exists(config.train_path) and os.path.exists(config.test_path):
-        print(f"Les fichiers prétraités existent déjà dans {config.processed_path}")
-        print(" Étape de preprocessing ignorée.\n")
-        train_set_imp = pd.read_parquet(config.train_path)
-        test_set_imp = pd.read_parquet(config.test_path)
-        return train_set_imp, test_set_imp
-    else:
-        print("Chargement des données brutes...")
-        try:
-            data_raw = pd.read_csv(config.data_path) 
-        except FileNotFoundError:
-            print(f"Erreur: Fichier de données non trouvé à l'emplacement: {config.data_path}")
-            return
-
-        print("Division Train/Test (stratifiée)...")
+def _save_stage(output, path):
+    """Écrit la sortie d'une étape : (train, test[, artefacts...]) dans un dossier du cache."""
+    train_df, test_df, *artifacts = output
+    with stage("parquet_write", rows=len(train_df) + len(test_df)):
+        train_df.to_parquet(os.path.join(path, "train.parquet"))
+        test_df.to_parquet(os.path.join(path, "test.parquet"))
+        if artifacts:
+            joblib.dump(artifacts, os.path.join(path, "artifacts.pkl"))
+
+
+def _load_stage(path):
+    """Relit une sortie écrite par `_save_stage`."""
+    output = [pd.read_parquet(os.path.join(path, "train.parquet")),
+              pd.read_parquet(os.path.join(path, "test.parquet"))]
+    if os.path.exists(os.path.join(path, "artifacts.pkl")):
+        output += joblib.load(os.path.join(path, "artifacts.pkl"))
+    return tuple(output)
+
+
+def _preprocessing_keys(raw_fingerprint, streaming):
+    """Clés de cache des étapes split, det et knn : chaque étape dépend de la clé de l'étape amont."""
+    key_split = make_key(raw_fingerprint, source_fingerprint(split_data, ingestion),
+                         y=config.y, Test_size=config.Test_size, random_state=config.random_state,
+                         streaming=streaming, features=config.features if streaming else None)
+    key_det = make_key(key_split, source_fingerprint(imputers), var=config.features)
+    key_knn = make_key(key_det, source_fingerprint(imputers, neighbors),
+                       target_vars=config.var_to_imput, aux_var_num=config.aux_var_num,
+                       aux_var_ord=config.aux_var_ord, grade=config.grade, aux_var_nom=config.aux_var_nom,
+                       k_neigh=config.k_neigh, random_state=config.random_state,
+                       backend=config.knn_backend, block_keys=config.knn_block_keys, lean=config.lean_matrices)
+    return key_split, key_det, key_knn
+
+
+def _make_knn_imputer():
+    """Imputeur hot-deck k-NN paramétré par `config`."""
+    return HotDeckKNNImputer(
+        target_vars=config.var_to_imput,
+        numeric_features=config.aux_var_num,
+        categorical_features_ordinal=config.aux_var_ord,
+        grade_order=config.grade,
+        categorical_features_nominal=config.aux_var_nom,
+        k_neighbors=config.k_neigh,
+        random_state=config.random_state,
+        backend=config.knn_backend,
+        block_keys=config.knn_block_keys,
+        lean=config.lean_matrices
+    )
+
+
+def _save_run_report(instr, cache=None):
+    """Écrit le rapport JSON de l'exécution et ses métriques Prometheus."""
+    if cache is not None:
+        instr.extra["cache"] = cache.events
+    report_path = instr.save_report()
+    instr.save_prometheus()
+    print(f"Rapport d'exécution sauvegardé dans {report_path}")
+
+
+def _compute_split(streaming):
+    """Étape 'split' : chargement des données brutes puis découpage train/test stratifié."""
+    print("Chargement des données brutes...")
+    with stage("load") as rec:
+        if streaming:
+            with stage("csv_to_parquet"):
+                csv_to_parquet(config.data_path, config.raw_cache_path, chunk_size=config.chunk_size)
+            with stage("read_parquet"):
+                data_raw = load_parquet_cache(config.raw_cache_path)
+        else:
+            data_raw = pd.read_csv(config.data_path)
+        rec["rows"] = len(data_raw)
+    report_rss("chargement")
+
+    print("Division Train/Test (stratifiée)...")
+    with stage("split", rows=len(data_raw)):
         train_set, test_set = split_data(
             data_raw,
             y=config.y,
             Test_size=config.Test_size,
             random_state=config.random_state
         )
+    del data_raw
+    report_rss("split")
+    return train_set, test_set
+
+
+def _compute_det(cache, key_split, streaming):
+    """Étape 'det' : imputation déterministe du split (relu depuis le cache ou recalculé)."""
+    train_set, test_set = cache.run("split", key_split, partial(_compute_split, streaming), _save_stage, _load_stage)
+
+    print("Etape 1: Imputation déterministe (Moyenne/Mode)...")
+    with stage("det"):
+        with stage("fit", rows=len(train_set)):
+            det_imputer = DeterministicImputer(var=config.features).fit(train_set)
+        with stage("transform", rows=len(train_set) + len(test_set)):
+            train_set_det = det_imputer.transform(train_set)
+            test_set_det = det_imputer.transform(test_set)
+    del train_set, test_set
+    report_rss("imputation déterministe")
+    return train_set_det, test_set_det, det_imputer
+
+
+def run_preprocessing(streaming=config.streaming, cache=None, instrumentation=None):
+    """
+    Script principal pour orchestrer l'ensemble du pipeline de preprocessing.
+    1. Charge les données brutes.
+    2. Divise en train/test.
+    3. Exécute l'imputation déterministe.
+    4. Exécute l'imputation stochastique k-NN.
+    5. Sauvegarde les imputeurs fittés (`config.imputers_file`) pour le scoring.
 
-        print("Etape 1: Imputation déterministe (Moyenne/Mode)...")
-        train_set_det, test_set_det = impute_det(
-            train_set, 
-            test_set, 
-            var=config.features 
+    Chaque étape (split, imputation déterministe, imputation k-NN) est mise en
+    cache (`StageCache`) sous une clé calculée à partir du contenu du fichier
+    brut, des paramètres de `config` et du code de l'étape : seules les étapes
+    invalidées sont recalculées, les autres sont relues depuis le cache.
+
+    En mode `streaming`, le CSV brut est converti une seule fois (par blocs,
+    colonnes de `config.features` uniquement, types compacts) en Parquet
+    partitionné dans `config.raw_cache_path`, et les étapes suivantes
+    repartent de ce cache. Le pic de RSS est affiché après chaque étape.
+
+    Chaque étape (chargement, split, fit/transform des imputeurs, `kneighbors`,
+    écriture Parquet...) est instrumentée (`src.instrumentation`) : temps,
+    lignes, variation de RSS et profil optionnel sont écrits dans un rapport
+    JSON (`config.run_report_path`) et au format texte Prometheus
+    (`config.metrics_path`). Des hooks peuvent être ajoutés via `instrumentation`.
+    """
+    cache = cache or StageCache()
+    try:
+        raw_fingerprint = file_fingerprint(config.data_path)
+    except FileNotFoundError:
+        print(f"Erreur: Fichier de données non trouvé à l'emplacement: {config.data_path}")
+        return
+
+    key_split, key_det, key_knn = _preprocessing_keys(raw_fingerprint, streaming)
+    instr = instrumentation or Instrumentation("preprocessing")
+
+    def compute_knn():
+        train_set_det, test_set_det, det_imputer = cache.run(
+            "det", key_det, partial(_compute_det, cache, key_split, streaming), _save_stage, _load_stage
         )
 
         print("Etape 2: Imputation k-NN (Hot-Deck)...")
-        train_set_imp, test_set_imp = impute_knn_hotdeck(
-            train_set_det, 
-            test_set_det, 
-            target_vars=config.var_to_imput, 
-            numeric_features=config.aux_var_num,   
-            categorical_features_ordinal=config.aux_var_ord,
-            grade_order=config.grade,
-            categorical_features_nominal=config.aux_var_nom,
-            k_neighbors=config.k_neigh,
-            random_state=config.random_state
+        with stage("knn"):
+            with stage("fit", rows=len(train_set_det)):
+                knn_imputer = _make_knn_imputer().fit(train_set_det)
+            with stage("transform_train", rows=len(train_set_det)):
+                train_set_imp = knn_imputer.transform(train_set_det)
+            with stage("transform_test", rows=len(test_set_det)):
+                test_set_imp = knn_imputer.transform(test_set_det)
+        del train_set_det, test_set_det
+        report_rss("imputation k-NN")
+        return train_set_imp, test_set_imp, det_imputer, knn_imputer
+
+    with instr.activate():
+        train_set_imp, test_set_imp, det_imputer, knn_imputer = cache.run(
+            "knn", key_knn, compute_knn, _save_stage, _load_stage
         )
 
         print("Preprocessing terminé.")
-        os.makedirs(config.processed_path, exist_ok=True)
-        train_set_imp.to_parquet(config.train_path)
-        test_set_imp.to_parquet(config.test_path)
-        
-        
+        with stage("write_outputs"):
+            os.makedirs(config.processed_path, exist_ok=True)
+            shutil.copyfile(os.path.join(cache.path("knn", key_knn), "train.parquet"), config.train_path)
+            shutil.copyfile(os.path.join(cache.path("knn", key_knn), "test.parquet"), config.test_path)
+            save_imputers(det_imputer, knn_imputer, config.imputers_file)
+        print(f"Imputeurs sauvegardés dans {config.imputers_file}")
+        report_rss("écriture Parquet")
+    cache.report()
+    _save_run_report(instr, cache)
+    return train_set_imp, test_set_imp
 
-def run_model():
-    train_df = pd.read_parquet(config.train_path)
-    test_df = pd.read_parquet(config.test_path)
-    model, acc, roc, y_proba = model_trainning(train_df, test_df, save_dir=config.processed_path)
+
+def _save_model(output, path):
+    model, acc, roc, y_proba = output
+    joblib.dump(model, os.path.join(path, "scoring_model.pkl"))
+    np.save(os.path.join(path, "y_proba.npy"), y_proba)
+    with open(os.path.join(path, "metrics.json"), "w") as f:
+        json.dump({"accuracy": acc, "roc_auc": roc}, f)
+
+
+def _load_model(path):
+    with open(os.path.join(path, "metrics.json")) as f:
+        metrics = json.load(f)
+    model = joblib.load(os.path.join(path, "scoring_model.pkl"))
+    return model, metrics["accuracy"], metrics["roc_auc"], np.load(os.path.join(path, "y_proba.npy"))
+
+
+def run_model(cache=None, instrumentation=None):
+    """
+    Entraîne le modèle PD sur les données prétraitées, avec mise en cache.
+
+    La clé du modèle dépend du contenu de `train_imp.parquet`/`test_imp.parquet`,
+    des features et du code de `model_trainning` : si rien n'a changé, le
+    modèle et ses scores sont relus depuis le cache au lieu d'être réentraînés.
+    Les étapes (lecture, fit, prédiction) sont instrumentées comme dans `run_preprocessing`.
+    """
+    cache = cache or StageCache()
+    instr = instrumentation or Instrumentation("model")
+    key_model = make_key(file_fingerprint(config.train_path), file_fingerprint(config.test_path),
+                         source_fingerprint(build_model, model_trainning), num_features=config.num_features,
+                         cat_features=config.cat_features, cat_order=config.cat_order, lean=config.lean_matrices)
+
+    def compute_model():
+        with stage("read_parquet") as rec:
+            train_df = pd.read_parquet(config.train_path)
+            test_df = pd.read_parquet(config.test_path)
+            rec["rows"] = len(train_df) + len(test_df)
+        return model_trainning(train_df, test_df, save_dir=config.processed_path, lean=config.lean_matrices)
+
+    with instr.activate():
+        model, acc, roc, y_proba = cache.run("model", key_model, compute_model, _save_model, _load_model)
+    shutil.copyfile(os.path.join(cache.path("model", key_model), "scoring_model.pkl"),
+                    os.path.join(config.processed_path, "scoring_model.pkl"))
     print(f"Modèle sauvegardé dans {config.processed_path}/scoring_model.pkl")
+    version = register_model(metrics={"accuracy": float(acc), "roc_auc": float(roc)})
+    instr.extra["registry_version"] = version
+    cache.report()
+    _save_run_report(instr, cache)
     print("\nScript principal terminé avec succès.")
-    return model, acc, roc, y_proba
\ No newline at end of file
+    return model, acc, roc, y_proba
+
+
+def register_model(model_path=config.model_file, metrics=None, registry_path=config.registry_path, notes=None):
+    """
+    Enregistre le modèle dans le registre (avec les empreintes des données d'entraînement/test).
+
+    Un modèle identique à une version existante n'est pas réenregistré. Le
+    premier modèle du registre passe directement en production ; les suivants
+    doivent être promus explicitement (`run_promote`), éventuellement après
+    une période en shadow.
+    """
+    registry = ModelRegistry(registry_path)
+    sha = file_fingerprint(model_path)
+    version = next((v for v in registry.versions() if registry.manifest(v)["model_sha256"] == sha), None)
+    if version is None:
+        version = registry.register(model_path, metrics=metrics, data_paths=(config.train_path, config.test_path),
+                                    imputers_path=config.imputers_file, notes=notes)
+        print(f"Modèle enregistré dans le registre: {version}")
+    if registry.current("production") is None:
+        registry.promote(version, "production")
+        print(f"{version} promu en production")
+    return version
+
+
+def run_promote(version, target="production", registry_path=config.registry_path):
+    """
+    Promeut une version du registre ('production' ou 'shadow').
+
+    Les services lancés avec le registre basculent à chaud au prochain
+    rafraîchissement (`config.registry_poll_s`), sans redémarrage.
+    """
+    registry = ModelRegistry(registry_path)
+    previous = registry.promote(version, target)
+    print(f"{target}: {previous} -> {version}")
+    return previous
+
+
+def run_evaluation(model_path=config.model_file, n_bootstrap=config.eval_n_bootstrap, n_jobs=config.eval_n_jobs,
+                   output_path=config.eval_report_path):
+    """
+    Rapport de validation du modèle PD sur la validation et sur le test.
+
+    La validation est le découpage de `model_trainning` (20 % du train,
+    `random_state=42`) ; le test est `test_imp.parquet`, jamais vu à
+    l'entraînement. Pour chacun : AUC, Gini, KS, Brier, Hosmer-Lemeshow avec
+    intervalles de confiance bootstrap, calibration par décile de PD et par grade.
+    """
+    model = joblib.load(model_path)
+    columns = config.num_features + config.cat_features + [config.y]
+    train_df = pd.read_parquet(config.train_path, columns=columns)
+    _, valid_idx = train_test_split(np.arange(len(train_df)), test_size=0.2, random_state=42)
+    splits = {"valid": train_df.iloc[valid_idx], "test": pd.read_parquet(config.test_path, columns=columns)}
+    del train_df
+
+    reports = {}
+    for name, df in splits.items():
+        y = (df[config.y].astype(str) == 'Charged Off').to_numpy(dtype=np.int8)
+        pd_values = model.predict_proba(df.drop(columns=config.y))[:, 1]
+        reports[name] = evaluation_report(y, pd_values, grades=df["grade"].astype(str).to_numpy(),
+                                          n_bootstrap=n_bootstrap, n_jobs=n_jobs)
+        print_report(name, reports[name])
+    save_report(reports, output_path)
+    print(f"Rapport d'évaluation sauvegardé dans {output_path}")
+    return reports
+
+
+def run_segmented_model(keys=config.segment_keys, n_jobs=config.segment_n_jobs, output_path=config.segment_model_file):
+    """
+    Entraîne le modèle PD segmenté (`SegmentedPDModel`) et le compare au modèle global.
+
+    Même découpage train/validation que `model_trainning`. Le rapport par
+    segment (effectifs, modèle utilisé, temps de fit, AUC de validation du
+    modèle segmenté et du modèle global) est sauvegardé en CSV.
+    """
+    for key in keys:
+        if key not in config.cat_features:
+            raise ValueError(f"Variable de segmentation hors de cat_features: '{key}'")
+    columns = config.num_features + config.cat_features
+    train_df = pd.read_parquet(config.train_path, columns=columns + [config.y])
+    y = (train_df.pop(config.y).astype(str) == 'Charged Off').to_numpy(dtype=np.int8)
+    train_idx, valid_idx = train_test_split(np.arange(len(train_df)), test_size=0.2, random_state=42)
+    X_train, X_valid = train_df.iloc[train_idx], train_df.iloc[valid_idx]
+    y_train, y_valid = y[train_idx], y[valid_idx]
+    del train_df
+
+    with stage("segment_fit", rows=len(X_train)):
+        model = SegmentedPDModel(keys=tuple(keys), n_jobs=n_jobs, lean=config.lean_matrices).fit(X_train, y_train)
+    pd_segmented = model.predict_proba(X_valid)[:, 1]
+    pd_global = model.global_model_.predict_proba(X_valid)[:, 1]
+    print(f"AUC validation: segmenté {roc_auc_score(y_valid, pd_segmented):.4f} | "
+          f"global {roc_auc_score(y_valid, pd_global):.4f} "
+          f"({len(model.models_)} segments modélisés sur {len(model.segments_)})")
+
+    report = model.segments_.copy()
+    auc = {}
+    for segment, idx in model._groups(X_valid).items():
+        if 0 < y_valid[idx].sum() < len(idx):
+            auc[segment] = (roc_auc_score(y_valid[idx], pd_segmented[idx]),
+                            roc_auc_score(y_valid[idx], pd_global[idx]))
+    segments = list(report[list(keys)].itertuples(index=False, name=None))
+    report["auc_segmented"] = [auc.get(s, (np.nan, np.nan))[0] for s in segments]
+    report["auc_global"] = [auc.get(s, (np.nan, np.nan))[1] for s in segments]
+    report = report.sort_values(list(keys))
+    report.to_csv(config.segment_report_path, index=False)
+    print(report.to_string(index=False))
+
+    joblib.dump(model, output_path)
+    print(f"Modèle segmenté sauvegardé dans {output_path}")
+    return model, report
+
+
+def run_model_out_of_core(compare=False, instrumentation=None):
+    """
+    Entraîne le modèle PD hors mémoire (lots Parquet, SGD logistique) et le sauvegarde.
+
+    Avec `compare=True`, l'AUC test, le temps et le pic de RSS sont comparés à
+    ceux de l'entraînement en mémoire.
+    """
+    instr = instrumentation or Instrumentation("model_out_of_core")
+    with instr.activate():
+        model, metrics = train_out_of_core(config.train_path, config.test_path)
+        with stage("model_save"):
+            path = save_model(model, config.ooc_model_file)
+    instr.extra["metrics"] = metrics
+    _save_run_report(instr)
+    for split, m in metrics.items():
+        print(f"{split}: AUC {m['auc']:.4f} | accuracy {m['accuracy']:.4f} | "
+              f"log-loss {m['log_loss']:.4f} ({m['n']} lignes)")
+    print(f"Modèle sauvegardé dans {path}")
+
+    if compare:
+        comparison = compare_with_in_memory(config.train_path, config.test_path)
+        print(comparison.to_string(index=False))
+        metrics["comparison"] = comparison.to_dict(orient="records")
+    return model, metrics
+
+
+def run_search(n_jobs=config.search_n_jobs):
+    """
+    Compare des candidats (régularisation, solveurs, poids de classes, autres modèles)
+    en validation croisée par successive halving, et sauvegarde le leaderboard.
+    """
+    train_df = pd.read_parquet(config.train_path)
+    X, y = build_design_matrix(train_df)
+    del train_df
+
+    print("Recherche de modèles (successive halving)...")
+    leaderboard = successive_halving(X, y, n_jobs=n_jobs)
+    leaderboard.to_csv(config.search_leaderboard_path, index=False)
+    print(leaderboard.head(10).to_string(index=False))
+    print(f"Leaderboard sauvegardé dans {config.search_leaderboard_path}")
+    return leaderboard
+
+
+def run_multiple_imputation(m=config.mi_n_imputations, n_jobs=config.mi_n_jobs, streaming=config.streaming,
+                            cache=None):
+    """
+    Imputation multiple : M jeux imputés par hot-deck, M modèles PD, pooling de Rubin.
+
+    Repart de l'étape 'det' du cache (recalculée via `StageCache` si elle est
+    absente ou a été évincée), refitte l'imputeur k-NN puis entraîne/évalue les M jeux en
+    parallèle. Le rapport (AUC et PD moyenne poolées, variance due à
+    l'imputation, détail par imputation) est sauvegardé dans `config.mi_report_path`.
+    """
+    cache = cache or StageCache()
+    key_split, key_det, _ = _preprocessing_keys(file_fingerprint(config.data_path), streaming)
+    train_set_det, test_set_det, _ = cache.run(
+        "det", key_det, partial(_compute_det, cache, key_split, streaming), _save_stage, _load_stage
+    )
+
+    print(f"Imputation multiple ({m} tirages)...")
+    knn_imputer = _make_knn_imputer().fit(train_set_det)
+    result = multiple_imputation(train_set_det, test_set_det, knn_imputer, m=m, n_jobs=n_jobs)
+
+    report = {
+        "n_imputations": m,
+        "auc": result["auc"],
+        "pd_mean": result["pd_mean"],
+        "pd_loan_std": result["pd_loan_std"],
+        "imputations": result["imputations"].to_dict(orient="records"),
+    }
+    with open(config.mi_report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name in ("auc", "pd_mean"):
+        r = result[name]
+        print(f"{name}: {r['estimate']:.4f} [{r['ci_low']:.4f}, {r['ci_high']:.4f}] "
+              f"(B={r['between_var']:.2e}, fmi={r['fmi']:.1%})")
+    print(f"Écart-type moyen des PD entre imputations: {result['pd_loan_std']:.2e}")
+    print(f"Rapport sauvegardé dans {config.mi_report_path}")
+    return result
+
+
+def _drift_monitor():
+    """Moniteur de stabilité si la référence existe (`run_drift_reference`), sinon None."""
+    if not os.path.exists(config.drift_reference_path):
+        return None
+    return DriftMonitor(load_reference(config.drift_reference_path), hooks=[print_alert])
+
+
+def _save_drift_report(monitor):
+    if monitor is None:
+        return None
+    report = monitor.check()
+    monitor.save_report(config.drift_report_path, report)
+    pd_psi = report["variables"].get("pd", {}).get("psi")
+    pd_psi = "n/a" if pd_psi is None else f"{pd_psi:.3f}"
+    print(f"Stabilité: PSI de la PD {pd_psi} | "
+          f"{len(report['alerts'])} alerte(s) | rapport dans {config.drift_report_path}")
+    return report
+
+
+def run_drift_reference(train_path=config.train_path, model_path=config.model_file):
+    """
+    Construit les histogrammes de référence (variables du modèle et PD) de la population d'entraînement.
+    """
+    print(f"Histogrammes de référence de {train_path}...")
+    scorer = LinearPDScorer.from_pipeline(joblib.load(model_path))
+    reference = build_reference(train_path, scorer=scorer)
+    save_reference(reference, config.drift_reference_path)
+    print(f"{reference['pd'].n} lignes | référence sauvegardée dans {config.drift_reference_path}")
+    return reference
+
+
+def run_portfolio(input_path, output_path=config.portfolio_path):
+    """
+    Score un portefeuille complet (PD et ECL par prêt) à partir du modèle sauvegardé.
+
+    Si la référence de stabilité existe, le PSI/CSI du portefeuille est calculé au fil des blocs.
+    """
+    print(f"Scoring du portefeuille {input_path}...")
+    monitor = _drift_monitor()
+    summary = score_portfolio(input_path, output_path=output_path, monitor=monitor)
+    print(f"{summary['n_loans']} prêts scorés ({summary['rows_per_s']:,.0f} lignes/s)")
+    if summary["n_unscored"]:
+        print(f"{summary['n_unscored']} prêts non scorables écartés (valeur manquante ou modalité inconnue)")
+    print(f"EAD totale: {summary['ead']:,.2f} | ECL totale: {summary['ecl']:,.2f}")
+    print(f"Résultats sauvegardés dans {output_path}")
+    _save_drift_report(monitor)
+    return summary
+
+
+def run_ecl(input_path, output_path=config.ecl_path, **kwargs):
+    """
+    Calcule l'ECL IFRS 9 (12 mois / lifetime, scénarios, stages) d'un portefeuille complet.
+    """
+    print(f"ECL IFRS 9 du portefeuille {input_path}...")
+    monitor = kwargs.pop("monitor", None) or _drift_monitor()
+    summary = ecl_portfolio(input_path, output_path=output_path, monitor=monitor, **kwargs)
+    print(f"{summary['n_loans']} prêts ({summary['rows_per_s']:,.0f} lignes/s)")
+    if summary["n_unscored"]:
+        print(f"{summary['n_unscored']} prêts non scorables écartés (valeur manquante ou modalité inconnue)")
+    if summary["n_missing_ead"]:
+        print(f"{summary['n_missing_ead']} prêts sans EAD observée (EAD de l'échéancier)")
+    for stage_id, cell in summary["by_stage"].items():
+        print(f"Stage {stage_id}: {cell['n_loans']} prêts | EAD {cell['ead']:,.2f} | ECL {cell['ecl']:,.2f}")
+    print(f"ECL totale (pondérée): {summary['ecl']:,.2f} | couverture: {summary['coverage']:.2%}")
+    print(f"Résultats sauvegardés dans {output_path}")
+    _save_drift_report(monitor)
+    return summary
+
+
+def run_stress(input_path, grid=None, output_path=config.stress_path, **kwargs):
+    """
+    Stress test ECL du portefeuille sur une grille de chocs (par défaut `config.stress_grid`).
+    """
+    print(f"Stress test ECL du portefeuille {input_path}...")
+    surface = stress_test(input_path, grid=grid, output_path=output_path, **kwargs)
+    worst = surface.loc[surface["ecl"].idxmax()]
+    print(f"{len(surface)} chocs | ECL de {surface['ecl'].min():,.2f} à {surface['ecl'].max():,.2f}")
+    if surface["n_missing_ead"].iloc[0]:
+        print(f"{surface['n_missing_ead'].iloc[0]} prêts sans EAD observée (EAD de l'échéancier)")
+    print("Choc le plus sévère: " + ", ".join(f"{c}={worst[c]:g}" for c in PD_SHOCKS + ("lgd",))
+          + f" (ECL {worst['ecl']:,.2f}, {worst['ecl_delta_pct']:+.1%})")
+    print(f"Surface sauvegardée dans {output_path}")
+    return surface
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.config import num_features, cat_features, cat_order
+from src.imputers import load_imputers
+from . import config
+
+# Colonnes attendues par le pipeline PD (même ordre que dans model_trainning)
+model_features = num_features + cat_features
+
+
+def iter_loan_chunks(input_path, columns, chunk_size=config.chunk_size):
+    """
+    Lit un fichier de prêts (CSV ou Parquet) par blocs de taille bornée.
+
+    Args:
+        input_path (str): Chemin du fichier de prêts (.csv ou .parquet).
+        columns (list): Colonnes à charger (les autres ne sont jamais lues).
+        chunk_size (int): Nombre maximal de lignes par bloc.
+
+    Yields:
+        pd.DataFrame: Un bloc de prêts contenant uniquement `columns`.
+    """
+    ext = os.path.splitext(input_path)[1].lower()
+    if ext == ".parquet":
+        parquet_file = pq.ParquetFile(input_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif ext == ".csv":
+        for chunk in pd.read_csv(input_path, usecols=columns, chunksize=chunk_size):
+            yield chunk
+    else:
+        raise ValueError(f"Format de fichier non supporté: '{ext}' (attendu: .csv ou .parquet)")
+
+
+def file_columns(input_path):
+    """Colonnes d'un fichier de prêts (.csv/.parquet), sans lire les données."""
+    if os.path.splitext(input_path)[1].lower() == ".parquet":
+        return pq.ParquetFile(input_path).schema_arrow.names
+    return list(pd.read_csv(input_path, nrows=0).columns)
+
+
+def imputed_columns(imputers):
+    """Colonnes complétées par les imputeurs fittés (déterministe puis hot-deck), vide sans imputeurs."""
+    if imputers is None:
+        return set()
+    det, knn = imputers.named_steps["det"], imputers.named_steps["knn"]
+    return set(det.num_cols_) | set(det.cat_cols_) | set(knn.target_vars)
+
+
+def scorable_mask(chunk, imputed=()):
+    """
+    Prêts scorables par le pipeline PD : aucune valeur manquante hors des
+    colonnes imputées (`imputed`) et aucune modalité inconnue du modèle
+    (`cat_order`). Les autres font échouer l'encodeur ou la régression pour
+    tout le bloc : ils sont écartés et comptés par l'appelant.
+
+    Returns:
+        np.ndarray: Masque booléen des lignes scorables.
+    """
+    ok = np.ones(len(chunk), dtype=bool)
+    for col in num_features:
+        if col not in imputed:
+            ok &= chunk[col].notna().to_numpy()
+    for col, cats in zip(cat_features, cat_order):
+        values = chunk[col]
+        known = values.isin(cats).to_numpy()
+        ok &= (known | values.isna().to_numpy()) if col in imputed else known
+    return ok
+
+
+def _empty_aggregates():
+    return {"n_loans": 0, "n_unscored": 0, "n_missing_ead": 0, "ead": 0.0, "ecl": 0.0, "pd_sum": 0.0, "by_grade": {}}
+
+
+def _update_aggregates(agg, grade, pd_values, ead, ecl):
+    """
+    Met à jour les agrégats du portefeuille à partir d'un bloc scoré.
+
+    Un grade manquant (s'il est imputé) est compté dans un groupe 'missing' ; une EAD manquante
+    (ECL inconnue) est exclue des totaux d'EAD et d'ECL et comptée dans `n_missing_ead`.
+    """
+    missing_ead = np.isnan(ead)
+    if missing_ead.any():
+        ead = np.where(missing_ead, 0.0, ead)
+        ecl = np.where(missing_ead, 0.0, ecl)
+    agg["n_loans"] += len(pd_values)
+    agg["n_missing_ead"] += int(missing_ead.sum())
+    agg["ead"] += float(ead.sum())
+    agg["ecl"] += float(ecl.sum())
+    agg["pd_sum"] += float(pd_values.sum())
+
+    # Agrégation par grade sans boucle ligne à ligne (les grades manquants forment leur propre code)
+    codes, uniques = pd.factorize(grade, sort=True, use_na_sentinel=False)
+    counts = np.bincount(codes, minlength=len(uniques))
+    ead_by = np.bincount(codes, weights=ead, minlength=len(uniques))
+    ecl_by = np.bincount(codes, weights=ecl, minlength=len(uniques))
+    pd_by = np.bincount(codes, weights=pd_values, minlength=len(uniques))
+    for i, g in enumerate(uniques):
+        label = "missing" if pd.isna(g) else str(g)
+        cell = agg["by_grade"].setdefault(label, {"n_loans": 0, "ead": 0.0, "ecl": 0.0, "pd_sum": 0.0})
+        cell["n_loans"] += int(counts[i])
+        cell["ead"] += float(ead_by[i])
+        cell["ecl"] += float(ecl_by[i])
+        cell["pd_sum"] += float(pd_by[i])
+
+
+def _finalize_aggregates(agg):
+    """Calcule les moyennes (PD moyenne, taux de couverture) à partir des sommes."""
+    for cell in [agg] + list(agg["by_grade"].values()):
+        n = cell["n_loans"]
+        cell["pd_mean"] = cell.pop("pd_sum") / n if n else 0.0
+        cell["coverage"] = cell["ecl"] / cell["ead"] if cell["ead"] else 0.0
+    return agg
+
+
+def score_portfolio(input_path, output_path=config.portfolio_path, model_path=config.model_file,
+                    lgd=config.lgd, ead_col=config.ead_col, chunk_size=config.chunk_size, id_col=None,
+                    imputers_path=config.imputers_file, monitor=None):
+    """
+    Calcule la PD et l'ECL (ECL = PD * LGD * EAD) de chaque prêt d'un portefeuille.
+
+    Le fichier est lu par blocs de `chunk_size` lignes, chaque bloc est scoré
+    en une seule fois par le pipeline sauvegardé (`predict_proba` vectorisé),
+    puis écrit immédiatement dans le Parquet de sortie. La mémoire reste donc
+    bornée par la taille d'un bloc, quelle que soit la taille du portefeuille.
+    Si les imputeurs fittés existent (`imputers_path`), les valeurs manquantes
+    de chaque bloc sont imputées avant le scoring, sans réapprentissage.
+    Un prêt non scorable (valeur manquante non imputée, modalité inconnue,
+    voir `scorable_mask`) est écarté de la sortie et des agrégats et compté
+    dans `n_unscored`, au lieu d'interrompre tout le traitement.
+
+    Débit mesuré (1 cœur, `chunk_size=500_000`, 500 000 prêts de
+    `generate_loans`, imputeurs fittés sur 200 000 prêts synthétiques) :
+    environ 20 000 prêts/s en Parquet et 17 000 en CSV avec les imputeurs,
+    la requête k-NN des receveurs (~30 % des prêts) dominant ; sans
+    imputeurs (prêts complets seuls), environ 300 000 prêts/s en Parquet et
+    145 000 en CSV. Le débit de chaque exécution est renvoyé dans les agrégats.
+
+    Args:
+        input_path (str): Fichier de prêts (.csv/.parquet) avec `config.features` et `ead_col`.
+        output_path (str): Parquet de sortie (une ligne par prêt).
+        model_path (str): Chemin du pipeline PD sauvegardé (`scoring_model.pkl`).
+        lgd (float): Hypothèse de Loss Given Default.
+        ead_col (str): Colonne utilisée comme EAD (par défaut 'out_prncp').
+        chunk_size (int): Nombre de prêts scorés par bloc.
+        id_col (str, optional): Colonne identifiant du prêt à recopier en sortie.
+        imputers_path (str): Imputeurs sauvegardés par `run_preprocessing`.
+        monitor (DriftMonitor, optional): Suivi de stabilité alimenté par chaque bloc scoré.
+
+    Returns:
+        dict: Agrégats du portefeuille (nombre de prêts, EAD, ECL, PD moyenne,
+            taux de couverture, ventilation par grade, prêts écartés, débit en lignes/s).
+    """
+    # Imputeurs et modèle appliqués séparément : le suivi de stabilité voit les variables imputées,
+    # comme la référence construite sur `train_imp.parquet`
+    imputers = load_imputers(imputers_path)
+    model = joblib.load(model_path)
+    imputed = imputed_columns(imputers)
+
+    columns = model_features + [ead_col] + ([id_col] if id_col else [])
+    agg = _empty_aggregates()
+    writer = None
+    start = time.perf_counter()
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    try:
+        for chunk in iter_loan_chunks(input_path, columns, chunk_size=chunk_size):
+            scorable = scorable_mask(chunk, imputed)
+            if not scorable.all():
+                agg["n_unscored"] += int((~scorable).sum())
+                chunk = chunk[scorable]
+                if chunk.empty:
+                    continue
+            features = chunk[model_features] if imputers is None else imputers.transform(chunk[model_features])
+            pd_values = model.predict_proba(features)[:, 1]
+            ead = chunk[ead_col].to_numpy(dtype=np.float64)
+            ecl = pd_values * lgd * ead
+            if monitor is not None:
+                monitor.update(features, pd_values)
+
+            out = pd.DataFrame({"grade": chunk["grade"].to_numpy(), "pd": pd_values, "ead": ead, "ecl": ecl})
+            if id_col:
+                out.insert(0, id_col, chunk[id_col].to_numpy())
+
+            table = pa.Table.from_pandas(out, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+
+            _update_aggregates(agg, out["grade"], pd_values, ead, ecl)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    agg = _finalize_aggregates(agg)
+    agg["lgd"] = lgd
+    agg["elapsed_s"] = elapsed
+    agg["rows_per_s"] = agg["n_loans"] / elapsed if elapsed > 0 else 0.0
+
+    with open(os.path.splitext(output_path)[0] + "_summary.json", "w") as f:
+        json.dump(agg, f, indent=2)
+
+    return agg
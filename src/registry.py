@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import joblib
+import numpy as np
+from src.cache import file_fingerprint
+from src.config import num_features, cat_features, cat_order
+from src.imputers import load_imputers, make_scoring_pipeline
+from . import config
+
+
+def _write_json_atomic(path, payload):
+    """Écrit un JSON dans un fichier temporaire puis le renomme (`os.replace`) : un lecteur voit l'ancien ou le nouveau."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    """
+    Registre local de modèles PD, versionné sur disque.
+
+    Organisation :
+        <root>/versions/v0001/model.pkl      pipeline PD
+        <root>/versions/v0001/imputers.pkl   imputeurs (facultatif)
+        <root>/versions/v0001/manifest.json  métriques, empreintes, schéma des features
+        <root>/stages.json                   {étape: version}, ex: {"production": "v0001", "shadow": "v0002"}
+        <root>/history.jsonl                 journal des promotions
+
+    Une version est écrite dans un dossier temporaire puis renommée : elle
+    n'est jamais visible à moitié écrite. Une version enregistrée est
+    immuable ; la promouvoir ne fait que réécrire `stages.json` de façon
+    atomique (`os.replace`), ce que surveillent les `RegistryWatcher`.
+
+    Args:
+        root (str): Dossier du registre.
+    """
+
+    def __init__(self, root=config.registry_path):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.stages_path = os.path.join(root, "stages.json")
+        self.history_path = os.path.join(root, "history.jsonl")
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+    def path(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def versions(self):
+        """Versions enregistrées, de la plus ancienne à la plus récente."""
+        return sorted(v for v in os.listdir(self.versions_dir) if v.startswith("v") and not v.endswith(".tmp"))
+
+    def manifest(self, version):
+        with open(os.path.join(self.path(version), "manifest.json")) as f:
+            return json.load(f)
+
+    def stages(self):
+        if not os.path.exists(self.stages_path):
+            return {}
+        with open(self.stages_path) as f:
+            return json.load(f)
+
+    def current(self, stage="production"):
+        """Version affectée à une étape ('production', 'shadow'), ou None."""
+        return self.stages().get(stage)
+
+    def register(self, model_path, metrics=None, data_paths=(), imputers_path=None, notes=None):
+        """
+        Enregistre une nouvelle version à partir d'un pipeline sauvegardé.
+
+        Args:
+            model_path (str): Pipeline PD (`scoring_model.pkl`).
+            metrics (dict, optional): Métriques d'entraînement (ex: {'accuracy': ..., 'roc_auc': ...}).
+            data_paths (iterable): Fichiers d'entraînement/test dont l'empreinte est conservée.
+            imputers_path (str, optional): Imputeurs à joindre au modèle (ignoré s'il n'existe pas).
+            notes (str, optional): Commentaire libre.
+
+        Returns:
+            str: Numéro de version (ex: 'v0003').
+        """
+        n = len(self.versions()) + 1
+        # Réservation du numéro : `os.mkdir` échoue si un autre processus l'a pris
+        while True:
+            version = f"v{n:04d}"
+            tmp = self.path(version) + ".tmp"
+            try:
+                os.mkdir(tmp)
+            except FileExistsError:
+                n += 1
+                continue
+            if os.path.exists(self.path(version)):
+                os.rmdir(tmp)
+                n += 1
+                continue
+            break
+
+        shutil.copyfile(model_path, os.path.join(tmp, "model.pkl"))
+        if imputers_path and os.path.exists(imputers_path):
+            shutil.copyfile(imputers_path, os.path.join(tmp, "imputers.pkl"))
+        manifest = {
+            "version": version,
+            "created": time.time(),
+            "model_sha256": file_fingerprint(model_path),
+            "metrics": metrics or {},
+            "data": {os.path.basename(p): file_fingerprint(p) for p in data_paths if os.path.exists(p)},
+            "schema": {"num_features": num_features, "cat_features": cat_features, "cat_order": cat_order},
+            "has_imputers": os.path.exists(os.path.join(tmp, "imputers.pkl")),
+            "notes": notes,
+        }
+        _write_json_atomic(os.path.join(tmp, "manifest.json"), manifest)
+        os.replace(tmp, self.path(version))
+        return version
+
+    def promote(self, version, stage="production"):
+        """
+        Affecte une version à une étape (écriture atomique de `stages.json`).
+
+        `version=None` retire l'étape (ex: fin d'un shadow scoring).
+        """
+        if version is not None and not os.path.isdir(self.path(version)):
+            raise ValueError(f"Version inconnue: '{version}'")
+        stages = self.stages()
+        previous = stages.get(stage)
+        if version is None:
+            stages.pop(stage, None)
+        else:
+            stages[stage] = version
+        _write_json_atomic(self.stages_path, stages)
+        with open(self.history_path, "a") as f:
+            f.write(json.dumps({"time": time.time(), "stage": stage, "version": version, "previous": previous}) + "\n")
+        return previous
+
+    def load(self, version):
+        """Pipeline de scoring d'une version (imputeurs éventuels + modèle PD)."""
+        path = self.path(version)
+        return make_scoring_pipeline(load_imputers(os.path.join(path, "imputers.pkl")),
+                                     joblib.load(os.path.join(path, "model.pkl")))
+
+
+class ShadowStats:
+    """
+    Comparaison en continu des PD du modèle en production et du modèle shadow.
+
+    Les sommes cumulées donnent l'écart moyen, l'écart absolu moyen et maximal,
+    les PD moyennes et la corrélation, sans conserver les PD individuelles.
+    Les lots non scorés par le shadow (file pleine) sont comptés à part.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self._lock = threading.Lock()
+        self.n = 0
+        self.n_errors = 0
+        self.n_dropped_batches = 0
+        self.n_dropped_rows = 0
+        self._sums = np.zeros(6)  # p, s, p², s², ps, |s - p|
+        self.max_abs_diff = 0.0
+
+    def update(self, primary, shadow):
+        p, s = np.asarray(primary, dtype=np.float64), np.asarray(shadow, dtype=np.float64)
+        sums = np.array([p.sum(), s.sum(), (p * p).sum(), (s * s).sum(), (p * s).sum(), np.abs(s - p).sum()])
+        with self._lock:
+            self.n += len(p)
+            self._sums += sums
+            if len(p):
+                self.max_abs_diff = max(self.max_abs_diff, float(np.abs(s - p).max()))
+
+    def error(self):
+        with self._lock:
+            self.n_errors += 1
+
+    def drop(self, n_rows):
+        with self._lock:
+            self.n_dropped_batches += 1
+            self.n_dropped_rows += n_rows
+
+    def snapshot(self):
+        with self._lock:
+            n, (sp, ss, spp, sss, sps, sad) = self.n, self._sums.tolist()
+            out = {"version": self.version, "n": n, "n_errors": self.n_errors,
+                   "n_dropped_batches": self.n_dropped_batches, "n_dropped_rows": self.n_dropped_rows}
+            if n:
+                var_p, var_s = spp / n - (sp / n) ** 2, sss / n - (ss / n) ** 2
+                cov = sps / n - (sp / n) * (ss / n)
+                out.update({
+                    "pd_mean_primary": sp / n,
+                    "pd_mean_shadow": ss / n,
+                    "mean_diff": (ss - sp) / n,
+                    "mean_abs_diff": sad / n,
+                    "max_abs_diff": self.max_abs_diff,
+                    "correlation": cov / (var_p * var_s) ** 0.5 if var_p > 0 and var_s > 0 else None,
+                })
+            return out
+
+
+class RegistryWatcher:
+    """
+    Fonction de scoring (DataFrame -> PD) adossée au registre, avec hot-swap et shadow scoring.
+
+    Un thread relit `stages.json` toutes les `poll_s` secondes. Quand la version
+    de production change, la nouvelle version est chargée entièrement en
+    arrière-plan, puis remplace l'ancienne par une simple affectation de
+    référence : chaque appel prend un instantané du modèle actif au début du
+    lot, donc un lot en cours se termine avec l'ancien modèle et aucune
+    requête n'est perdue ni rejetée pendant la bascule.
+
+    Si une version est affectée à l'étape 'shadow', chaque lot scoré est aussi
+    scoré par ce modèle dans un thread dédié (hors du chemin critique : la
+    réponse n'attend pas le shadow) et les écarts de PD sont agrégés dans
+    `ShadowStats`. Au plus `shadow_max_pending` lots attendent le shadow : si
+    celui-ci est plus lent que la production, les lots suivants ne lui sont pas
+    soumis (comptés comme ignorés), ce qui borne la mémoire retenue.
+
+    Args:
+        registry (ModelRegistry): Registre surveillé.
+        stage (str): Étape servie ('production').
+        shadow_stage (str, optional): Étape du modèle candidat (None pour désactiver).
+        poll_s (float): Période de surveillance du registre.
+        shadow_max_pending (int): Nombre maximal de lots en attente (ou en cours) de scoring shadow.
+    """
+
+    def __init__(self, registry, stage="production", shadow_stage="shadow", poll_s=config.registry_poll_s,
+                 shadow_max_pending=config.registry_shadow_max_pending):
+        self.registry = registry
+        self.stage = stage
+        self.shadow_stage = shadow_stage
+        self.poll_s = poll_s
+        self._shadow_slots = threading.BoundedSemaphore(shadow_max_pending)
+        self.swaps = []
+        self._active = None   # (version, modèle)
+        self._shadow = None   # (version, modèle, ShadowStats)
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-scoring")
+        self._stop = threading.Event()
+        self.refresh()
+        if self._active is None:
+            raise ValueError(f"Aucune version en '{stage}' dans le registre {registry.root}")
+        self._thread = threading.Thread(target=self._watch, name="registry-watcher", daemon=True)
+        self._thread.start()
+
+    @property
+    def version(self):
+        return self._active[0]
+
+    def refresh(self):
+        """Relit le registre et bascule si la version de production ou shadow a changé."""
+        stages = self.registry.stages()
+        version = stages.get(self.stage)
+        if version is not None and (self._active is None or self._active[0] != version):
+            model = self.registry.load(version)  # chargement complet avant la bascule
+            previous = self._active[0] if self._active else None
+            self._active = (version, model)
+            self.swaps.append({"time": time.time(), "from": previous, "to": version})
+
+        shadow = stages.get(self.shadow_stage) if self.shadow_stage else None
+        if shadow is None or shadow == version:
+            self._shadow = None
+        elif self._shadow is None or self._shadow[0] != shadow:
+            self._shadow = (shadow, self.registry.load(shadow), ShadowStats(shadow))
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_s):
+            try:
+                self.refresh()
+            except Exception as e:
+                # Registre momentanément illisible : on garde les modèles actifs
+                print(f"   [registry] rafraîchissement impossible: {e}")
+
+    def _score_shadow(self, shadow, df, primary):
+        _, model, stats = shadow
+        try:
+            stats.update(primary, model.predict_proba(df)[:, 1])
+        except Exception:
+            stats.error()
+        finally:
+            self._shadow_slots.release()
+
+    def __call__(self, df):
+        _, model = self._active  # instantané : le lot entier est scoré par la même version
+        pd_values = model.predict_proba(df)[:, 1]
+        shadow = self._shadow
+        if shadow is not None:
+            # File du shadow bornée : un lot est ignoré plutôt que retenu en mémoire
+            if self._shadow_slots.acquire(blocking=False):
+                try:
+                    self._shadow_pool.submit(self._score_shadow, shadow, df, pd_values)
+                except RuntimeError:  # pool arrêté (close)
+                    self._shadow_slots.release()
+            else:
+                shadow[2].drop(len(df))
+        return pd_values
+
+    def status(self):
+        """Version servie, historique des bascules et comparaison shadow."""
+        shadow = self._shadow
+        return {"version": self.version, "swaps": list(self.swaps),
+                "shadow": shadow[2].snapshot() if shadow is not None else None}
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._shadow_pool.shutdown(wait=True)
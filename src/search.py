@@ -0,0 +1,179 @@
+import os
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler, OrdinalEncoder
+from src.config import num_features, cat_features, cat_order
+from . import config
+
+# Matrice de design partagée, ouverte en mémoire-mappée par chaque worker
+_shared = {}
+
+
+def default_candidates():
+    """
+    Grille de candidats : régularisation, solveurs et poids de classes de la
+    régression logistique, plus deux modèles alternatifs.
+
+    Returns:
+        list: Tuples (nom, estimateur sklearn non fitté).
+    """
+    candidates = []
+    for C in (0.01, 0.1, 1.0, 10.0):
+        for solver in ("lbfgs", "saga"):
+            for class_weight in (None, "balanced"):
+                name = f"logreg C={C} solver={solver} cw={class_weight}"
+                candidates.append((name, LogisticRegression(C=C, solver=solver, class_weight=class_weight,
+                                                            max_iter=1000)))
+    for alpha in (1e-5, 1e-4, 1e-3):
+        candidates.append((f"sgd_log alpha={alpha}", SGDClassifier(loss="log_loss", alpha=alpha, random_state=0)))
+    for lr in (0.05, 0.1):
+        candidates.append((f"hgb lr={lr}", HistGradientBoostingClassifier(learning_rate=lr, max_iter=200,
+                                                                          random_state=0)))
+    return candidates
+
+
+def build_design_matrix(train_df):
+    """
+    Encode une seule fois le train en matrice numérique (numériques bruts + codes ordinaux).
+
+    Le scaler n'est pas appliqué ici : il est refitté dans chaque pli de la
+    validation croisée pour éviter toute fuite d'information.
+
+    Returns:
+        tuple: (X float64 de forme (n, n_num + n_cat), y int8).
+    """
+    mapping = {'Fully Paid': 0, 'Charged Off': 1}
+    y = train_df["loan_status"].map(mapping).to_numpy(dtype=np.int8)
+    encoder = OrdinalEncoder(categories=cat_order)
+    X = np.column_stack([
+        train_df[num_features].to_numpy(dtype=np.float64),
+        encoder.fit_transform(train_df[cat_features]),
+    ])
+    return X, y
+
+
+def _init_worker(x_path, y_path):
+    """Initialisation d'un worker : ouverture des tableaux partagés sans copie."""
+    _shared["X"] = np.load(x_path, mmap_mode="r")
+    _shared["y"] = np.load(y_path, mmap_mode="r")
+
+
+def _make_pipeline(estimator):
+    # Même prétraitement que model_trainning : standardisation des numériques, codes ordinaux tels quels
+    scaler = ColumnTransformer([("num", StandardScaler(), list(range(len(num_features))))],
+                               remainder="passthrough")
+    return Pipeline(steps=[("preprocessor", scaler), ("classifier", clone(estimator))])
+
+
+def _fit_one(task):
+    """Fit d'un candidat sur un pli (sous-échantillonné) et AUC sur la validation du pli."""
+    cand_idx, estimator, train_idx, valid_idx = task
+    X, y = _shared["X"], _shared["y"]
+    model = _make_pipeline(estimator)
+    start = time.perf_counter()
+    model.fit(X[train_idx], y[train_idx])
+    fit_s = time.perf_counter() - start
+    auc = roc_auc_score(y[valid_idx], model.predict_proba(X[valid_idx])[:, 1])
+    return cand_idx, auc, fit_s
+
+
+def successive_halving(X, y, candidates=None, n_jobs=config.search_n_jobs, cv=config.search_cv,
+                       eta=config.search_eta, min_rows=config.search_min_rows, random_state=config.random_state,
+                       work_dir=None):
+    """
+    Recherche de modèles par successive halving, parallélisée sur un pool de processus.
+
+    À chaque tour, tous les candidats encore en lice sont évalués en validation
+    croisée (`cv` plis) sur un sous-échantillon du train ; seul le meilleur
+    1/`eta` (AUC moyenne) passe au tour suivant, avec `eta` fois plus de lignes.
+    Le dernier tour utilise toutes les lignes.
+
+    La matrice de design est écrite une seule fois en `.npy` puis ouverte en
+    mémoire-mappée par chaque worker : seuls les indices des plis et
+    l'estimateur transitent entre processus.
+
+    Args:
+        X (np.ndarray): Matrice de design (voir `build_design_matrix`).
+        y (np.ndarray): Cible binaire.
+        candidates (list, optional): Tuples (nom, estimateur). Défaut : `default_candidates()`.
+        n_jobs (int): Nombre de processus.
+        cv (int): Nombre de plis de la validation croisée.
+        eta (int): Facteur d'élimination entre deux tours.
+        min_rows (int): Nombre de lignes d'entraînement au premier tour.
+        random_state (int): Seed des plis et des sous-échantillons.
+        work_dir (str, optional): Dossier des tableaux partagés (temporaire par défaut).
+
+    Returns:
+        pd.DataFrame: Leaderboard (une ligne par candidat, trié par AUC du dernier tour atteint).
+    """
+    candidates = candidates or default_candidates()
+    folds = list(StratifiedKFold(n_splits=cv, shuffle=True, random_state=random_state).split(X, y))
+    rng = np.random.default_rng(random_state)
+    folds = [(rng.permutation(train_idx), valid_idx) for train_idx, valid_idx in folds]
+
+    n_train = min(len(train_idx) for train_idx, _ in folds)
+    n_rounds = 1 + max(0, int(np.floor(np.log(max(n_train / min_rows, 1)) / np.log(eta))))
+    n_rounds = min(n_rounds, 1 + int(np.ceil(np.log(len(candidates)) / np.log(eta))))
+
+    board = {i: {"candidate": name, "params": " ".join(repr(est).split()), "rounds": 0,
+                 "auc_mean": np.nan, "auc_std": np.nan, "fit_s_total": 0.0, "fit_s_mean": np.nan}
+             for i, (name, est) in enumerate(candidates)}
+    alive = list(range(len(candidates)))
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        x_path, y_path = os.path.join(tmp, "X.npy"), os.path.join(tmp, "y.npy")
+        np.save(x_path, np.ascontiguousarray(X))
+        np.save(y_path, np.ascontiguousarray(y))
+
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(x_path, y_path)) as pool:
+            for rnd in range(n_rounds):
+                n_rows = n_train if rnd == n_rounds - 1 else min(n_train, int(min_rows * eta ** rnd))
+                tasks = [(i, candidates[i][1], train_idx[:n_rows], valid_idx)
+                         for i in alive for train_idx, valid_idx in folds]
+
+                scores = {i: [] for i in alive}
+                times = {i: [] for i in alive}
+                for cand_idx, auc, fit_s in pool.map(_fit_one, tasks):
+                    scores[cand_idx].append(auc)
+                    times[cand_idx].append(fit_s)
+
+                for i in alive:
+                    board[i].update(rounds=rnd + 1, n_rows=n_rows, auc_mean=float(np.mean(scores[i])),
+                                    auc_std=float(np.std(scores[i])), fit_s_mean=float(np.mean(times[i])))
+                    board[i]["fit_s_total"] += float(np.sum(times[i]))
+
+                # On garde le meilleur 1/eta des candidats pour le tour suivant
+                n_keep = max(1, int(np.ceil(len(alive) / eta)))
+                alive = sorted(alive, key=lambda i: board[i]["auc_mean"], reverse=True)[:n_keep]
+
+    leaderboard = pd.DataFrame(board.values())
+    return leaderboard.sort_values(["rounds", "auc_mean"], ascending=False).reset_index(drop=True)
+
+
+def measure_scaling(X, y, n_jobs_list=(1, 2, 4, 8), **kwargs):
+    """
+    Mesure le temps total de la recherche selon le nombre de processus.
+
+    Returns:
+        pd.DataFrame: Temps (s), speedup et efficacité par nombre de processus.
+    """
+    rows = []
+    for n_jobs in n_jobs_list:
+        start = time.perf_counter()
+        successive_halving(X, y, n_jobs=n_jobs, **kwargs)
+        rows.append({"n_jobs": n_jobs, "wall_s": time.perf_counter() - start})
+    scaling = pd.DataFrame(rows)
+    scaling["speedup"] = scaling["wall_s"].iloc[0] / scaling["wall_s"]
+    scaling["efficiency"] = scaling["speedup"] / (scaling["n_jobs"] / scaling["n_jobs"].iloc[0])
+    return scaling
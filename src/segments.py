@@ -0,0 +1,121 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, ClassifierMixin
+from src.models import build_model
+from . import config
+
+
+def _fit_segment(task):
+    """Fit du pipeline PD d'un segment (ou du modèle global, segment None) dans un worker."""
+    segment, X, y, lean = task
+    start = time.perf_counter()
+    model = build_model(lean=lean).fit(X, y)
+    return segment, model, time.perf_counter() - start
+
+
+def _segment_key(key):
+    return key if isinstance(key, tuple) else (key,)
+
+
+class SegmentedPDModel(ClassifierMixin, BaseEstimator):
+    """
+    Modèle PD segmenté : un pipeline `build_model` par segment (ex: grade x term).
+
+    Les données sont partitionnées par les valeurs de `keys` (variables de
+    `cat_features`). Chaque segment assez fourni (`min_rows` prêts dont
+    `min_defaults` défauts) reçoit son propre modèle ; les segments trop minces
+    (ou absents à l'entraînement) sont scorés par le modèle global, entraîné
+    sur toutes les lignes. Les fits sont répartis sur un pool de processus,
+    les plus gros segments en premier ; chaque worker ne reçoit que les lignes
+    de son segment.
+
+    Au scoring, les lignes sont regroupées par segment en un seul `groupby`
+    (indices des lignes de chaque segment), puis chaque modèle score d'un
+    seul appel toutes les lignes qui lui reviennent : il n'y a aucune
+    recherche ligne par ligne, et tous les segments minces partagent un
+    seul appel au modèle global.
+
+    S'utilise comme un pipeline PD : `make_scoring_pipeline`, le registre et
+    le service de scoring l'acceptent tel quel.
+
+    Args:
+        keys (list): Variables de segmentation (sous-ensemble de `cat_features`).
+        min_rows (int): Effectif minimal d'un segment pour avoir son modèle.
+        min_defaults (int): Nombre minimal de défauts (et de non-défauts) d'un segment.
+        n_jobs (int): Nombre de processus (None = tous les cœurs).
+        lean (bool): Matrices en float32 (voir `build_model`).
+    """
+
+    def __init__(self, keys=tuple(config.segment_keys), min_rows=config.segment_min_rows,
+                 min_defaults=config.segment_min_defaults, n_jobs=config.segment_n_jobs, lean=False):
+        self.keys = keys
+        self.min_rows = min_rows
+        self.min_defaults = min_defaults
+        self.n_jobs = n_jobs
+        self.lean = lean
+
+    def _groups(self, X):
+        """{segment (tuple): positions des lignes}, en une passe de hachage."""
+        groups = X.groupby(list(self.keys), sort=False, observed=True, dropna=False).indices
+        return {_segment_key(key): rows for key, rows in groups.items()}
+
+    def fit(self, X, y):
+        y = np.asarray(y)
+        self.classes_ = np.array([0, 1])
+        groups = self._groups(X)
+
+        rows = []
+        tasks = [(None, X, y, self.lean)]
+        for segment, idx in groups.items():
+            n_defaults = int(y[idx].sum())
+            own = len(idx) >= self.min_rows and min(n_defaults, len(idx) - n_defaults) >= self.min_defaults
+            rows.append({**dict(zip(self.keys, segment)), "n_rows": len(idx), "n_defaults": n_defaults,
+                         "model": "segment" if own else "global"})
+            if own:
+                tasks.append((segment, X.iloc[idx], y[idx], self.lean))
+        # Les plus gros fits d'abord : le dernier worker libre ne reçoit pas le plus long
+        tasks.sort(key=lambda t: -len(t[2]))
+
+        self.models_ = {}
+        fit_s = {}
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+            for segment, model, seconds in pool.map(_fit_segment, tasks):
+                if segment is None:
+                    self.global_model_ = model
+                else:
+                    self.models_[segment] = model
+                fit_s[segment] = seconds
+
+        self.segments_ = pd.DataFrame(rows)
+        self.segments_["fit_s"] = [fit_s.get(tuple(r[k] for k in self.keys)) for r in rows]
+        self.global_fit_s_ = fit_s[None]
+        return self
+
+    def dispatch(self, X):
+        """
+        Lignes de `X` attribuées à chaque modèle.
+
+        Returns:
+            list: Tuples (modèle, positions des lignes) ; un seul tuple pour le modèle global.
+        """
+        by_model, fallback = [], []
+        for segment, idx in self._groups(X).items():
+            model = self.models_.get(segment)
+            if model is None:
+                fallback.append(idx)
+            else:
+                by_model.append((model, idx))
+        if fallback:
+            by_model.append((self.global_model_, np.concatenate(fallback)))
+        return by_model
+
+    def predict_proba(self, X):
+        pd_values = np.empty(len(X), dtype=np.float64)
+        for model, idx in self.dispatch(X):
+            pd_values[idx] = model.predict_proba(X.iloc[idx])[:, 1]
+        return np.column_stack([1.0 - pd_values, pd_values])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(np.int64)
@@ -0,0 +1,291 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import joblib
+import numpy as np
+import pandas as pd
+from src.config import num_features, cat_features
+from src.imputers import load_imputers, make_scoring_pipeline
+from src.registry import ModelRegistry, RegistryWatcher
+from . import config
+
+model_features = num_features + cat_features
+
+
+class LatencyStats:
+    """
+    Statistiques glissantes du service : latences (p50/p99), débit et taille des micro-batchs.
+
+    Args:
+        window (int): Nombre de dernières requêtes conservées pour les percentiles.
+    """
+
+    def __init__(self, window=10_000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._batch_sizes = deque(maxlen=window)
+        self._started = time.perf_counter()
+        self.n_requests = 0
+        self.n_rows = 0
+        self.n_batches = 0
+
+    def record_batch(self, latencies, n_rows):
+        with self._lock:
+            self._latencies.extend(latencies)
+            self._batch_sizes.append(n_rows)
+            self.n_requests += len(latencies)
+            self.n_rows += n_rows
+            self.n_batches += 1
+
+    def snapshot(self):
+        with self._lock:
+            lat = np.array(self._latencies, dtype=np.float64) * 1000
+            batch = np.array(self._batch_sizes, dtype=np.float64)
+            elapsed = time.perf_counter() - self._started
+            return {
+                "n_requests": self.n_requests,
+                "n_rows": self.n_rows,
+                "n_batches": self.n_batches,
+                "p50_ms": float(np.percentile(lat, 50)) if lat.size else None,
+                "p99_ms": float(np.percentile(lat, 99)) if lat.size else None,
+                "mean_batch_rows": float(batch.mean()) if batch.size else None,
+                "requests_per_s": self.n_requests / elapsed if elapsed > 0 else 0.0,
+                "rows_per_s": self.n_rows / elapsed if elapsed > 0 else 0.0,
+            }
+
+
+class MicroBatcher:
+    """
+    Regroupe les requêtes concurrentes en micro-batchs scorés en un seul appel.
+
+    Un thread unique attend la première requête, puis accumule les suivantes
+    pendant au plus `max_wait_ms` millisecondes ou jusqu'à `max_batch_size`
+    prêts, et score le tout avec un seul `predict_proba`. Chaque requête
+    récupère ensuite sa part du résultat via un `Future`. Si le lot échoue,
+    chaque requête est rescorée seule : seules les requêtes fautives échouent.
+
+    Args:
+        score_fn (callable): Fonction DataFrame -> tableau des PD.
+        max_batch_size (int): Nombre maximal de prêts par micro-batch.
+        max_wait_ms (float): Fenêtre maximale d'attente pour compléter un batch.
+    """
+
+    def __init__(self, score_fn, max_batch_size=config.max_batch_size, max_wait_ms=config.max_wait_ms):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.stats = LatencyStats()
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, records):
+        """
+        Soumet une liste de prêts (dictionnaires feature -> valeur).
+
+        Returns:
+            Future: Résolu avec la liste des PD, dans l'ordre de `records`.
+        """
+        future = Future()
+        self._queue.put((records, future, time.perf_counter()))
+        return future
+
+    def score(self, records, timeout=None):
+        """Version bloquante de `submit`."""
+        return self.submit(records).result(timeout=timeout)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _collect(self):
+        """Attend une première requête puis remplit le batch dans la fenêtre de latence."""
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch, n_rows = [first], len(first[0])
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while n_rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            records = [r for recs, _, _ in batch for r in recs]
+            try:
+                pd_values = self._score(records)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._score_isolated(batch)
+                continue
+
+            done = time.perf_counter()
+            start = 0
+            for recs, future, submitted in batch:
+                future.set_result(pd_values[start:start + len(recs)].tolist())
+                start += len(recs)
+            self.stats.record_batch([done - submitted for _, _, submitted in batch], len(records))
+
+    def _score(self, records):
+        return self.score_fn(pd.DataFrame.from_records(records, columns=model_features))
+
+    def _score_isolated(self, batch):
+        """Rescore chaque requête d'un lot en échec séparément : l'erreur d'une requête ne touche pas les autres."""
+        latencies, n_rows = [], 0
+        for recs, future, submitted in batch:
+            try:
+                pd_values = self._score(recs)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            future.set_result(pd_values.tolist())
+            latencies.append(time.perf_counter() - submitted)
+            n_rows += len(recs)
+        if latencies:
+            self.stats.record_batch(latencies, n_rows)
+
+
+def load_scorer(model_path=config.model_file, imputers_path=config.imputers_file):
+    """Charge une seule fois le pipeline de scoring et renvoie la fonction DataFrame -> PD."""
+    model = make_scoring_pipeline(load_imputers(imputers_path), joblib.load(model_path))
+    return lambda df: model.predict_proba(df)[:, 1]
+
+
+def load_registry_scorer(registry_path=config.registry_path):
+    """
+    Fonction de scoring adossée au registre : sert la version en production,
+    bascule à chaud à chaque promotion et score en shadow la version candidate.
+    """
+    return RegistryWatcher(ModelRegistry(registry_path))
+
+
+class ScoringServer(ThreadingHTTPServer):
+    """Serveur HTTP multi-thread avec une file d'attente de connexions adaptée à la charge."""
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def make_handler(batcher):
+    """Construit le handler HTTP lié à un `MicroBatcher`."""
+
+    class ScoringHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                metrics = batcher.stats.snapshot()
+                if hasattr(batcher.score_fn, "status"):
+                    metrics["model"] = batcher.score_fn.status()
+                self._send_json(200, metrics)
+            else:
+                self._send_json(404, {"error": f"Route inconnue: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self._send_json(404, {"error": f"Route inconnue: {self.path}"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except ValueError:
+                self._send_json(400, {"error": "Corps JSON invalide."})
+                return
+
+            # Un prêt (objet) ou un lot de prêts (liste ou {"loans": [...]})
+            single = isinstance(payload, dict) and "loans" not in payload
+            if single:
+                records = [payload]
+            elif isinstance(payload, dict):
+                records = payload["loans"]
+            else:
+                records = payload
+            if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+                self._send_json(400, {"error": "Un prêt (objet JSON) ou une liste d'objets est attendu."})
+                return
+            if not records:
+                self._send_json(400, {"error": "Aucun prêt à scorer."})
+                return
+            missing = {f for r in records for f in model_features if f not in r}
+            if missing:
+                self._send_json(400, {"error": f"Features manquantes: {sorted(missing)}"})
+                return
+            try:
+                pd_values = batcher.score(records, timeout=30)
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send_json(200, {"pd": pd_values[0]} if single else {"pd": pd_values})
+
+        def log_message(self, format, *args):
+            # Pas de log par requête : les métriques sont exposées sur /metrics
+            pass
+
+    return ScoringHandler
+
+
+def make_server(host=config.serving_host, port=config.serving_port, batcher=None, registry_path=None):
+    """
+    Crée le serveur HTTP de scoring PD (le modèle est chargé une seule fois).
+
+    Avec `registry_path`, le modèle servi est la version en production du
+    registre, remplacée à chaud à chaque promotion (voir `RegistryWatcher`).
+
+    Routes :
+    - POST /score : un prêt (objet JSON) ou un lot (liste ou {"loans": [...]}) ;
+    - GET /metrics : latences p50/p99, débit, taille moyenne des micro-batchs
+      (et, avec le registre, version servie, bascules et comparaison shadow) ;
+    - GET /health.
+
+    Returns:
+        tuple: (serveur, micro-batcher).
+    """
+    if batcher is None:
+        batcher = MicroBatcher(load_registry_scorer(registry_path) if registry_path else load_scorer())
+    server = ScoringServer((host, port), make_handler(batcher))
+    return server, batcher
+
+
+def serve(host=config.serving_host, port=config.serving_port, registry_path=None):
+    server, batcher = make_server(host, port, registry_path=registry_path)
+    print(f"Service de scoring PD à l'écoute sur http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+        if hasattr(batcher.score_fn, "close"):
+            batcher.score_fn.close()
+
+
+if __name__ == "__main__":
+    serve()
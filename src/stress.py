@@ -0,0 +1,248 @@
+import os
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from src.config import num_features, cat_features
+from src.ecl import compute_ecl, term_months
+from src.fast_scorer import LinearPDScorer
+from src.imputers import load_imputers
+from . import config
+
+# Chocs appliqués aux variables du modèle PD (la LGD est traitée à part : l'ECL y est linéaire)
+PD_SHOCKS = ("int_rate_bp", "annual_inc_pct", "dti_pts", "grade_notches")
+
+# Matrice de base et paramètres du scorer, attachés une seule fois par worker
+_shared = {}
+
+
+def shock_grid(int_rate_bp=(0,), annual_inc_pct=(0,), dti_pts=(0,), grade_notches=(0,), lgd=(config.lgd,)):
+    """
+    Grille complète (produit cartésien) des chocs de stress.
+
+    Args:
+        int_rate_bp (iterable): Hausse du taux d'intérêt, en points de base (+100 = +1 %).
+        annual_inc_pct (iterable): Variation du revenu annuel, en % (-10 = baisse de 10 %).
+        dti_pts (iterable): Hausse du taux d'endettement, en points.
+        grade_notches (iterable): Dégradation du grade, en crans (+1 = B -> C), bornée à G.
+        lgd (iterable): Valeurs de LGD.
+
+    Returns:
+        pd.DataFrame: Une ligne par combinaison de chocs.
+    """
+    axes = {"int_rate_bp": int_rate_bp, "annual_inc_pct": annual_inc_pct, "dti_pts": dti_pts,
+            "grade_notches": grade_notches, "lgd": lgd}
+    return pd.DataFrame(list(itertools.product(*axes.values())), columns=list(axes))
+
+
+def _to_shared(arrays):
+    """Copie des tableaux dans des segments `shared_memory` ; renvoie les segments et leur description."""
+    segments, spec = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        segments.append(shm)
+        spec[name] = (shm.name, array.shape, array.dtype.str)
+    return segments, spec
+
+
+def _init_worker(spec, scorer, scenarios):
+    """Attache les segments partagés : les workers lisent la matrice de base sans la copier."""
+    for name, (shm_name, shape, dtype) in spec.items():
+        # Le segment appartient au processus parent, seul responsable de sa suppression (`unlink`)
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _shared[f"_shm_{name}"] = shm
+        _shared[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    _shared["scorer"] = scorer
+    _shared["scenarios"] = scenarios
+
+
+def _shocked_logit(start, end, shock):
+    """
+    Logit PD d'un lot de prêts sous un choc, à partir de la matrice de base partagée.
+
+    Seul le lot courant est copié puis choqué : la matrice choquée complète
+    n'est jamais matérialisée.
+    """
+    s = _shared
+    scorer = s["scorer"]
+    X = s["X"][start:end].copy()
+    codes = s["codes"][start:end].copy()
+
+    num_idx = {c: i for i, c in enumerate(scorer.num_features)}
+    if shock["int_rate_bp"]:
+        X[:, num_idx["int_rate"]] += shock["int_rate_bp"] / 100.0
+    if shock["annual_inc_pct"]:
+        X[:, num_idx["annual_inc"]] *= 1.0 + shock["annual_inc_pct"] / 100.0
+    if shock["dti_pts"]:
+        X[:, num_idx["dti"]] += shock["dti_pts"]
+    if shock["grade_notches"]:
+        j = scorer.cat_features.index("grade")
+        codes[:, j] = np.clip(codes[:, j] + shock["grade_notches"], 0, len(scorer.categories[j]) - 1)
+
+    z = scorer.intercept + X @ scorer.num_weights
+    for j, table in enumerate(scorer.cat_tables):
+        z += table[codes[:, j]]
+    return z
+
+
+def _stress_cell(task):
+    """
+    Agrégats ECL (LGD = 1) d'un lot de prêts sous un choc.
+
+    La PD non choquée sert de PD de référence pour le critère SICR relatif :
+    un choc qui fait franchir `sicr_ratio` à la PD lifetime fait migrer le prêt en Stage 2.
+    """
+    shock_id, shock, start, end = task
+    s = _shared
+    pd_values = 1.0 / (1.0 + np.exp(-_shocked_logit(start, end, shock)))
+    res = compute_ecl(pd_values, s["term"][start:end], s["int_rate"][start:end], s["installment"][start:end],
+                      lgd=1.0, ead=s["ead"][start:end], scenarios=s["scenarios"],
+                      pd_origination=s["pd_base"][start:end])
+    stage = res["stage"]
+    out = {"shock_id": shock_id, "n_loans": end - start, "pd_sum": float(pd_values.sum()),
+           "n_stage2": int((stage == 2).sum()), "ead": float(res["ead"].sum()),
+           "ecl_12m": float(res["ecl_12m"].sum()), "ecl_lifetime": float(res["ecl_lifetime"].sum()),
+           "ecl": float(res["ecl"].sum())}
+    for name in s["scenarios"]:
+        out[f"ecl_{name}"] = float(res[f"ecl_{name}"].sum())
+    return out
+
+
+def build_base_matrix(loans, scorer, ead_col=config.ead_col):
+    """
+    Matrice de base du stress test : variables du modèle encodées une seule fois.
+
+    Sans colonne `ead_col`, ou pour un prêt dont l'EAD est manquante, l'EAD est
+    celle de l'échéancier (comme dans `compute_ecl`) ; le masque 'ead_missing'
+    repère les prêts dont l'EAD observée manque.
+
+    Returns:
+        dict: 'X' (variables numériques, float64), 'codes' (codes ordinaux, int16),
+            'term', 'int_rate', 'installment', 'ead', 'ead_missing' et 'pd_base' (PD non choquée).
+    """
+    X = np.column_stack([loans[c].to_numpy(dtype=np.float64) for c in scorer.num_features])
+    codes = np.column_stack([scorer._cat_codes(j, loans[c]) for j, c in enumerate(scorer.cat_features)])
+    term = term_months(loans["term"])
+    int_rate = loans["int_rate"].to_numpy(dtype=np.float64)
+    installment = loans["installment"].to_numpy(dtype=np.float64)
+    if ead_col and ead_col in loans.columns:
+        ead = loans[ead_col].to_numpy(dtype=np.float64, copy=True)
+        ead_missing = np.isnan(ead)
+    else:
+        ead = np.full(len(loans), np.nan)
+        ead_missing = np.zeros(len(loans), dtype=bool)
+    schedule = np.isnan(ead)
+    if schedule.any():
+        # EAD de l'échéancier, calculée sur les seuls prêts concernés
+        ead[schedule] = compute_ecl(np.zeros(int(schedule.sum())), term[schedule], int_rate[schedule],
+                                    installment[schedule])["ead"]
+    return {"X": X, "codes": codes.astype(np.int16), "term": term, "int_rate": int_rate,
+            "installment": installment, "ead": ead, "ead_missing": ead_missing,
+            "pd_base": scorer.predict_pd({c: loans[c] for c in scorer.num_features + scorer.cat_features})}
+
+
+def stress_surface(base, scorer, grid, scenarios=config.ecl_scenarios, batch_size=config.stress_batch_size,
+                   n_jobs=config.stress_n_jobs):
+    """
+    Surface d'ECL du portefeuille sur une grille de chocs.
+
+    1. La matrice de base (variables encodées, PD non choquée, échéancier) est
+       placée en mémoire partagée : chaque worker l'attache sans copie.
+    2. Chaque cellule (choc PD × lot de prêts) est une tâche : le worker choque
+       le lot, le score avec le scorer linéaire (`LinearPDScorer`) puis calcule
+       l'ECL par `compute_ecl` avec LGD = 1.
+    3. L'ECL étant linéaire en LGD, l'axe LGD de la grille est appliqué aux
+       agrégats, sans nouveau scoring.
+
+    Le taux d'intérêt choqué n'entre que dans le modèle PD : l'actualisation
+    reste au taux effectif d'origine et les mensualités sont inchangées.
+
+    Args:
+        base (dict): Sortie de `build_base_matrix`.
+        scorer (LinearPDScorer): Modèle PD vectorisé.
+        grid (pd.DataFrame): Grille de chocs (`shock_grid`).
+        scenarios (dict): Scénarios macro de `compute_ecl`.
+        batch_size (int): Nombre de prêts par tâche.
+        n_jobs (int): Nombre de processus (None = tous les cœurs).
+
+    Returns:
+        pd.DataFrame: Une ligne par choc : PD moyenne, part de Stage 2, EAD,
+            ECL (12 mois, lifetime, retenue, par scénario), couverture,
+            variation de l'ECL vs le portefeuille non choqué à même LGD et
+            nombre de prêts sans EAD observée (`n_missing_ead`).
+    """
+    grid = grid.reset_index(drop=True)
+    pd_shocks = grid[list(PD_SHOCKS)].drop_duplicates().reset_index(drop=True)
+    baseline = pd.DataFrame([dict.fromkeys(PD_SHOCKS, 0)])
+    pd_shocks = pd.concat([baseline, pd_shocks], ignore_index=True).drop_duplicates(ignore_index=True)
+
+    n = len(base["X"])
+    tasks = [(i, shock, start, min(start + batch_size, n))
+             for i, shock in enumerate(pd_shocks.to_dict(orient="records"))
+             for start in range(0, n, batch_size)]
+
+    segments, spec = _to_shared(base)
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                 initargs=(spec, scorer, scenarios)) as pool:
+            cells = pd.DataFrame(list(pool.map(_stress_cell, tasks)))
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+    totals = cells.groupby("shock_id").sum()
+    per_shock = pd_shocks.join(totals)
+    per_shock["pd_mean"] = per_shock.pop("pd_sum") / per_shock["n_loans"]
+    per_shock["share_stage2"] = per_shock.pop("n_stage2") / per_shock["n_loans"]
+
+    surface = grid.merge(per_shock, on=list(PD_SHOCKS), how="left")
+    ecl_cols = ["ecl_12m", "ecl_lifetime", "ecl"] + [f"ecl_{name}" for name in scenarios]
+    surface[ecl_cols] = surface[ecl_cols].mul(surface["lgd"], axis=0)
+    surface["coverage"] = surface["ecl"] / surface["ead"]
+    surface["ecl_delta_pct"] = surface["ecl"] / (per_shock.loc[0, "ecl"] * surface["lgd"]) - 1.0
+    surface["n_missing_ead"] = int(base["ead_missing"].sum()) if "ead_missing" in base else 0
+    return surface
+
+
+def stress_test(input_path, grid=None, output_path=config.stress_path, model_path=config.model_file,
+                imputers_path=config.imputers_file, ead_col=config.ead_col, scenarios=config.ecl_scenarios,
+                batch_size=config.stress_batch_size, n_jobs=config.stress_n_jobs):
+    """
+    Stress test ECL d'un portefeuille : chargement, imputation, matrice de base, surface.
+
+    Args:
+        input_path (str): Fichier de prêts (.csv/.parquet).
+        grid (pd.DataFrame, optional): Grille de chocs (par défaut `config.stress_grid`).
+        output_path (str): Parquet de la surface (None pour ne pas l'écrire).
+        model_path (str): Pipeline PD sauvegardé (régression logistique).
+        imputers_path (str): Imputeurs sauvegardés par `run_preprocessing`.
+
+    Returns:
+        pd.DataFrame: Surface d'ECL (voir `stress_surface`).
+    """
+    grid = shock_grid(**config.stress_grid) if grid is None else grid
+    scorer = LinearPDScorer.from_pipeline(joblib.load(model_path))
+
+    columns = num_features + cat_features + ([ead_col] if ead_col else [])
+    if input_path.lower().endswith(".parquet"):
+        available = pq.ParquetFile(input_path).schema_arrow.names
+        loans = pd.read_parquet(input_path, columns=[c for c in columns if c in available])
+    else:
+        loans = pd.read_csv(input_path, usecols=lambda c: c in columns)
+    imputers = load_imputers(imputers_path)
+    if imputers is not None:
+        loans = imputers.transform(loans)
+
+    base = build_base_matrix(loans, scorer, ead_col=ead_col)
+    del loans
+    surface = stress_surface(base, scorer, grid, scenarios=scenarios, batch_size=batch_size, n_jobs=n_jobs)
+    if output_path:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        surface.to_parquet(output_path, index=False)
+    return surface
@@ -0,0 +1,116 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.config import cat_features, cat_order
+from . import config
+
+# Taux de valeurs manquantes par colonne (ordre de grandeur du jeu Lending Club)
+NAN_RATES = {
+    "open_acc_6m": 0.30,
+    "total_bal_il": 0.30,
+    "inq_fi": 0.30,
+    "emp_length": 0.06,
+    "mort_acc": 0.02,
+    "dti": 0.01,
+    "num_sats": 0.01,
+    "tot_cur_bal": 0.01,
+    "annual_inc": 0.001,
+}
+
+# Fréquences des modalités de chaque colonne catégorielle (même ordre que `cat_order`)
+CAT_PROBS = {
+    "term": [0.7, 0.3],
+    "grade": [0.18, 0.29, 0.28, 0.15, 0.07, 0.02, 0.01],
+    "emp_length": [0.08, 0.07, 0.09, 0.08, 0.06, 0.06, 0.05, 0.05, 0.04, 0.04, 0.38],
+    "home_ownership": [0.11, 0.49, 0.39, 0.005, 0.003, 0.002],
+}
+
+
+def generate_loans(n, random_state=0, nan_rates=NAN_RATES):
+    """
+    Génère un portefeuille synthétique au format Lending Club (hors ligne).
+
+    Les colonnes sont celles de `config.features` plus `config.ead_col`, avec
+    les modalités de `cat_order` (colonnes `category`). Le taux d'intérêt et la
+    mensualité dépendent du grade et de la durée, et le défaut suit un modèle
+    logistique du grade, du DTI et du revenu : les étapes du pipeline
+    travaillent donc sur des données réalistes (AUC > 0.5).
+
+    Args:
+        n (int): Nombre de prêts.
+        random_state (int): Seed du générateur.
+        nan_rates (dict): Taux de NaN par colonne.
+
+    Returns:
+        pd.DataFrame: Portefeuille synthétique.
+    """
+    rng = np.random.default_rng(random_state)
+    codes = {c: rng.choice(len(cats), size=n, p=np.asarray(CAT_PROBS[c]) / np.sum(CAT_PROBS[c]))
+             for c, cats in zip(cat_features, cat_order)}
+    term_months = np.where(codes["term"] == 0, 36, 60)
+    grade = codes["grade"]
+
+    int_rate = np.round(6.0 + 3.5 * grade + rng.normal(0, 1.0, n).clip(-2.5, 2.5), 2)
+    principal = np.round(rng.lognormal(9.4, 0.6, n), -2).clip(1000, 40000)
+    r = int_rate / 1200
+    installment = np.round(principal * r / (1 - (1 + r) ** -term_months), 2)
+    annual_inc = np.round(rng.lognormal(11.0, 0.5, n), 0)
+    dti = np.round(rng.gamma(4.0, 4.5, n).clip(0, 60), 2)
+
+    logit = -2.6 + 0.35 * grade + 0.02 * (dti - 18) - 0.4 * (np.log(annual_inc) - 11) + 0.3 * (term_months == 60)
+    default = rng.random(n) < 1 / (1 + np.exp(-logit))
+
+    df = pd.DataFrame({
+        "term": pd.Categorical.from_codes(codes["term"], cat_order[0]),
+        "int_rate": int_rate,
+        "installment": installment,
+        "grade": pd.Categorical.from_codes(grade, cat_order[1]),
+        "emp_length": pd.Categorical.from_codes(codes["emp_length"], cat_order[2]),
+        "home_ownership": pd.Categorical.from_codes(codes["home_ownership"], cat_order[3]),
+        "annual_inc": annual_inc,
+        "loan_status": pd.Categorical.from_codes(default.astype(np.int8), ["Fully Paid", "Charged Off"]),
+        "dti": dti,
+        "tot_cur_bal": np.round(rng.lognormal(11.0, 1.2, n), 0),
+        "open_acc_6m": rng.poisson(1.0, n).astype(np.float64),
+        "total_bal_il": np.round(rng.lognormal(10.0, 1.0, n), 0),
+        "inq_fi": rng.poisson(1.0, n).astype(np.float64),
+        "mort_acc": rng.poisson(1.5, n).astype(np.float64),
+        "num_sats": rng.poisson(11.0, n).astype(np.float64),
+        config.ead_col: np.round(principal * rng.uniform(0, 1, n), 2),
+    })
+    df = df[config.features + [config.ead_col]]
+
+    for col, rate in nan_rates.items():
+        mask = rng.random(n) < rate
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].mask(mask)
+        else:
+            df.loc[mask, col] = np.nan
+    return df
+
+
+def write_loans(path, n, chunk_size=config.chunk_size, random_state=0, nan_rates=NAN_RATES):
+    """
+    Écrit un portefeuille synthétique de n prêts en Parquet, par blocs (mémoire bornée).
+
+    Chaque bloc a son propre flux aléatoire (`SeedSequence.spawn`) : le fichier
+    est reproductible pour une même seed et un même `chunk_size`.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    n_chunks = -(-n // chunk_size)
+    seeds = np.random.SeedSequence(random_state).spawn(n_chunks)
+    writer = None
+    try:
+        for i, seed in enumerate(seeds):
+            size = min(chunk_size, n - i * chunk_size)
+            chunk = generate_loans(size, random_state=seed, nan_rates=nan_rates)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
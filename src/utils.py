@@ -0,0 +1,50 @@
+import os
+import sys
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def peak_rss_mb():
+    """
+    Renvoie le pic de mémoire résidente (RSS) du processus courant, en Mo.
+
+    Utilise `resource` (Linux/macOS) et, à défaut, `psutil` (Windows).
+    Renvoie NaN si aucune des deux sources n'est disponible.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 ** 2
+    return float("nan")
+
+
+def current_rss_mb():
+    """
+    Renvoie la mémoire résidente (RSS) actuelle du processus, en Mo.
+
+    Lit `/proc/self/statm` (Linux) ou, à défaut, `psutil` ; sinon renvoie le pic de RSS.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    return peak_rss_mb()
+
+
+def report_rss(stage):
+    """Affiche le pic de RSS atteint à la fin d'une étape du pipeline."""
+    print(f"   [{stage}] pic RSS: {peak_rss_mb():,.0f} Mo")